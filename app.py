@@ -1,6 +1,9 @@
 from app import create_app
+from app.src.document_processor import warm_up_on_startup
 
 app = create_app()
 
 if __name__ == '__main__':
+    # Mặc định mô hình được làm nóng trong luồng nền, ứng dụng nhận yêu cầu ngay (MODEL_WARM_UP)
+    warm_up_on_startup()
     app.run(debug=True) 
\ No newline at end of file
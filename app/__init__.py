@@ -1,3 +1,5 @@
+import os
+
 from flask import Flask
 from app.src.routes import register_routes
 from app.src import config
@@ -16,6 +18,9 @@ def create_app():
     app.config['UPLOAD_FOLDER'] = config.UPLOAD_FOLDER
     app.config['MAX_CONTENT_LENGTH'] = config.MAX_CONTENT_LENGTH
     
+    # Đảm bảo thư mục tồn tại (khi tạo ứng dụng, không phải khi import cấu hình)
+    os.makedirs(config.UPLOAD_FOLDER, exist_ok=True)
+    
     # Đăng ký các route
     register_routes(app)
     
@@ -0,0 +1,174 @@
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from app.src import config
+from app.src.metrics import ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTIONS, ADMISSION_TOKENS_IN_USE, timed
+
+# Hệ số làm mượt của trung bình động thời gian giữ token (dùng để ước tính Retry-After)
+HOLD_SECONDS_SMOOTHING = 0.2
+
+
+class AdmissionRejected(Exception):
+    """Yêu cầu bị từ chối vì hàng đợi đã đầy hoặc chờ quá lâu; retry_after là số giây nên chờ."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Yêu cầu bị từ chối ({reason}), thử lại sau {retry_after} giây")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """Token đã được cấp cho một yêu cầu; được trả khi rời khối admit() trừ khi đã detach()."""
+
+    def __init__(self, controller, tokens):
+        self.controller = controller
+        self.tokens = tokens
+        self.detached = False
+        self._start = time.monotonic()
+        self._released = False
+        self._lock = threading.Lock()
+
+    def detach(self):
+        """Giữ token sau khi rời khối admit() (ví dụ cho công việc chạy nền); bên gọi phải gọi release()."""
+        self.detached = True
+
+    def release(self):
+        """Trả token (chỉ lần gọi đầu tiên có tác dụng)."""
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self.controller.release(self.tokens, time.monotonic() - self._start)
+
+
+class AdmissionController:
+    """Kiểm soát tải theo chi phí cho các yêu cầu chạy NLP.
+
+    Mỗi yêu cầu có chi phí (token) ước tính từ kích thước tệp tải lên. Tổng chi
+    phí của các yêu cầu đang xử lý không vượt quá token_budget; các yêu cầu còn
+    lại chờ theo thứ tự FIFO (để yêu cầu lớn không bị yêu cầu nhỏ chen lên mãi)
+    trong hàng đợi tối đa max_queue phần tử. Yêu cầu bị từ chối khi hàng đợi
+    đầy hoặc khi chờ quá queue_timeout giây.
+    """
+
+    def __init__(self, token_budget, bytes_per_token, max_queue, queue_timeout):
+        self.token_budget = token_budget
+        self.bytes_per_token = bytes_per_token
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._condition = threading.Condition()
+        self._in_use = 0
+        self._queue = deque()
+        self._queued_tokens = 0
+        self._hold_seconds = None
+        self._stats = {'admitted': 0, 'queued': 0, 'rejected_queue_full': 0, 'rejected_timeout': 0,
+                       'max_queue_depth': 0}
+
+    def cost(self, size_bytes):
+        """Chi phí (token) của một yêu cầu theo kích thước tải lên, tối thiểu 1 và tối đa token_budget."""
+        tokens = math.ceil(max(size_bytes or 0, 0) / self.bytes_per_token)
+        return min(max(tokens, 1), self.token_budget)
+
+    def _retry_after(self, tokens):
+        # Ước tính thời gian để xử lý hết phần việc đang chạy và đang chờ
+        if self._hold_seconds is None:
+            return 1
+        pending = self._in_use + self._queued_tokens + tokens
+        return max(1, math.ceil(self._hold_seconds * pending / self.token_budget))
+
+    def _reject(self, reason, tokens):
+        self._stats[f'rejected_{reason}'] += 1
+        ADMISSION_REJECTIONS.inc(reason=reason)
+        return AdmissionRejected(reason, self._retry_after(tokens))
+
+    def _update_gauges(self):
+        ADMISSION_QUEUE_DEPTH.set(len(self._queue))
+        ADMISSION_TOKENS_IN_USE.set(self._in_use)
+
+    def acquire(self, tokens):
+        """Chờ đến khi đủ token trong ngân sách; ném AdmissionRejected nếu bị từ chối."""
+        with self._condition:
+            if not self._queue and self._in_use + tokens <= self.token_budget:
+                self._in_use += tokens
+                self._stats['admitted'] += 1
+                self._update_gauges()
+                return
+
+            if len(self._queue) >= self.max_queue:
+                raise self._reject('queue_full', tokens)
+
+            ticket = object()
+            self._queue.append(ticket)
+            self._queued_tokens += tokens
+            self._stats['queued'] += 1
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], len(self._queue))
+            self._update_gauges()
+
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while not (self._queue[0] is ticket and self._in_use + tokens <= self.token_budget):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._reject('timeout', tokens)
+                    self._condition.wait(remaining)
+            finally:
+                self._queue.remove(ticket)
+                self._queued_tokens -= tokens
+                # Yêu cầu tiếp theo trong hàng đợi có thể đã đủ điều kiện
+                self._condition.notify_all()
+
+            self._in_use += tokens
+            self._stats['admitted'] += 1
+            self._update_gauges()
+
+    def release(self, tokens, held_seconds):
+        """Trả lại token sau khi xử lý xong (held_seconds: thời gian đã giữ token)."""
+        with self._condition:
+            self._in_use -= tokens
+            if self._hold_seconds is None:
+                self._hold_seconds = held_seconds
+            else:
+                self._hold_seconds += HOLD_SECONDS_SMOOTHING * (held_seconds - self._hold_seconds)
+            self._update_gauges()
+            self._condition.notify_all()
+
+    @contextmanager
+    def admit(self, size_bytes):
+        """Giữ token tương ứng với kích thước tải lên trong suốt khối lệnh.
+
+        Trả về AdmissionTicket; nếu ticket.detach() được gọi trong khối lệnh, token
+        chỉ được trả khi bên gọi gọi ticket.release().
+        """
+        tokens = self.cost(size_bytes)
+        with timed('admission_wait'):
+            self.acquire(tokens)
+        ticket = AdmissionTicket(self, tokens)
+        try:
+            yield ticket
+        finally:
+            if not ticket.detached:
+                ticket.release()
+
+    def stats(self):
+        """Ngân sách, token đang dùng, độ sâu hàng đợi và số yêu cầu được nhận/bị từ chối."""
+        with self._condition:
+            stats = dict(self._stats)
+            stats['tokens_in_use'] = self._in_use
+            stats['queue_depth'] = len(self._queue)
+            stats['queued_tokens'] = self._queued_tokens
+            stats['avg_hold_seconds'] = self._hold_seconds
+        stats['token_budget'] = self.token_budget
+        stats['max_queue'] = self.max_queue
+        return stats
+
+
+admission_controller = AdmissionController(
+    token_budget=config.ADMISSION_TOKEN_BUDGET,
+    bytes_per_token=config.ADMISSION_BYTES_PER_TOKEN,
+    max_queue=config.ADMISSION_MAX_QUEUE,
+    queue_timeout=config.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,62 @@
+from app.src.keywords import TermCounts
+
+# Số lượng tối đa từ khóa và cụm danh từ được trả về (giống analyze_text)
+MAX_KEYWORDS = 50
+MAX_NOUN_CHUNKS = 50
+
+
+class AnalysisAccumulator:
+    """Gộp dần kết quả phân tích của nhiều khối văn bản.
+
+    Mỗi spaCy Doc chỉ được dùng trong add_doc rồi bỏ đi, nên bộ nhớ không
+    phụ thuộc vào kích thước của cả tài liệu. Các accumulator của những phần
+    khác nhau có thể được gộp theo thứ tự bằng merge.
+    """
+
+    def __init__(self):
+        self.has_tokens = False
+        self.entities = []
+        self.sentences = 0
+        self.tokens = 0
+        # Số lần xuất hiện của các term ứng viên, xếp hạng thành từ khóa trong to_dict
+        self.term_counts = TermCounts()
+        self.noun_chunks = []
+
+    def add_doc(self, doc):
+        """Thêm kết quả phân tích của một khối văn bản."""
+        if len(doc) == 0:
+            return
+        self.has_tokens = True
+
+        self.entities.extend({'text': ent.text, 'label': ent.label_} for ent in doc.ents)
+        self.sentences += sum(1 for _ in doc.sents)
+        self.tokens += len(doc)
+
+        self.term_counts.add_doc(doc)
+
+        # Cụm danh từ cần cây phụ thuộc (pipeline trống không có parser)
+        if len(self.noun_chunks) < MAX_NOUN_CHUNKS and doc.has_annotation('DEP'):
+            for chunk in doc.noun_chunks:
+                self.noun_chunks.append(chunk.text)
+                if len(self.noun_chunks) >= MAX_NOUN_CHUNKS:
+                    break
+
+    def merge(self, other):
+        """Gộp accumulator của phần văn bản tiếp theo vào accumulator này."""
+        self.has_tokens = self.has_tokens or other.has_tokens
+        self.entities.extend(other.entities)
+        self.sentences += other.sentences
+        self.tokens += other.tokens
+        self.term_counts.merge(other.term_counts)
+        self.noun_chunks.extend(other.noun_chunks[:MAX_NOUN_CHUNKS - len(self.noun_chunks)])
+        return self
+
+    def to_dict(self, idf_index):
+        """Kết quả phân tích theo định dạng của analyze_text; từ khóa được xếp hạng TF-IDF theo idf_index."""
+        return {
+            'entities': self.entities,
+            'sentences': self.sentences,
+            'tokens': self.tokens,
+            'keywords': self.term_counts.top_keywords(idf_index, MAX_KEYWORDS),
+            'noun_chunks': self.noun_chunks
+        }
@@ -0,0 +1,56 @@
+from app.src.citations import get_citation_engine
+from app.src.metrics import timed
+
+# Số ký tự đầu tiên được dùng để tìm tiêu đề cho trang bìa
+TITLE_SEARCH_CHARS = 500
+
+
+def is_heading_sentence(sent_text, sent):
+    """Phát hiện tiêu đề dựa trên độ dài, hoa/thường, số từ."""
+    return (len(sent_text) < 100 and
+            len(sent_text.split()) < 10 and
+            any(token.is_title for token in sent if token.is_alpha))
+
+
+class AnalyzedDocument:
+    """Kết quả phân tích tài liệu, được tạo một lần cho mỗi yêu cầu.
+
+    Chứa các câu (kèm vị trí và cờ tiêu đề), các tiêu đề ứng viên, trích dẫn
+    và tiêu đề trang bìa để các bước định dạng, mục lục, tài liệu tham khảo
+    và trang tiêu đề không phải chạy lại spaCy trên cùng một văn bản.
+    """
+
+    def __init__(self, content):
+        self.content = content
+        self.has_nlp_capabilities = False
+        self.error = None
+        # Mỗi câu là một tuple (text, start_char, end_char, is_heading)
+        self.sentences = []
+        self.title_candidates = []
+        self._citation_scans = {}
+
+    def add_sentence(self, text, start_char, end_char, is_heading):
+        """Thêm một câu đã phân tích và cập nhật tiêu đề ứng viên cho trang bìa."""
+        self.sentences.append((text, start_char, end_char, is_heading))
+
+        if start_char < TITLE_SEARCH_CHARS:
+            raw_text = self.content[start_char:min(end_char, TITLE_SEARCH_CHARS)]
+            if len(raw_text) < 100 and raw_text.strip():
+                self.title_candidates.append(raw_text)
+
+    @property
+    def headings(self):
+        """Danh sách các câu được nhận diện là tiêu đề, theo thứ tự xuất hiện."""
+        return [text for text, _, _, is_heading in self.sentences if is_heading]
+
+    @property
+    def title(self):
+        """Tiêu đề dùng cho trang bìa."""
+        return self.title_candidates[0] if self.title_candidates else "Document Title"
+
+    def citation_scan(self, citation_style):
+        """Kết quả quét trích dẫn (một lần cho mỗi kiểu) trên toàn bộ văn bản."""
+        if citation_style not in self._citation_scans:
+            with timed('citations'):
+                self._citation_scans[citation_style] = get_citation_engine(citation_style).scan(self.content)
+        return self._citation_scans[citation_style]
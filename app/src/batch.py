@@ -0,0 +1,199 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.utils import secure_filename
+
+from app.src import config
+from app.src.document_processor import (
+    allowed_file,
+    extract_text_from_doc,
+    build_analyzed_documents,
+    create_formatted_document
+)
+from app.src.shard_pool import ShardPool
+
+ZIP_COPY_BLOCK_SIZE = 64 * 1024
+
+# Process pool dùng chung để tạo tệp DOCX của các lô, tồn tại suốt vòng đời tiến trình
+render_pool = ShardPool(max_workers=config.BATCH_RENDER_WORKERS)
+
+
+def unique_name(name, used_names):
+    """Tránh trùng tên tệp trong cùng một lô bằng cách thêm hậu tố số."""
+    stem, ext = os.path.splitext(name)
+    candidate = name
+    counter = 1
+    while candidate in used_names:
+        counter += 1
+        candidate = f"{stem}_{counter}{ext}"
+    used_names.add(candidate)
+    return candidate
+
+
+def collect_batch_inputs(uploaded_files, work_dir):
+    """Lưu các tệp tải lên (hoặc các tệp trong ZIP) vào thư mục làm việc.
+
+    Trả về (inputs, report): inputs là danh sách (filename, filepath) hợp lệ,
+    report chứa các mục bị bỏ qua.
+    """
+    inputs = []
+    report = []
+    used_names = set()
+    uncompressed_bytes = 0
+
+    def check_limits(size=0):
+        # Kiểm tra trước khi ghi mỗi tệp, không phải sau khi đã giải nén cả ZIP
+        if len(inputs) >= config.BATCH_MAX_FILES:
+            raise ValueError(f"Số tệp vượt quá giới hạn {config.BATCH_MAX_FILES}")
+        if uncompressed_bytes + size > config.BATCH_MAX_UNCOMPRESSED_BYTES:
+            raise ValueError('Tổng dung lượng giải nén vượt quá giới hạn cho phép')
+
+    for uploaded in uploaded_files:
+        if not uploaded or not uploaded.filename:
+            continue
+
+        if uploaded.filename.lower().endswith('.zip'):
+            try:
+                archive = zipfile.ZipFile(io.BytesIO(uploaded.read()))
+            except zipfile.BadZipFile:
+                report.append({'filename': uploaded.filename, 'status': 'skipped',
+                               'error': 'Tệp ZIP không hợp lệ'})
+                continue
+
+            with archive:
+                for member in archive.infolist():
+                    if member.is_dir():
+                        continue
+                    member_name = secure_filename(os.path.basename(member.filename))
+                    if not member_name or not allowed_file(member_name, config.ALLOWED_EXTENSIONS):
+                        report.append({'filename': member.filename, 'status': 'skipped',
+                                       'error': 'Loại tệp không được phép'})
+                        continue
+
+                    # Kích thước khai báo trong ZIP chỉ để từ chối sớm; khi sao chép vẫn đếm số byte thực sự
+                    check_limits(member.file_size)
+                    filename = unique_name(member_name, used_names)
+                    filepath = os.path.join(work_dir, filename)
+                    # Đếm số byte thực sự giải nén (file_size trong ZIP do người gửi khai báo)
+                    with archive.open(member) as src, open(filepath, 'wb') as dst:
+                        while True:
+                            block = src.read(ZIP_COPY_BLOCK_SIZE)
+                            if not block:
+                                break
+                            uncompressed_bytes += len(block)
+                            if uncompressed_bytes > config.BATCH_MAX_UNCOMPRESSED_BYTES:
+                                raise ValueError('Tổng dung lượng giải nén vượt quá giới hạn cho phép')
+                            dst.write(block)
+                    inputs.append((filename, filepath))
+        else:
+            filename = secure_filename(uploaded.filename)
+            if not filename or not allowed_file(filename, config.ALLOWED_EXTENSIONS):
+                report.append({'filename': uploaded.filename, 'status': 'skipped',
+                               'error': 'Loại tệp không được phép'})
+                continue
+
+            check_limits()
+            filename = unique_name(filename, used_names)
+            filepath = os.path.join(work_dir, filename)
+            uploaded.save(filepath)
+            inputs.append((filename, filepath))
+
+    return inputs, report
+
+
+def _safe_extract(filepath):
+    try:
+        return extract_text_from_doc(filepath), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _safe_render(item):
+    # Chạy trong worker của render_pool: (đường dẫn kết quả hoặc None, lỗi)
+    content, formatting_options, output_path, analyzed = item
+    try:
+        result_path = create_formatted_document(content, formatting_options, output_path, analyzed)
+        return result_path, None if result_path else 'Lỗi định dạng tài liệu'
+    except Exception as e:
+        return None, str(e)
+
+
+def format_batch(uploaded_files, formatting_options, batch_size=None, n_process=None, admit=None):
+    """Định dạng một lô tài liệu và trả về tệp ZIP (BytesIO) chứa kết quả và report.json.
+
+    Văn bản được trích xuất song song, phân tích cùng lúc bằng nlp.pipe,
+    sau đó các tệp DOCX được tạo trong process pool dùng chung (render_pool). admit(size_bytes) là
+    context manager của bộ kiểm soát tải, nhận tổng dung lượng các tệp sau khi
+    giải nén (không phải Content-Length của yêu cầu).
+    """
+    batch_size = batch_size or config.BATCH_NLP_BATCH_SIZE
+    n_process = n_process or config.BATCH_NLP_N_PROCESS
+
+    work_dir = tempfile.mkdtemp(prefix='document_formatter_batch_')
+    try:
+        inputs, report = collect_batch_inputs(uploaded_files, work_dir)
+        input_bytes = sum(os.path.getsize(filepath) for _, filepath in inputs)
+        with admit(input_bytes) if admit else nullcontext():
+            return _format_inputs(inputs, report, formatting_options, batch_size, n_process, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _format_inputs(inputs, report, formatting_options, batch_size, n_process, work_dir):
+    # Trích xuất văn bản song song
+    with ThreadPoolExecutor(max_workers=config.BATCH_EXTRACT_WORKERS) as executor:
+        extracted = list(executor.map(_safe_extract, [filepath for _, filepath in inputs]))
+
+    documents = []
+    for (filename, _), (content, error) in zip(inputs, extracted):
+        if not content:
+            report.append({'filename': filename, 'status': 'error',
+                           'error': error or 'Lỗi đọc nội dung tài liệu'})
+        else:
+            documents.append((filename, content))
+
+    # Phân tích toàn bộ văn bản bằng nlp.pipe (hoặc bằng quy tắc với engine 'fast')
+    analyzed_documents = build_analyzed_documents(
+        [content for _, content in documents], batch_size=batch_size, n_process=n_process,
+        engine=formatting_options.get('engine') or config.DEFAULT_STRUCTURE_ENGINE,
+        language=formatting_options.get('language'))
+
+    # Tạo các tệp DOCX trong process pool dùng chung
+    output_dir = os.path.join(work_dir, 'formatted')
+    os.makedirs(output_dir)
+    used_output_names = set()
+    items = []
+    output_filenames = []
+    for (filename, content), analyzed in zip(documents, analyzed_documents):
+        output_filename = unique_name(f"formatted_{filename.rsplit('.', 1)[0]}.docx", used_output_names)
+        output_filenames.append(output_filename)
+        items.append((content, formatting_options, os.path.join(output_dir, output_filename), analyzed))
+    rendered = render_pool.map(_safe_render, items) if items else []
+
+    for (filename, content), output_filename, (_, error) in zip(documents, output_filenames, rendered):
+        entry = {'filename': filename, 'characters': len(content)}
+        if error:
+            entry.update({'status': 'error', 'error': error})
+        else:
+            entry.update({'status': 'ok', 'output': output_filename})
+        report.append(entry)
+
+    # Đóng gói kết quả và báo cáo vào một tệp ZIP
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for entry in report:
+            if entry['status'] == 'ok':
+                archive.write(os.path.join(output_dir, entry['output']), entry['output'])
+        archive.writestr('report.json', json.dumps({
+            'total': len(report),
+            'succeeded': sum(1 for entry in report if entry['status'] == 'ok'),
+            'files': report
+        }, ensure_ascii=False, indent=2))
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,126 @@
+import re
+from bisect import bisect_left
+from collections import namedtuple
+
+# Bảng mẫu trích dẫn theo từng kiểu. Mỗi quy tắc gồm:
+#   pattern      biểu thức chính quy của trích dẫn
+#   replacement  mẫu thay thế khi định dạng lại văn bản (None: giữ nguyên)
+#   reference    trích dẫn có được đưa vào danh sách tài liệu tham khảo hay không
+# APA và MLA đã đúng định dạng (Author, Year)/(Author page) nên không cần viết lại.
+CITATION_RULES = {
+    'apa': [
+        (r'\([^)]+, \d{4}[^)]*\)', None, True),
+    ],
+    'mla': [
+        (r'\([^)]+ \d+[^)]*\)', None, True),
+    ],
+    'chicago': [
+        # Chicago (chú thích): [n] -> ^n
+        (r'\[(\d+)\]', r'^\1', True),
+    ],
+    'ieee': [
+        (r'\[\d+\]', None, True),
+        # IEEE: (n) -> [n]
+        (r'\((\d+)\)', r'[\1]', False),
+    ],
+}
+
+Citation = namedtuple('Citation', ['start', 'end', 'text', 'replacement', 'is_reference'])
+
+
+class CitationScan:
+    """Kết quả quét trích dẫn một lần trên văn bản: vị trí, văn bản đã viết lại và danh sách tham khảo."""
+
+    def __init__(self, text, citations):
+        self.text = text
+        self.citations = citations
+        self._starts = [citation.start for citation in citations]
+
+    @property
+    def bibliography(self):
+        """Các trích dẫn dùng cho tài liệu tham khảo, không trùng lặp, theo thứ tự xuất hiện."""
+        return list(dict.fromkeys(citation.text for citation in self.citations if citation.is_reference))
+
+    @property
+    def rewritten_text(self):
+        """Toàn bộ văn bản với các trích dẫn đã được định dạng lại."""
+        return self.rewrite_span(0, len(self.text))
+
+    def rewrite_span(self, start, end):
+        """Đoạn văn bản [start, end) với các trích dẫn nằm trọn trong đoạn đã được định dạng lại."""
+        pieces = []
+        position = start
+        for citation in self.citations[bisect_left(self._starts, start):]:
+            if citation.start >= end:
+                break
+            if citation.replacement is None or citation.end > end:
+                continue
+            pieces.append(self.text[position:citation.start])
+            pieces.append(citation.replacement)
+            position = citation.end
+        if not pieces:
+            return self.text[start:end]
+        pieces.append(self.text[position:end])
+        return ''.join(pieces)
+
+
+class CitationEngine:
+    """Tìm và định dạng trích dẫn cho một kiểu trích dẫn bằng một biểu thức đã biên dịch sẵn.
+
+    Các quy tắc của một kiểu được gộp thành một biểu thức duy nhất (mỗi quy tắc
+    là một nhóm có tên), nên văn bản chỉ cần quét một lần.
+    """
+
+    def __init__(self, citation_style):
+        self.citation_style = citation_style
+        self.rules = []
+        alternatives = []
+        for index, (pattern, replacement, is_reference) in enumerate(CITATION_RULES.get(citation_style, [])):
+            group_name = f"rule{index}"
+            self.rules.append((group_name, re.compile(pattern), replacement, is_reference))
+            alternatives.append(f"(?P<{group_name}>{pattern})")
+
+        self.pattern = re.compile('|'.join(alternatives)) if alternatives else None
+        self.rewrites = any(replacement is not None for _, _, replacement, _ in self.rules)
+
+    def _rule_for(self, match):
+        for group_name, regex, replacement, is_reference in self.rules:
+            if match.group(group_name) is not None:
+                return regex, replacement, is_reference
+        return None, None, False
+
+    def _replace(self, match):
+        regex, replacement, _ = self._rule_for(match)
+        if replacement is None:
+            return match.group(0)
+        return regex.fullmatch(match.group(0)).expand(replacement)
+
+    def scan(self, text):
+        """Quét văn bản một lần, trả về CitationScan với vị trí của mọi trích dẫn."""
+        citations = []
+        if self.pattern is not None:
+            for match in self.pattern.finditer(text):
+                regex, replacement, is_reference = self._rule_for(match)
+                citation_text = match.group(0)
+                if replacement is not None:
+                    replacement = regex.fullmatch(citation_text).expand(replacement)
+                citations.append(Citation(match.start(), match.end(), citation_text,
+                                          replacement, is_reference))
+        return CitationScan(text, citations)
+
+    def rewrite(self, text):
+        """Định dạng lại các trích dẫn trong văn bản (không ghi lại vị trí)."""
+        if not self.rewrites:
+            return text
+        return self.pattern.sub(self._replace, text)
+
+
+_engines = {}
+
+
+def get_citation_engine(citation_style):
+    """CitationEngine dùng chung cho kiểu trích dẫn (biểu thức chỉ được biên dịch một lần)."""
+    engine = _engines.get(citation_style)
+    if engine is None:
+        engine = _engines.setdefault(citation_style, CitationEngine(citation_style))
+    return engine
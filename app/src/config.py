@@ -10,14 +10,122 @@ VERSION = "1.0.0"
 UPLOAD_FOLDER = os.path.abspath('uploads')
 TEMP_FOLDER = tempfile.gettempdir()
 
-# Đảm bảo thư mục tồn tại
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
-
 # Cấu hình tệp
 ALLOWED_EXTENSIONS = {'doc', 'docx', 'txt'}
 MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 10MB max file size
 
+# Các phần phụ của tài liệu Word được trích xuất sau nội dung chính
+# ('header', 'footer', 'footnotes', 'endnotes')
+EXTRACT_EXTRA_PARTS = ('header', 'footer', 'footnotes', 'endnotes')
+
+# Tệp tải lên được xử lý trong bộ nhớ; chỉ ghi ra đĩa tạm khi vượt quá ngưỡng này
+UPLOAD_SPILL_THRESHOLD_BYTES = 4 * 1024 * 1024
+
+# Cấu hình mô hình spaCy: được tải khi dùng lần đầu (xem model_loader.py)
+SPACY_MODEL_NAME = os.environ.get('SPACY_MODEL_NAME', 'en_core_web_sm')
+# Làm nóng mô hình khi khởi động (app.py): 'background' (luồng nền, ứng dụng nhận yêu cầu ngay),
+# 'eager' (chờ làm nóng xong mới nhận yêu cầu) hoặc 'lazy' (tải khi có yêu cầu đầu tiên cần mô hình)
+MODEL_WARM_UP = os.environ.get('MODEL_WARM_UP', 'background')
+# Mô hình theo ngôn ngữ (mã ngôn ngữ -> tên mô hình); ngôn ngữ chưa cài mô hình dùng pipeline của
+# DEFAULT_LANGUAGE (pipeline trống có sentencizer nếu cả mô hình mặc định cũng chưa được cài)
+SPACY_MODELS = {
+    'en': SPACY_MODEL_NAME,
+    'vi': 'vi_core_news_lg',
+    'fr': 'fr_core_news_sm',
+    'de': 'de_core_news_sm',
+    'es': 'es_core_news_sm',
+}
+# Ngôn ngữ khi không chỉ định và không phát hiện được (pipeline này không bị loại khỏi bộ nhớ)
+DEFAULT_LANGUAGE = 'en'
+# Số pipeline tối đa và tổng bộ nhớ ước tính (byte, 0 = không giới hạn) được giữ trong mỗi tiến trình
+MODEL_REGISTRY_MAX_MODELS = int(os.environ.get('MODEL_REGISTRY_MAX_MODELS', '2'))
+MODEL_REGISTRY_MEMORY_BUDGET_BYTES = int(os.environ.get('MODEL_REGISTRY_MEMORY_BUDGET_BYTES', str(1024 * 1024 * 1024)))
+# Phát hiện ngôn ngữ: số ký tự đầu văn bản được xét và tỷ lệ stop word tối thiểu
+LANGUAGE_DETECTION_SAMPLE_CHARS = 5000
+LANGUAGE_DETECTION_MIN_SCORE = 0.15
+
+# Engine phát hiện cấu trúc (tiêu đề/đoạn văn): 'spacy' (mô hình) hoặc 'fast' (quy tắc, không dùng spaCy)
+DEFAULT_STRUCTURE_ENGINE = 'spacy'
+STRUCTURE_ENGINES = ('spacy', 'fast')
+
+# Engine tạo tệp DOCX mặc định: 'docx' (python-docx) hoặc 'ooxml' (ghi trực tiếp XML)
+DEFAULT_RENDER_ENGINE = 'docx'
+RENDER_ENGINES = ('docx', 'ooxml')
+# Số mẫu tài liệu (tổ hợp font/cỡ chữ/khoảng cách dòng/lề/số trang) được giữ sẵn cho engine 'docx'
+DOCX_TEMPLATE_CACHE_SIZE = 64
+
+# Cấu hình bộ nhớ đệm kết quả (/analyze và /upload)
+CACHE_ENABLED = True
+CACHE_MEMORY_MAX_BYTES = 64 * 1024 * 1024  # Giới hạn tầng bộ nhớ (LRU)
+CACHE_DISK_FOLDER = os.path.join(TEMP_FOLDER, 'document_formatter_cache')
+CACHE_DISK_MAX_BYTES = 512 * 1024 * 1024  # Giới hạn tầng đĩa
+CACHE_TTL_SECONDS = 24 * 60 * 60  # Thời gian sống của mục trên đĩa
+
+# Cấu hình hàng đợi xử lý bất đồng bộ (/upload với async=1)
+ASYNC_JOBS_BACKEND = os.environ.get('ASYNC_JOBS_BACKEND', 'thread')  # 'thread' hoặc 'process'
+ASYNC_JOBS_WORKERS = int(os.environ.get('ASYNC_JOBS_WORKERS', '2'))
+JOB_TTL_SECONDS = 60 * 60  # Thời gian giữ trạng thái của một công việc
+
+# Cấu hình bộ lưu trữ tệp tải lên và tệp kết quả (xem storage.py)
+STORAGE_FOLDER = os.path.join(TEMP_FOLDER, 'document_formatter_storage')
+STORAGE_MAX_BYTES = 1024 * 1024 * 1024  # Giới hạn tổng dung lượng
+STORAGE_TTL_SECONDS = 60 * 60  # Thời gian sống của một tệp
+STORAGE_SWEEP_INTERVAL_SECONDS = 60  # Chu kỳ dọn dẹp của luồng nền
+JOBS_FOLDER = os.path.join(STORAGE_FOLDER, 'jobs')  # Bản ghi trạng thái công việc (JSON), dùng chung giữa các worker
+
+# Cấu hình mã tài liệu tải lên một lần (/documents, xem document_store.py)
+DOCUMENT_HANDLES_MAX_IN_MEMORY = 32  # Số tài liệu đã phân tích được giữ trong bộ nhớ (LRU)
+
+# Cấu hình kiểm soát tải cho các endpoint chạy NLP (xem admission.py)
+ADMISSION_ENABLED = True
+ADMISSION_TOKEN_BUDGET = int(os.environ.get('ADMISSION_TOKEN_BUDGET', '64'))  # Tổng token được xử lý đồng thời
+ADMISSION_BYTES_PER_TOKEN = 256 * 1024  # Chi phí của một yêu cầu: 1 token cho mỗi 256KB tải lên
+ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', '32'))  # Số yêu cầu chờ tối đa
+ADMISSION_QUEUE_TIMEOUT_SECONDS = 30  # Thời gian chờ tối đa trong hàng đợi trước khi trả về 503
+
+# Số lõi CPU cho mỗi worker web (WEB_WORKERS, xem gunicorn.conf.py): kích thước mặc định của các
+# process pool của từng worker, để tổng số tiến trình của mọi worker không vượt quá số lõi
+CPUS_PER_WEB_WORKER = max(1, (os.cpu_count() or 1) // int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1)))
+
+# Cấu hình định dạng theo lô (/batch)
+BATCH_NLP_BATCH_SIZE = int(os.environ.get('BATCH_NLP_BATCH_SIZE', '32'))
+BATCH_NLP_N_PROCESS = int(os.environ.get('BATCH_NLP_N_PROCESS', '1'))
+BATCH_EXTRACT_WORKERS = int(os.environ.get('BATCH_EXTRACT_WORKERS', '4'))
+# Mỗi worker web có process pool riêng để tạo tệp DOCX (batch.render_pool)
+BATCH_RENDER_WORKERS = int(os.environ.get('BATCH_RENDER_WORKERS', str(CPUS_PER_WEB_WORKER)))
+BATCH_MAX_FILES = 500
+BATCH_MAX_UNCOMPRESSED_BYTES = 200 * 1024 * 1024  # Giới hạn tổng dung lượng giải nén từ ZIP
+
+# Cấu hình phân tích theo luồng cho tài liệu lớn
+STREAMING_THRESHOLD_CHARS = 200_000  # Văn bản dài hơn ngưỡng này được phân tích theo từng khối
+STREAMING_CHUNK_CHARS = 100_000  # Kích thước tối đa của một khối (chia theo ranh giới đoạn văn)
+STREAMING_BATCH_SIZE = 4  # Số khối được nlp.pipe xử lý cùng lúc
+
+# Cấu hình xử lý song song các khối của một tài liệu lớn trong process pool (xem shard_pool.py).
+# Tắt mặc định: mỗi worker web có pool riêng, mỗi tiến trình trong pool giữ một bản mô hình.
+# Mặc định chia số lõi CPU cho số worker web (CPUS_PER_WEB_WORKER) để tổng số tiến trình giữ mô
+# hình không vượt quá số lõi
+SHARD_ENABLED = os.environ.get('SHARD_ENABLED', '0').lower() in ('1', 'true', 'yes')
+SHARD_WORKERS = int(os.environ.get('SHARD_WORKERS', str(CPUS_PER_WEB_WORKER)))
+
+# Bộ nhớ đệm kết quả phân tích theo đoạn văn (xem paragraph_cache.py): bản sửa đổi của một tài liệu
+# chỉ phân tích lại các đoạn văn mới hoặc đã thay đổi. Tắt mặc định vì mỗi đoạn văn được phân
+# tích riêng nên câu luôn kết thúc ở ranh giới đoạn văn: số câu và thực thể của phân tích văn bản
+# và kết quả định dạng có thể khác khi phân tích cả tài liệu (xem benchmarks/bench_paragraph_cache.py)
+PARAGRAPH_CACHE_ENABLED = os.environ.get('PARAGRAPH_CACHE_ENABLED', '0').lower() in ('1', 'true', 'yes')
+PARAGRAPH_CACHE_MAX_BYTES = int(os.environ.get('PARAGRAPH_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+# Cấu hình từ khóa: bảng IDF xây dựng từ bộ tài liệu (build_keyword_index.py), ánh xạ bộ nhớ khi chạy
+KEYWORD_IDF_PATH = os.environ.get('KEYWORD_IDF_PATH', os.path.abspath(os.path.join('data', 'keyword_idf.bin')))
+# Cập nhật bảng IDF với các tài liệu được phân tích, ghi vào tệp sau mỗi KEYWORD_IDF_SAVE_EVERY tài liệu
+KEYWORD_IDF_UPDATE = os.environ.get('KEYWORD_IDF_UPDATE', '0').lower() in ('1', 'true', 'yes')
+KEYWORD_IDF_SAVE_EVERY = 100
+
+# Cấu hình số liệu vận hành (/metrics)
+METRICS_ENABLED = True
+# Thêm header Server-Timing (thời gian từng bước) vào phản hồi
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', '0').lower() in ('1', 'true', 'yes')
+
 # Cấu hình Flask
 DEBUG = True
 SECRET_KEY = os.urandom(24)
@@ -0,0 +1,26 @@
+# Các loại khối nội dung của tài liệu đầu ra.
+# create_formatted_document xây dựng danh sách khối (loại, văn bản) một lần,
+# sau đó engine được chọn (python-docx hoặc OOXML) sẽ hiển thị chúng.
+BLOCK_TITLE = 'title'                  # Tiêu đề trang bìa (căn giữa, 16pt, in đậm)
+BLOCK_SECTION_TITLE = 'section_title'  # "Table of Contents", "References" (căn giữa, 14pt, in đậm)
+BLOCK_TOC_ENTRY = 'toc_entry'          # Một mục trong mục lục
+BLOCK_HEADING = 'heading'              # Tiêu đề phần (Heading 1)
+BLOCK_BODY = 'body'                    # Đoạn văn nội dung (Normal)
+BLOCK_REFERENCE = 'reference'          # Một mục tài liệu tham khảo
+BLOCK_EMPTY = 'empty'                  # Đoạn trống
+
+# Giá trị khoảng cách dòng và lề (inch) theo tùy chọn định dạng
+LINE_SPACING_VALUES = {'2.0': 2.0, '1.5': 1.5}
+MARGIN_INCHES = {'normal': 1, 'wide': 1.5}
+
+PAGE_NUMBER_TEXT = "- Page # -"
+
+
+def line_spacing_value(formatting_options):
+    """Khoảng cách dòng (bội số) theo tùy chọn định dạng, mặc định 1.0."""
+    return LINE_SPACING_VALUES.get(formatting_options['line_spacing'], 1.0)
+
+
+def margin_inches(formatting_options):
+    """Lề trang (inch) theo tùy chọn định dạng, mặc định là lề hẹp 0.5 inch."""
+    return MARGIN_INCHES.get(formatting_options['margin'], 0.5)
@@ -1,39 +1,173 @@
+import io
+import itertools
 import re
-import docx
-from docx.shared import Pt, Inches
-from docx.enum.text import WD_LINE_SPACING
-import importlib.util
 import os
+import threading
 
-# Kiểm tra và tải spaCy
-try:
-    import spacy
-    try:
-        # Kiểm tra xem mô hình đã được cài đặt chưa
-        spacy_model_name = 'en_core_web_sm'
-        if importlib.util.find_spec(spacy_model_name) is not None:
-            # Mô hình đã được cài đặt dưới dạng package Python
-            nlp = spacy.load(spacy_model_name)
-            print(f"Đã tải thành công mô hình {spacy_model_name}")
-        else:
-            # Thử tải từ đường dẫn khác
-            try:
-                nlp = spacy.load(spacy_model_name)
-                print(f"Đã tải thành công mô hình {spacy_model_name}")
-            except OSError:
-                print(f"Không tìm thấy mô hình {spacy_model_name}. Đang tải mô hình nhỏ mặc định...")
-                # Sử dụng mô hình nhỏ mặc định nếu không tìm thấy mô hình chính
-                nlp = spacy.blank('en')
-                print("Đã tải mô hình nhỏ (blank model)")
-    except Exception as e:
-        print(f"Lỗi khi tải mô hình spaCy: {str(e)}")
-        # Tạo mô hình trống nếu không thể tải được mô hình
-        nlp = spacy.blank('en')
-        print("Đã tải mô hình trống (blank model)")
-except ImportError as e:
-    print(f"Lỗi: Không thể import thư viện spaCy. {str(e)}")
-    print("Vui lòng cài đặt spaCy bằng lệnh 'pip install spacy' và chạy 'python -m spacy download en_core_web_sm'")
-    raise ImportError("Không thể sử dụng ứng dụng khi thiếu thư viện spaCy")
+from app.src import config
+from app.src.analyzed_document import AnalyzedDocument, is_heading_sentence
+from app.src.analysis_accumulator import AnalysisAccumulator, MAX_KEYWORDS
+from app.src.citations import get_citation_engine
+from app.src.text_chunks import iter_paragraphs, iter_text_chunks
+from app.src.document_blocks import (
+    BLOCK_TITLE, BLOCK_SECTION_TITLE, BLOCK_TOC_ENTRY, BLOCK_HEADING, BLOCK_BODY,
+    BLOCK_REFERENCE, BLOCK_EMPTY
+)
+from app.src.docx_templates import TEMPLATE_STYLES, new_templated_document
+from app.src.ooxml_writer import write_ooxml_document
+from app.src.pipeline_profiles import PIPELINE_PROFILES, prepare_pipeline, disabled_components
+from app.src.model_loader import ModelRegistry, installed_version
+from app.src.language_detection import detect_language
+from app.src.metrics import (
+    timed,
+    record_fallback,
+    record_paragraph_reuse,
+    MODEL_LOADS,
+    MODEL_EVICTIONS,
+    MODELS_RESIDENT
+)
+from app.src.text_extraction import ExtractionError, iter_docx_paragraphs, iter_doc_paragraphs
+from app.src.fast_structure import build_fast_analyzed_document
+from app.src.shard_pool import ShardPool
+from app.src.keywords import idf_index
+from app.src.parsed_document import ParseArrays
+from app.src.paragraph_cache import paragraph_cache
+
+
+def _record_model_load(language, loader):
+    MODEL_LOADS.inc(language=language)
+    MODELS_RESIDENT.set(len(model_registry.stats()['resident']))
+    print(f"Đã tải pipeline '{language}' ({loader.model_name}) trong {loader.load_seconds:.2f} s")
+
+
+def _record_model_eviction(language):
+    MODEL_EVICTIONS.inc(language=language)
+    MODELS_RESIDENT.set(len(model_registry.stats()['resident']))
+    print(f"Đã loại pipeline '{language}' khỏi bộ nhớ")
+
+
+# Các pipeline spaCy theo ngôn ngữ, được tải khi dùng lần đầu (không phải khi import module)
+model_registry = ModelRegistry(config.SPACY_MODELS, config.DEFAULT_LANGUAGE,
+                               max_models=config.MODEL_REGISTRY_MAX_MODELS,
+                               memory_budget=config.MODEL_REGISTRY_MEMORY_BUDGET_BYTES,
+                               prepare=prepare_pipeline,
+                               on_load=_record_model_load,
+                               on_evict=_record_model_eviction)
+
+
+def get_nlp(language=None):
+    """Pipeline spaCy của ngôn ngữ (mặc định DEFAULT_LANGUAGE), tải ở lần gọi đầu tiên, an toàn luồng."""
+    return model_registry.get(language)
+
+
+def pipeline_fingerprint(language=None):
+    """Những gì ngoài tệp và tùy chọn định dạng quyết định kết quả phân tích/định dạng (dùng trong khóa của result_cache).
+
+    Gồm tên và phiên bản các pipeline có thể được dùng (xem ModelRegistry.fingerprint),
+    phiên bản spaCy, các profile pipeline, bộ nhớ đệm đoạn văn (thay đổi cách
+    tách câu) và các phần được trích xuất thêm. Không kích hoạt việc tải mô hình.
+    """
+    return {
+        'models': model_registry.fingerprint(language),
+        'spacy': installed_version('spacy'),
+        'profiles': PIPELINE_PROFILES,
+        'paragraph_cache': config.PARAGRAPH_CACHE_ENABLED,
+        'extract_extra_parts': list(config.EXTRACT_EXTRA_PARTS),
+    }
+
+
+def select_language(content, language=None):
+    """Mã ngôn ngữ dùng để phân tích văn bản: language nếu được chỉ định, nếu không ('auto') phát hiện từ nội dung."""
+    if language and language != 'auto':
+        return model_registry.resolve(language)
+    # Chỉ phát hiện trong các ngôn ngữ đã cài mô hình
+    return detect_language(content, sorted(model_registry.available), config.DEFAULT_LANGUAGE,
+                           config.LANGUAGE_DETECTION_SAMPLE_CHARS, config.LANGUAGE_DETECTION_MIN_SCORE)
+
+
+# Trạng thái của mô hình, dùng cho endpoint /ready
+_model_warm = False
+# Chế độ làm nóng đã dùng khi khởi động (warm_up_on_startup), None nếu không gọi
+# (ví dụ create_app() với flask run hoặc trong kiểm thử: mô hình được tải như 'lazy')
+_warm_up_mode = None
+_warm_up_thread = None
+_warm_up_lock = threading.Lock()
+
+WARM_UP_TEXT = ("Introduction\n\nThis is a short warm-up document used to initialise "
+                "the language model (Smith, 2020). It mentions London and Google.")
+
+
+def warm_up_model():
+    """Chạy mô hình trên một văn bản mẫu với mọi profile để khởi tạo trước các cấu trúc lười.
+
+    Khi gọi trong tiến trình cha trước khi fork, các worker dùng chung bộ nhớ
+    mô hình đã khởi tạo theo cơ chế copy-on-write.
+    """
+    global _model_warm
+    nlp = get_nlp()
+    for profile in PIPELINE_PROFILES:
+        try:
+            nlp(WARM_UP_TEXT, disable=disabled_components(nlp, profile))
+        except Exception as e:
+            print(f"Lỗi khi làm nóng mô hình với profile {profile}: {str(e)}")
+    _model_warm = True
+    print("Mô hình đã sẵn sàng")
+
+
+def start_background_warm_up():
+    """Tải và làm nóng mô hình trong luồng nền; trả về luồng (None nếu mô hình đã sẵn sàng).
+
+    Yêu cầu cần mô hình đến trong lúc đang tải sẽ chờ cùng một lần tải. Không
+    dùng trước khi fork (gunicorn preload_app): hãy gọi warm_up_model().
+    """
+    global _warm_up_thread
+    with _warm_up_lock:
+        if _model_warm:
+            return None
+        if _warm_up_thread is None or not _warm_up_thread.is_alive():
+            _warm_up_thread = threading.Thread(target=warm_up_model, name='model-warm-up', daemon=True)
+            _warm_up_thread.start()
+        return _warm_up_thread
+
+
+def warm_up_on_startup(mode=None):
+    """Làm nóng mô hình khi khởi động theo MODEL_WARM_UP ('background', 'eager' hoặc 'lazy')."""
+    global _warm_up_mode
+    mode = mode or config.MODEL_WARM_UP
+    if mode not in ('background', 'eager', 'lazy'):
+        raise ValueError(f"Chế độ làm nóng mô hình không hợp lệ: {mode}")
+    _warm_up_mode = mode
+    if mode == 'eager':
+        warm_up_model()
+    elif mode == 'background':
+        start_background_warm_up()
+
+
+def model_status():
+    """Thông tin trạng thái mô hình (ngôn ngữ mặc định) cho kiểm tra sẵn sàng, không kích hoạt việc tải mô hình."""
+    loader = model_registry.loader()
+    # Không làm nóng khi khởi động thì mô hình được tải ở yêu cầu đầu tiên cần NLP
+    warm_up_mode = _warm_up_mode or 'lazy'
+    if not loader.loaded:
+        return {
+            'model': loader.model_name,
+            'loaded': False,
+            'warm': False,
+            'warm_up': warm_up_mode,
+            'pid': os.getpid()
+        }
+    nlp = loader.get()
+    return {
+        'model': f"{nlp.lang}_{nlp.meta.get('name', 'pipeline')}",
+        'version': nlp.meta.get('version'),
+        'lang': nlp.lang,
+        'pipeline': list(nlp.pipe_names),
+        'loaded': True,
+        'load_seconds': round(loader.load_seconds, 3),
+        'warm': _model_warm,
+        'warm_up': warm_up_mode,
+        'pid': os.getpid()
+    }
 
 
 def allowed_file(filename, allowed_extensions):
@@ -41,63 +175,403 @@ def allowed_file(filename, allowed_extensions):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
 
-def extract_text_from_doc(file_path):
-    """Trích xuất văn bản từ tài liệu Word hoặc tệp văn bản."""
-    if file_path.endswith('.docx'):
-        doc = docx.Document(file_path)
-        return '\n'.join([paragraph.text for paragraph in doc.paragraphs])
-    elif file_path.endswith('.txt'):
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
+def get_formatting_options(form):
+    """Đọc các tùy chọn định dạng từ form (hoặc dict tương tự), giá trị mặc định giống giao diện."""
+    return {
+        'citation_style': form.get('citation_style', 'apa'),
+        'font_family': form.get('font_family', 'times'),
+        'font_size': form.get('font_size', '12'),
+        'line_spacing': form.get('line_spacing', '2.0'),
+        'margin': form.get('margin', 'normal'),
+        'paragraph_spacing': form.get('paragraph_spacing', 'after'),
+        'page_numbers': 'page_numbers' in form,
+        'title_page': 'title_page' in form,
+        'table_of_contents': 'table_of_contents' in form,
+        'bibliography': 'bibliography' in form,
+        'render_engine': form.get('render_engine', config.DEFAULT_RENDER_ENGINE),
+        'engine': form.get('engine', config.DEFAULT_STRUCTURE_ENGINE),
+        'language': form.get('language', 'auto')
+    }
+
+
+def iter_document_paragraphs(file_path, filename=None):
+    """Generator các đoạn văn (dòng) của tài liệu, đọc dần mà không tải toàn bộ cấu trúc tài liệu.
+
+    file_path có thể là đường dẫn hoặc một đối tượng file (ví dụ BytesIO); khi
+    đó cần truyền filename để xác định loại tệp. Trả về None nếu loại tệp không
+    được hỗ trợ.
+    """
+    name = (filename or (file_path if isinstance(file_path, str) else '')).lower()
+    if name.endswith('.docx'):
+        return iter_docx_paragraphs(file_path)
+    elif name.endswith('.doc'):
+        return iter_doc_paragraphs(file_path)
+    elif name.endswith('.txt'):
+        if isinstance(file_path, str):
+            return _iter_text_lines(open(file_path, 'r', encoding='utf-8', newline=''))
+        return _iter_text_lines(io.TextIOWrapper(file_path, encoding='utf-8', newline=''))
     return None
 
 
-def analyze_text(content):
-    """Phân tích văn bản với spaCy để trích xuất thông tin hữu ích."""
+def _iter_text_lines(stream):
+    with stream:
+        for line in stream:
+            yield line[:-1] if line.endswith('\n') else line
+
+
+def extract_text_from_doc(file_path, filename=None):
+    """Trích xuất văn bản từ tài liệu Word (.docx, .doc) hoặc tệp văn bản.
+
+    file_path có thể là đường dẫn hoặc một đối tượng file (ví dụ BytesIO); khi
+    đó cần truyền filename để xác định loại tệp.
+    """
+    name = (filename or (file_path if isinstance(file_path, str) else '')).lower()
+    with timed('extract'):
+        if name.endswith('.txt'):
+            if isinstance(file_path, str):
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    return f.read()
+            return file_path.read().decode('utf-8')
+        paragraphs = iter_document_paragraphs(file_path, filename)
+        if paragraphs is None:
+            return None
+        try:
+            return '\n'.join(paragraphs)
+        except ExtractionError as e:
+            print(f"Lỗi khi trích xuất văn bản từ {filename or file_path}: {str(e)}")
+            record_fallback('extract_error')
+            return None
+
+
+def use_streaming(content, language=None):
+    """Văn bản lớn (hoặc vượt quá nlp.max_length) được phân tích theo từng khối."""
+    return len(content) > config.STREAMING_THRESHOLD_CHARS or len(content) > get_nlp(language).max_length
+
+
+def streaming_chunk_chars(language=None):
+    """Kích thước tối đa của một khối khi phân tích văn bản lớn theo từng khối."""
+    return min(config.STREAMING_CHUNK_CHARS, get_nlp(language).max_length)
+
+
+def _init_shard_worker():
+    # Worker được fork từ tiến trình đã làm nóng mô hình thì không cần làm lại
+    if not _model_warm:
+        warm_up_model()
+
+
+# Pool xử lý song song các khối của một tài liệu lớn
+shard_pool = ShardPool(max_workers=config.SHARD_WORKERS, initializer=_init_shard_worker,
+                       enabled=config.SHARD_ENABLED)
+
+
+def use_sharding(content, language=None):
+    """Văn bản lớn được phân tích song song theo khối khi pool có nhiều hơn một worker."""
+    return shard_pool.enabled and shard_pool.max_workers > 1 and use_streaming(content, language)
+
+
+def iter_docs(content, profile='full', language=None):
+    """Chạy spaCy (với profile pipeline đã chọn) trên văn bản, trả về generator các tuple (offset, doc).
+
+    Với văn bản nhỏ chỉ có một Doc cho toàn bộ nội dung. Với văn bản lớn, nội
+    dung được chia theo ranh giới đoạn văn và đưa qua nlp.pipe, mỗi Doc được
+    giải phóng sau khi xử lý nên bộ nhớ không tăng theo kích thước tài liệu.
+    language là mã ngôn ngữ của pipeline (xem select_language).
+    """
+    nlp = get_nlp(language)
+    disable = disabled_components(nlp, profile)
+    if not use_streaming(content, language):
+        yield 0, nlp(content, disable=disable)
+        return
+
+    chunk_chars = streaming_chunk_chars(language)
+    offsets = []
+
+    def chunk_texts():
+        for offset, chunk in iter_text_chunks(content, chunk_chars):
+            offsets.append(offset)
+            yield chunk
+
+    for index, doc in enumerate(nlp.pipe(chunk_texts(), batch_size=config.STREAMING_BATCH_SIZE,
+                                           disable=disable)):
+        yield offsets[index], doc
+
+
+def pipe_with_structure(nlp, texts, batch_size=None, n_process=1):
+    """Generator các cặp (doc, structure_doc) cho từng văn bản, tách từ một lần.
+
+    doc đã chạy profile 'analyze'; structure_doc là bản sao của cùng Doc đã tách
+    từ, chỉ chạy profile 'structure' (câu giống hệt khi gọi nlp với profile đó,
+    như /upload), nên mô hình không phải chạy lại để lấy cấu trúc định dạng.
+    """
+    batch_size = batch_size or config.STREAMING_BATCH_SIZE
+    pairs = ((doc, doc.copy()) for doc in map(nlp.make_doc, texts))
+    analyze_pairs, structure_pairs = itertools.tee(pairs)
+    docs = nlp.pipe((doc for doc, _ in analyze_pairs), batch_size=batch_size, n_process=n_process,
+                    disable=disabled_components(nlp, 'analyze'))
+    structure_docs = nlp.pipe((copy for _, copy in structure_pairs), batch_size=batch_size,
+                              n_process=n_process, disable=disabled_components(nlp, 'structure'))
+    return zip(docs, structure_docs)
+
+
+def iter_parsed_docs(content, language=None):
+    """Như iter_docs với profile 'analyze', nhưng trả về các tuple (offset, doc, structure_doc).
+
+    Văn bản được chia khối giống hệt iter_docs (xem pipe_with_structure).
+    """
+    nlp = get_nlp(language)
+    if use_streaming(content, language):
+        chunks = iter_text_chunks(content, streaming_chunk_chars(language))
+    else:
+        chunks = [(0, content)]
+    offsets = []
+
+    def chunk_texts():
+        for offset, chunk in chunks:
+            offsets.append(offset)
+            yield chunk
+
+    for index, (doc, structure_doc) in enumerate(pipe_with_structure(nlp, chunk_texts())):
+        yield offsets[index], doc, structure_doc
+
+
+def _analyze_shard(shard):
+    """Hàm chạy trong worker của shard_pool: kết quả phân tích của một khối (chunk, language)."""
+    chunk, language = shard
+    accumulator = AnalysisAccumulator()
+    nlp = get_nlp(language)
+    accumulator.add_doc(nlp(chunk, disable=disabled_components(nlp, 'analyze')))
+    return accumulator
+
+
+def _analysis_accumulator(content, language=None):
+    """Phân tích toàn bộ văn bản; văn bản lớn được phân tích song song theo khối nếu có thể.
+
+    Các khối giống hệt với cách chia của iter_docs và được gộp theo thứ tự,
+    nên kết quả trùng với khi phân tích tuần tự.
+    """
+    if use_sharding(content, language):
+        shards = [(chunk, language) for _, chunk in iter_text_chunks(content, streaming_chunk_chars(language))]
+        try:
+            accumulator = AnalysisAccumulator()
+            for part in shard_pool.map(_analyze_shard, shards):
+                accumulator.merge(part)
+            return accumulator
+        except Exception as e:
+            print(f"Lỗi khi phân tích song song, chuyển sang phân tích tuần tự: {str(e)}")
+            record_fallback('shard_error')
+
+    accumulator = AnalysisAccumulator()
+    for _, doc in iter_docs(content, profile='analyze', language=language):
+        accumulator.add_doc(doc)
+    return accumulator
+
+
+def _paragraph_result(doc, profile, structure_doc=None):
+    """Kết quả lưu trong bộ nhớ đệm cho một đoạn văn: ParseArrays ('analyze') hoặc danh sách câu ('structure')."""
+    if profile == 'analyze':
+        arrays = ParseArrays()
+        arrays.add_doc(doc, structure_doc=structure_doc)
+        return arrays
+    return _doc_sentences(doc)
+
+
+def _parse_paragraph_texts(texts, language, profile, batch_size=None, n_process=1, structure=False):
+    nlp = get_nlp(language)
+    batch_size = batch_size or config.BATCH_NLP_BATCH_SIZE
+    if structure:
+        return [_paragraph_result(doc, profile, structure_doc)
+                for doc, structure_doc in pipe_with_structure(nlp, texts, batch_size, n_process)]
+    docs = nlp.pipe(texts, batch_size=batch_size, n_process=n_process,
+                    disable=disabled_components(nlp, profile))
+    return [_paragraph_result(doc, profile) for doc in docs]
+
+
+def _paragraph_shard(shard):
+    """Hàm chạy trong worker của shard_pool: kết quả của từng đoạn văn trong một nhóm (texts, language, profile, structure)."""
+    texts, language, profile, structure = shard
+    return _parse_paragraph_texts(texts, language, profile, structure=structure)
+
+
+def _paragraph_groups(texts, max_chars):
+    """Chia danh sách đoạn văn thành các nhóm liên tiếp có tổng độ dài không quá max_chars."""
+    groups = [[]]
+    group_chars = 0
+    for text in texts:
+        if groups[-1] and group_chars + len(text) > max_chars:
+            groups.append([])
+            group_chars = 0
+        groups[-1].append(text)
+        group_chars += len(text)
+    return groups
+
+
+_MISSING = object()
+
+
+def parse_paragraphs(texts, language, profile, batch_size=None, n_process=1, structure=False):
+    """Kết quả phân tích của từng đoạn văn theo thứ tự, mỗi kết quả tính với vị trí ký tự bắt đầu từ 0.
+
+    Kết quả được lấy từ paragraph_cache nếu có; chỉ các đoạn văn còn lại (mỗi
+    văn bản khác nhau một lần) chạy qua nlp.pipe, song song trong shard_pool
+    nếu tổng độ dài lớn, rồi được lưu vào bộ nhớ đệm. Tỷ lệ đoạn văn dùng lại
+    được ghi vào số liệu của yêu cầu hiện tại. Với profile 'analyze' và
+    structure=True, ParseArrays có thêm câu của profile 'structure' (xem pipe_with_structure).
+    """
+    namespace = f"{profile}{'+structure' if structure else ''}\0{language}\0{model_registry.models[language]}"
+    keys = [paragraph_cache.make_key(namespace, text) for text in texts]
+    results = [paragraph_cache.get(key, _MISSING) for key in keys]
+
+    # Văn bản của đoạn văn chưa có trong bộ nhớ đệm -> các vị trí của nó
+    missing = {}
+    for index, result in enumerate(results):
+        if result is _MISSING:
+            missing.setdefault(texts[index], []).append(index)
+    reused = len(texts) - sum(len(indexes) for indexes in missing.values())
+
+    if missing:
+        missing_texts = list(missing)
+        parsed = None
+        if (shard_pool.enabled and shard_pool.max_workers > 1 and
+                sum(map(len, missing_texts)) > config.STREAMING_THRESHOLD_CHARS):
+            shards = [(group, language, profile, structure)
+                      for group in _paragraph_groups(missing_texts, streaming_chunk_chars(language))]
+            try:
+                parsed = [result for part in shard_pool.map(_paragraph_shard, shards) for result in part]
+            except Exception as e:
+                print(f"Lỗi khi phân tích song song, chuyển sang phân tích tuần tự: {str(e)}")
+                record_fallback('shard_error')
+        if parsed is None:
+            parsed = _parse_paragraph_texts(missing_texts, language, profile, batch_size, n_process, structure)
+
+        for text, result in zip(missing_texts, parsed):
+            indexes = missing[text]
+            paragraph_cache.set(keys[indexes[0]], result)
+            for index in indexes:
+                results[index] = result
+
+    record_paragraph_reuse(reused, len(texts))
+    if texts:
+        print(f"Dùng lại {reused}/{len(texts)} đoạn văn từ bộ nhớ đệm ({reused / len(texts):.0%})")
+    return results
+
+
+def _parse_arrays(content, language, structure=False):
+    """ParseArrays của toàn bộ văn bản (profile 'analyze'); phát sinh ngoại lệ nếu mô hình lỗi.
+
+    Với structure=True, các mảng có thêm câu của profile 'structure' cho cùng
+    cách chia khối/đoạn văn như build_analyzed_document.
+    """
+    if config.PARAGRAPH_CACHE_ENABLED:
+        paragraphs = list(iter_paragraphs(content, streaming_chunk_chars(language)))
+        arrays = ParseArrays()
+        results = parse_paragraphs([text for _, text in paragraphs], language, 'analyze', structure=structure)
+        for (offset, _), part in zip(paragraphs, results):
+            arrays.merge(part, offset)
+        return arrays
+
+    if use_sharding(content, language):
+        shards = [(offset, chunk, language, structure)
+                  for offset, chunk in iter_text_chunks(content, streaming_chunk_chars(language))]
+        try:
+            arrays = ParseArrays()
+            for part in shard_pool.map(_parse_shard, shards):
+                arrays.merge(part)
+            return arrays
+        except Exception as e:
+            print(f"Lỗi khi phân tích song song, chuyển sang phân tích tuần tự: {str(e)}")
+            record_fallback('shard_error')
+
+    arrays = ParseArrays()
+    if structure:
+        for offset, doc, structure_doc in iter_parsed_docs(content, language):
+            arrays.add_doc(doc, offset, structure_doc)
+    else:
+        for offset, doc in iter_docs(content, profile='analyze', language=language):
+            arrays.add_doc(doc, offset)
+    return arrays
+
+
+def _parse_shard(shard):
+    """Hàm chạy trong worker của shard_pool: các mảng kết quả phân tích của một khối (offset, chunk, language, structure)."""
+    offset, chunk, language, structure = shard
+    arrays = ParseArrays()
+    nlp = get_nlp(language)
+    if structure:
+        for doc, structure_doc in pipe_with_structure(nlp, [chunk]):
+            arrays.add_doc(doc, offset, structure_doc)
+    else:
+        arrays.add_doc(nlp(chunk, disable=disabled_components(nlp, 'analyze')), offset)
+    return arrays
+
+
+def parse_document(content, language=None):
+    """Chạy spaCy một lần trên văn bản và trả về ParsedDocument (dạng mảng gọn), hoặc None nếu có lỗi.
+
+    Văn bản được tách từ một lần; profile 'analyze' cho kết quả của analyze_text
+    và profile 'structure' (chạy trên bản sao Doc) cho câu và tiêu đề của các
+    bước định dạng, giống hệt build_analyzed_document (như /upload).
+    Với PARAGRAPH_CACHE_ENABLED, các đoạn văn đã phân tích trước đó được lấy từ bộ nhớ đệm.
+    """
     try:
-        doc = nlp(content)
+        language = select_language(content, language)
+        with timed('nlp_parse'):
+            return _parse_arrays(content, language, structure=True).build(content)
+    except Exception as e:
+        print(f"Lỗi khi phân tích tài liệu: {str(e)}")
+        record_fallback('parse_error')
+        return None
+
+
+def analyze_text(content, parsed=None, language=None):
+    """Phân tích văn bản với spaCy để trích xuất thông tin hữu ích.
+
+    Nếu có parsed (ParsedDocument của cùng văn bản), kết quả được tạo từ đó mà không chạy lại mô hình.
+    language chọn pipeline (xem select_language).
+    """
+    try:
+        if parsed is not None:
+            accumulator = parsed.analysis_accumulator()
+        else:
+            language = select_language(content, language)
+            with timed('nlp_analyze'):
+                if config.PARAGRAPH_CACHE_ENABLED:
+                    # Cùng kết quả với khi chạy mô hình, nhưng dùng lại các đoạn văn đã phân tích
+                    accumulator = _parse_arrays(content, language).build(content).analysis_accumulator()
+                else:
+                    accumulator = _analysis_accumulator(content, language)
         
         # Kiểm tra xem mô hình có khả năng phân tích văn bản không
-        has_nlp_capabilities = hasattr(doc[0], 'pos_') if len(doc) > 0 else False
+        has_nlp_capabilities = accumulator.has_tokens
         
         if has_nlp_capabilities:
             # Phân tích NLP đầy đủ
-            analysis = {
-                'entities': [{'text': ent.text, 'label': ent.label_} for ent in doc.ents],
-                'sentences': len(list(doc.sents)),
-                'tokens': len(doc),
-                'keywords': [token.text for token in doc if token.pos_ in ("NOUN", "ADJ", "VERB") 
-                            and not token.is_stop and len(token.text) > 3][:50],
-                'noun_chunks': [chunk.text for chunk in doc.noun_chunks][:50]
-            }
+            analysis = accumulator.to_dict(idf_index)
         else:
             # Phân tích cơ bản khi không có khả năng NLP đầy đủ
+            record_fallback('analyze_basic')
             words = content.split()
             sentences = [s.strip() for s in re.split(r'[.!?]+', content) if s.strip()]
             
-            # Ước tính các từ khóa bằng tần suất xuất hiện
-            word_freq = {}
-            for word in words:
-                word = re.sub(r'[^\w\s]', '', word.lower())
-                if word and len(word) > 3:
-                    word_freq[word] = word_freq.get(word, 0) + 1
-            
-            # Lấy top từ khóa theo tần suất
-            keywords = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)
-            keywords = [word for word, freq in keywords[:50]]
+            # Từ khóa: đếm các từ của văn bản thuần và xếp hạng TF-IDF
+            accumulator.term_counts.add_text(content)
             
             analysis = {
                 'entities': [],
                 'sentences': len(sentences),
                 'tokens': len(words),
-                'keywords': keywords,
+                'keywords': accumulator.term_counts.top_keywords(idf_index, MAX_KEYWORDS),
                 'noun_chunks': []
             }
         
+        # Cập nhật bảng IDF với tài liệu vừa phân tích
+        if config.KEYWORD_IDF_UPDATE:
+            idf_index.add_document(accumulator.term_counts.ids)
+        
         return analysis
     except Exception as e:
         # Fallback nếu có lỗi: trả về phân tích cơ bản
         print(f"Lỗi trong quá trình phân tích văn bản: {str(e)}")
+        record_fallback('analyze_error')
         words = content.split()
         sentences = [s.strip() for s in re.split(r'[.!?]+', content) if s.strip()]
         
@@ -110,45 +584,198 @@ def analyze_text(content):
         }
 
 
-def format_text_with_spacy(content, formatting_options):
-    """Định dạng nội dung văn bản bằng spaCy """
+def _doc_sentences(doc, offset=0):
+    """Các câu (text, start_char, end_char, is_heading) của một spaCy Doc bắt đầu tại offset.
+
+    Trả về None nếu mô hình không có khả năng phân tích văn bản.
+    """
+    # Kiểm tra xem mô hình có khả năng phân tích văn bản không
+    has_nlp_capabilities = hasattr(doc[0], 'pos_') if len(doc) > 0 else False
+    if not has_nlp_capabilities:
+        return None
+    
+    sentences = []
+    for sent in doc.sents:
+        sent_text = sent.text.strip()
+        sentences.append((sent_text, offset + sent.start_char, offset + sent.end_char,
+                          is_heading_sentence(sent_text, sent)))
+    return sentences
+
+
+def _fill_analyzed_document(analyzed, sentences, offset=0):
+    """Điền các câu (kết quả của _doc_sentences) vào AnalyzedDocument, vị trí ký tự cộng thêm offset."""
+    if sentences is not None:
+        analyzed.has_nlp_capabilities = True
+        for sent_text, start_char, end_char, is_heading in sentences:
+            analyzed.add_sentence(sent_text, offset + start_char, offset + end_char, is_heading)
+
+
+def _fill_paragraph_structure(analyzed_documents, language, batch_size=None, n_process=1):
+    """Điền câu và tiêu đề vào các AnalyzedDocument (cùng ngôn ngữ) từ kết quả phân tích theo đoạn văn."""
+    chunk_chars = streaming_chunk_chars(language)
+    paragraphs = [(analyzed, offset, text) for analyzed in analyzed_documents
+                  for offset, text in iter_paragraphs(analyzed.content, chunk_chars)]
+    results = parse_paragraphs([text for _, _, text in paragraphs], language, 'structure', batch_size, n_process)
+    for (analyzed, offset, _), sentences in zip(paragraphs, results):
+        _fill_analyzed_document(analyzed, sentences, offset)
+
+
+def _structure_shard(shard):
+    """Hàm chạy trong worker của shard_pool: các câu của một khối (offset, chunk, language)."""
+    offset, chunk, language = shard
+    nlp = get_nlp(language)
+    return _doc_sentences(nlp(chunk, disable=disabled_components(nlp, 'structure')), offset)
+
+
+def _fill_sharded_structure(analyzed, language=None):
+    """Phân tích cấu trúc song song theo khối; trả về False nếu cần chuyển sang phân tích tuần tự."""
+    shards = [(offset, chunk, language)
+              for offset, chunk in iter_text_chunks(analyzed.content, streaming_chunk_chars(language))]
     try:
-        doc = nlp(content)
+        results = shard_pool.map(_structure_shard, shards)
+    except Exception as e:
+        print(f"Lỗi khi phân tích cấu trúc song song, chuyển sang phân tích tuần tự: {str(e)}")
+        record_fallback('shard_error')
+        return False
+    
+    # Gộp theo thứ tự khối: tiêu đề và câu giữ nguyên thứ tự như khi phân tích tuần tự
+    for sentences in results:
+        _fill_analyzed_document(analyzed, sentences)
+    return True
+
+
+def structure_engine(formatting_options):
+    """Engine phát hiện cấu trúc được chọn: 'spacy' (mô hình) hoặc 'fast' (quy tắc, không dùng spaCy)."""
+    engine = formatting_options.get('engine') or config.DEFAULT_STRUCTURE_ENGINE
+    if engine not in config.STRUCTURE_ENGINES:
+        raise ValueError(f"Engine định dạng không hợp lệ: {engine}")
+    return engine
+
+
+def build_analyzed_document(content, engine='spacy', language=None):
+    """Chạy spaCy một lần trên văn bản và tạo AnalyzedDocument dùng chung cho các bước định dạng.
+
+    Với engine='fast', câu và tiêu đề được xác định bằng quy tắc (fast_structure.py).
+    language chọn pipeline (xem select_language).
+    """
+    if engine == 'fast':
+        with timed('fast_structure'):
+            return build_fast_analyzed_document(content)
+
+    analyzed = AnalyzedDocument(content)
+    try:
+        language = select_language(content, language)
+        with timed('nlp_structure'):
+            if config.PARAGRAPH_CACHE_ENABLED:
+                _fill_paragraph_structure([analyzed], language)
+            elif not (use_sharding(content, language) and _fill_sharded_structure(analyzed, language)):
+                for offset, doc in iter_docs(content, profile='structure', language=language):
+                    _fill_analyzed_document(analyzed, _doc_sentences(doc, offset))
+    except Exception as e:
+        print(f"Lỗi khi phân tích cấu trúc văn bản: {str(e)}")
+        record_fallback('structure_error')
+        analyzed.error = e
+    
+    return analyzed
+
+
+def build_analyzed_documents(contents, batch_size=32, n_process=1, engine='spacy', language=None):
+    """Phân tích nhiều văn bản cùng lúc bằng nlp.pipe, trả về danh sách AnalyzedDocument theo thứ tự.
+
+    Văn bản lớn được phân tích riêng theo từng khối (xem iter_docs); với
+    PARAGRAPH_CACHE_ENABLED, các đoạn văn của mọi văn bản được phân tích cùng
+    lúc qua bộ nhớ đệm đoạn văn (xem parse_paragraphs). Với
+    language='auto', ngôn ngữ được phát hiện cho từng văn bản và mỗi nhóm cùng
+    ngôn ngữ được phân tích bằng nlp.pipe của pipeline tương ứng.
+    """
+    contents = list(contents)
+    if engine == 'fast':
+        return [build_analyzed_document(content, engine) for content in contents]
+    analyzed_documents = [None] * len(contents)
+    # Ngôn ngữ không được hỗ trợ gây ra ValueError
+    languages = [select_language(content, language) for content in contents]
+    
+    try:
+        groups = {}
+        for i, content in enumerate(contents):
+            if config.PARAGRAPH_CACHE_ENABLED or not use_streaming(content, languages[i]):
+                groups.setdefault(languages[i], []).append(i)
         
-        # Kiểm tra xem mô hình có khả năng phân tích văn bản không
-        has_nlp_capabilities = hasattr(doc[0], 'pos_') if len(doc) > 0 else False
+        with timed('nlp_structure_batch'):
+            for group_language, indexes in groups.items():
+                if config.PARAGRAPH_CACHE_ENABLED:
+                    # Các đoạn văn của mọi văn bản trong nhóm được phân tích cùng lúc
+                    group = [AnalyzedDocument(contents[i]) for i in indexes]
+                    _fill_paragraph_structure(group, group_language, batch_size, n_process)
+                    for i, analyzed in zip(indexes, group):
+                        analyzed_documents[i] = analyzed
+                    continue
+                nlp = get_nlp(group_language)
+                docs = nlp.pipe((contents[i] for i in indexes), batch_size=batch_size, n_process=n_process,
+                                disable=disabled_components(nlp, 'structure'))
+                for i, doc in zip(indexes, docs):
+                    analyzed = AnalyzedDocument(contents[i])
+                    try:
+                        _fill_analyzed_document(analyzed, _doc_sentences(doc))
+                    except Exception as e:
+                        print(f"Lỗi khi phân tích cấu trúc văn bản: {str(e)}")
+                        record_fallback('structure_error')
+                        analyzed.error = e
+                    analyzed_documents[i] = analyzed
+    except Exception as e:
+        # Nếu nlp.pipe thất bại, các văn bản còn lại sẽ được phân tích lần lượt
+        print(f"Lỗi khi phân tích theo lô, chuyển sang phân tích từng văn bản: {str(e)}")
+        record_fallback('batch_pipe_error')
+    
+    for i, content in enumerate(contents):
+        if analyzed_documents[i] is None:
+            analyzed_documents[i] = build_analyzed_document(content, language=languages[i])
+    return analyzed_documents
+
+
+def format_text_with_spacy(content, formatting_options, analyzed=None, parsed=None):
+    """Định dạng nội dung văn bản bằng spaCy (từ analyzed hoặc parsed nếu có, không chạy lại mô hình)."""
+    try:
+        if analyzed is None and parsed is not None:
+            analyzed = parsed.analyzed_document()
+        if analyzed is None:
+            analyzed = build_analyzed_document(content, structure_engine(formatting_options),
+                                               formatting_options.get('language'))
+        if analyzed.error is not None:
+            raise analyzed.error
         
         # Phân tích cấu trúc văn bản
         paragraphs = []
         headings = []
+        # Vị trí (start, end) của các câu trong mỗi đoạn văn, dùng để định dạng trích dẫn
+        paragraph_spans = []
         
-        if has_nlp_capabilities:
+        if analyzed.has_nlp_capabilities:
             # Xác định các tiêu đề và đoạn văn với NLP
             current_paragraph = []
-            for sent in doc.sents:
-                sent_text = sent.text.strip()
-                
-                # Phát hiện tiêu đề dựa trên độ dài, hoa/thường, số từ
-                is_heading = (len(sent_text) < 100 and 
-                            len(sent_text.split()) < 10 and 
-                            any(token.is_title for token in sent if token.is_alpha))
-                
+            current_spans = []
+            for sent_text, start_char, end_char, is_heading in analyzed.sentences:
                 if is_heading:
                     # Nếu có đoạn văn đang mở, đóng lại
                     if current_paragraph:
                         paragraphs.append(' '.join(current_paragraph))
+                        paragraph_spans.append(current_spans)
                         current_paragraph = []
+                        current_spans = []
                     
                     # Thêm tiêu đề
                     headings.append(sent_text)
                 else:
                     current_paragraph.append(sent_text)
+                    current_spans.append((start_char, end_char))
             
             # Thêm đoạn văn cuối cùng nếu có
             if current_paragraph:
                 paragraphs.append(' '.join(current_paragraph))
+                paragraph_spans.append(current_spans)
         else:
             # Fallback khi không có khả năng NLP: chia theo đoạn và thêm tiêu đề tự động
+            record_fallback('format_basic')
             raw_paragraphs = content.split('\n\n')
             
             # Tìm các tiêu đề tiềm năng (dòng ngắn)
@@ -176,9 +803,11 @@ def format_text_with_spacy(content, formatting_options):
                 # Nếu không có câu phù hợp, tạo tiêu đề mặc định
                 headings = ["Document"]
         
-        # Xử lý trích dẫn
+        # Xử lý trích dẫn: dùng kết quả quét trích dẫn một lần trên toàn bộ văn bản
         formatted_text = ""
         citation_style = formatting_options['citation_style']
+        citation_scan = analyzed.citation_scan(citation_style)
+        citation_engine = get_citation_engine(citation_style)
         
         # Định dạng tiêu đề theo thứ tự
         for i, heading in enumerate(headings):
@@ -187,22 +816,12 @@ def format_text_with_spacy(content, formatting_options):
             
             # Thêm một đoạn văn sau mỗi tiêu đề nếu có
             if i < len(paragraphs):
-                # Định dạng trích dẫn (giả định)
-                para = paragraphs[i]
-                
                 # Định dạng trích dẫn theo kiểu đã chọn
-                if citation_style == 'apa':
-                    # Định dạng kiểu APA (Author, Year)
-                    para = re.sub(r'\(([^)]+), (\d{4})\)', r'(\1, \2)', para)
-                elif citation_style == 'mla':
-                    # Định dạng kiểu MLA (Author page)
-                    para = re.sub(r'\(([^)]+) (\d+)\)', r'(\1 \2)', para)
-                elif citation_style == 'chicago':
-                    # Định dạng kiểu Chicago (chú thích)
-                    para = re.sub(r'\[\d+\]', lambda m: f"^{m.group(0)[1:-1]}", para)
-                elif citation_style == 'ieee':
-                    # Định dạng kiểu IEEE [số]
-                    para = re.sub(r'\((\d+)\)', r'[\1]', para)
+                if i < len(paragraph_spans):
+                    para = ' '.join(citation_scan.rewrite_span(start, end).strip()
+                                    for start, end in paragraph_spans[i])
+                else:
+                    para = citation_engine.rewrite(paragraphs[i])
                 
                 formatted_text += para + "\n\n"
         
@@ -215,6 +834,7 @@ def format_text_with_spacy(content, formatting_options):
     except Exception as e:
         # Fallback nếu có lỗi khi xử lý: trả về nội dung gốc với định dạng cơ bản
         print(f"Lỗi trong quá trình xử lý văn bản: {str(e)}")
+        record_fallback('format_error')
         
         # Định dạng văn bản đơn giản
         paragraphs = content.split('\n\n')
@@ -227,193 +847,130 @@ def format_text_with_spacy(content, formatting_options):
         return formatted_text
 
 
-def create_formatted_document(content, formatting_options, output_path):
-    """Tạo tài liệu Word được định dạng dựa trên các tùy chọn định dạng."""
-    print(f"Đang áp dụng các tùy chọn định dạng: {formatting_options}")
-    
-    doc = docx.Document()
-    
-    # Set document-wide font
-    style = doc.styles['Normal']
-    font = style.font
-    font.name = formatting_options['font_family']
-    font.size = Pt(int(formatting_options['font_size']))
-    
-    # Set document-wide paragraph spacing
-    paragraph_format = style.paragraph_format
-    if formatting_options['line_spacing'] == '2.0':
-        paragraph_format.line_spacing = 2.0
-    elif formatting_options['line_spacing'] == '1.5':
-        paragraph_format.line_spacing = 1.5
-    else:
-        paragraph_format.line_spacing = 1.0
-    
-    # Set margins
-    sections = doc.sections
-    for section in sections:
-        if formatting_options['margin'] == 'normal':
-            section.left_margin = section.right_margin = section.top_margin = section.bottom_margin = Inches(1)
-        elif formatting_options['margin'] == 'wide':
-            section.left_margin = section.right_margin = section.top_margin = section.bottom_margin = Inches(1.5)
-        else:  # narrow
-            section.left_margin = section.right_margin = section.top_margin = section.bottom_margin = Inches(0.5)
+def build_document_blocks(content, formatting_options, analyzed):
+    """Xây dựng danh sách khối (loại, văn bản) của tài liệu đầu ra, dùng chung cho mọi engine hiển thị."""
+    blocks = []
 
     # Thêm trang tiêu đề nếu được yêu cầu
     if formatting_options['title_page']:
-        # Phân tích văn bản để trích xuất tiêu đề
-        doc_nlp = nlp(content[:500])  # Chỉ phân tích 500 ký tự đầu tiên để tìm tiêu đề
-        potential_title = next((sent.text for sent in doc_nlp.sents 
-                              if len(sent.text) < 100 and sent.text.strip()), "Document Title")
-        
-        title_paragraph = doc.add_paragraph()
-        title_paragraph.alignment = 1  # Center
-        title_run = title_paragraph.add_run(potential_title)
-        title_run.font.size = Pt(16)
-        title_run.font.name = formatting_options['font_family']
-        title_run.font.bold = True
-        doc.add_paragraph()
+        blocks.append((BLOCK_TITLE, analyzed.title))
+        blocks.append((BLOCK_EMPTY, ''))
 
     # Thêm bảng nội dung nếu được yêu cầu
     if formatting_options['table_of_contents']:
-        toc_paragraph = doc.add_paragraph()
-        toc_paragraph.alignment = 1  # Center
-        toc_run = toc_paragraph.add_run("Table of Contents")
-        toc_run.font.size = Pt(14)
-        toc_run.font.name = formatting_options['font_family']
-        toc_run.font.bold = True
-        doc.add_paragraph()
+        blocks.append((BLOCK_SECTION_TITLE, "Table of Contents"))
+        blocks.append((BLOCK_EMPTY, ''))
         
-        # Tạo danh sách mục lục bằng cách phân tích văn bản với spaCy
-        doc_nlp = nlp(content)
-        headings = []
+        # Lấy danh sách tiêu đề đã được phát hiện khi phân tích văn bản
+        for i, heading in enumerate(analyzed.headings[:10]):  # Giới hạn 10 mục
+            blocks.append((BLOCK_TOC_ENTRY, f"{i+1}. {heading}"))
         
-        # Tìm các tiêu đề tiềm năng
-        for sent in doc_nlp.sents:
-            sent_text = sent.text.strip()
-            # Phát hiện tiêu đề dựa trên độ dài, hoa/thường, số từ
-            is_heading = (len(sent_text) < 100 and 
-                          len(sent_text.split()) < 10 and 
-                          any(token.is_title for token in sent if token.is_alpha))
+        blocks.append((BLOCK_EMPTY, ''))
+
+    # Phân tích và định dạng nội dung với spaCy
+    formatted_text = format_text_with_spacy(content, formatting_options, analyzed)
+    
+    # Chia văn bản thành các phần dựa trên tiêu đề
+    sections = re.split(r'\n(?=\d+\.)', formatted_text)
+    
+    for section in sections:
+        if not section.strip():
+            continue
             
-            if is_heading:
-                headings.append(sent_text)
+        # Tách tiêu đề (nếu có) và nội dung
+        section_lines = section.strip().split('\n\n', 1)
         
-        # Thêm vào mục lục
-        for i, heading in enumerate(headings[:10]):  # Giới hạn 10 mục
-            toc_entry = doc.add_paragraph()
-            toc_entry.add_run(f"{i+1}. {heading}")
-            
-        doc.add_paragraph()
+        # Nếu có tiêu đề (dòng đầu tiên chứa số.), tạo đoạn riêng cho tiêu đề
+        if section_lines and re.match(r'^\d+\.', section_lines[0]):
+            blocks.append((BLOCK_HEADING, section_lines[0]))
+            if len(section_lines) > 1:
+                blocks.append((BLOCK_BODY, section_lines[1]))
+        else:
+            # Nếu không có tiêu đề, thêm toàn bộ phần vào một đoạn
+            blocks.append((BLOCK_BODY, section.strip()))
 
-    try:
-        # Phân tích và định dạng nội dung với spaCy
-        formatted_text = format_text_with_spacy(content, formatting_options)
+    # Thêm tài liệu tham khảo nếu được yêu cầu
+    if formatting_options['bibliography']:
+        blocks.append((BLOCK_EMPTY, ''))
+        blocks.append((BLOCK_SECTION_TITLE, "References"))
         
-        # Chia văn bản thành các phần dựa trên tiêu đề
-        sections = re.split(r'\n(?=\d+\.)', formatted_text)
-        
-        # Áp dụng định dạng cho từng phần
-        for section in sections:
-            if not section.strip():
-                continue
-                
-            # Tách tiêu đề (nếu có) và nội dung
-            section_lines = section.strip().split('\n\n', 1)
-            
-            # Nếu có tiêu đề (dòng đầu tiên chứa số.), tạo đoạn riêng cho tiêu đề
-            if section_lines and re.match(r'^\d+\.', section_lines[0]):
-                # Thêm tiêu đề
-                heading_para = doc.add_paragraph()
-                heading_para.style = 'Heading 1'
-                heading_run = heading_para.add_run(section_lines[0])
-                heading_run.font.size = Pt(14)
-                heading_run.font.name = formatting_options['font_family']
-                heading_run.font.bold = True
-                
-                # Thêm nội dung (nếu có)
-                if len(section_lines) > 1:
-                    content_text = section_lines[1]
-                    para = doc.add_paragraph()
-                    para.style = 'Normal'
-                    run = para.add_run(content_text)
-                    run.font.name = formatting_options['font_family']
-                    run.font.size = Pt(int(formatting_options['font_size']))
-                    
-                    # Set line spacing
-                    if formatting_options['line_spacing'] == '2.0':
-                        para.paragraph_format.line_spacing = 2.0
-                    elif formatting_options['line_spacing'] == '1.5':
-                        para.paragraph_format.line_spacing = 1.5
-                    else:
-                        para.paragraph_format.line_spacing = 1.0
-            else:
-                # Nếu không có tiêu đề, thêm toàn bộ phần vào một đoạn
-                para = doc.add_paragraph()
-                para.style = 'Normal'
-                run = para.add_run(section.strip())
-                run.font.name = formatting_options['font_family']
-                run.font.size = Pt(int(formatting_options['font_size']))
-                
-                # Set line spacing
-                if formatting_options['line_spacing'] == '2.0':
-                    para.paragraph_format.line_spacing = 2.0
-                elif formatting_options['line_spacing'] == '1.5':
-                    para.paragraph_format.line_spacing = 1.5
-                else:
-                    para.paragraph_format.line_spacing = 1.0
-
-        # Thêm số trang nếu được yêu cầu
-        if formatting_options['page_numbers']:
-            for section in doc.sections:
-                footer = section.footer
-                paragraph = footer.paragraphs[0] if footer.paragraphs else footer.add_paragraph()
-                paragraph.alignment = 1  # Center
-                paragraph.text = "Page "
-                run = paragraph.add_run()
-                run.font.name = formatting_options['font_family']
-                paragraph.text = "- Page # -"
-
-        # Thêm tài liệu tham khảo nếu được yêu cầu
-        if formatting_options['bibliography']:
+        # Thêm các trích dẫn (không trùng lặp) phù hợp với kiểu đã chọn
+        citation_scan = analyzed.citation_scan(formatting_options['citation_style'])
+        for cite in citation_scan.bibliography:
+            blocks.append((BLOCK_REFERENCE, f"{cite} - Reference details"))
+
+    return blocks
+
+
+def render_docx_document(blocks, formatting_options, output_path):
+    """Engine python-docx: tạo tài liệu Word từ danh sách khối và lưu vào output_path.
+
+    Font, khoảng cách dòng, lề, số trang và style tiêu đề đã có sẵn trong mẫu
+    (docx_templates.py), nên mỗi đoạn văn chỉ cần tham chiếu style.
+    """
+    doc = new_templated_document(formatting_options)
+    styles = {kind: doc.styles[name] for kind, name in TEMPLATE_STYLES.items()}
+
+    for kind, text in blocks:
+        if kind in styles:
+            doc.add_paragraph(text, styles[kind])
+        elif kind in (BLOCK_BODY, BLOCK_TOC_ENTRY, BLOCK_REFERENCE):
+            doc.add_paragraph(text)
+        else:
             doc.add_paragraph()
-            biblio_heading = doc.add_paragraph()
-            biblio_heading.alignment = 1  # Center
-            biblio_heading_run = biblio_heading.add_run("References")
-            biblio_heading_run.font.size = Pt(14)
-            biblio_heading_run.font.name = formatting_options['font_family']
-            biblio_heading_run.font.bold = True
-            
-            # Phân tích văn bản và tìm các trích dẫn tiềm năng
-            doc_nlp = nlp(content)
-            potential_citations = []
-            
-            # Tìm các mẫu trích dẫn phù hợp với kiểu đã chọn
-            citation_pattern = None
-            if formatting_options['citation_style'] == 'apa':
-                citation_pattern = re.compile(r'\(([^)]+), (\d{4})[^)]*\)')
-            elif formatting_options['citation_style'] == 'mla':
-                citation_pattern = re.compile(r'\(([^)]+) (\d+)[^)]*\)')
-            elif formatting_options['citation_style'] == 'chicago':
-                citation_pattern = re.compile(r'\[\d+\]')
-            elif formatting_options['citation_style'] == 'ieee':
-                citation_pattern = re.compile(r'\[(\d+)\]')
-            
-            if citation_pattern:
-                for match in citation_pattern.finditer(content):
-                    potential_citations.append(match.group(0))
+
+    # output_path có thể là đường dẫn hoặc một buffer (ví dụ BytesIO)
+    doc.save(output_path)
+
+
+# Các engine hiển thị tài liệu, chọn bằng formatting_options['render_engine']
+RENDER_ENGINES = {
+    'docx': render_docx_document,
+    'ooxml': write_ooxml_document,
+}
+
+
+# Các tùy chọn định dạng quyết định danh sách khối; các tùy chọn còn lại (font, cỡ chữ,
+# khoảng cách dòng, lề, số trang, engine hiển thị) chỉ ảnh hưởng đến bước hiển thị
+BLOCK_OPTIONS = ('engine', 'citation_style', 'title_page', 'table_of_contents', 'bibliography', 'language')
+
+
+def block_options_key(formatting_options):
+    """Khóa của danh sách khối theo tùy chọn định dạng (dùng để tái sử dụng khi chỉ đổi font, lề...)."""
+    return (structure_engine(formatting_options),) + tuple(
+        formatting_options.get(name) for name in BLOCK_OPTIONS[1:])
+
+
+def create_formatted_document(content, formatting_options, output_path, analyzed=None, blocks=None):
+    """Tạo tài liệu Word được định dạng dựa trên các tùy chọn định dạng.
+
+    Có thể truyền sẵn AnalyzedDocument (ví dụ khi đã phân tích theo lô) để không phải chạy lại spaCy,
+    hoặc danh sách khối đã xây dựng để chỉ chạy bước hiển thị.
+    """
+    print(f"Đang áp dụng các tùy chọn định dạng: {formatting_options}")
+    
+    try:
+        if blocks is None:
+            # Phân tích văn bản một lần, dùng chung cho trang tiêu đề, mục lục, nội dung và tài liệu tham khảo
+            if analyzed is None:
+                analyzed = build_analyzed_document(content, structure_engine(formatting_options),
+                                                   formatting_options.get('language'))
             
-            # Thêm các trích dẫn tìm được vào phần tài liệu tham khảo
-            added_citations = set()
-            for cite in potential_citations:
-                if cite not in added_citations:
-                    biblio_entry = doc.add_paragraph()
-                    biblio_entry.add_run(f"{cite} - Reference details")
-                    added_citations.add(cite)
-
-        doc.save(output_path)
-        print(f"Đã lưu tài liệu thành công vào: {output_path}")
+            with timed('format'):
+                blocks = build_document_blocks(content, formatting_options, analyzed)
+        
+        engine = formatting_options.get('render_engine') or config.DEFAULT_RENDER_ENGINE
+        render = RENDER_ENGINES.get(engine)
+        if render is None:
+            raise ValueError(f"Engine hiển thị không hợp lệ: {engine}")
+        with timed('render'):
+            render(blocks, formatting_options, output_path)
+        
+        if isinstance(output_path, str):
+            print(f"Đã lưu tài liệu thành công vào: {output_path}")
         return output_path
         
     except Exception as e:
         print(f"Error in document creation: {str(e)}")
-        return None 
\ No newline at end of file
+        record_fallback('render_error')
+        return None
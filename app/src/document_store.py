@@ -0,0 +1,218 @@
+import threading
+from collections import OrderedDict
+
+from app.src import config
+from app.src.analyzed_document import AnalyzedDocument
+from app.src.document_processor import (
+    analyze_text,
+    block_options_key,
+    build_document_blocks,
+    create_formatted_document,
+    extract_text_from_doc,
+    model_registry,
+    parse_document,
+    select_language,
+    structure_engine
+)
+from app.src.fast_structure import build_fast_analyzed_document
+from app.src.metrics import timed
+from app.src.storage import storage as default_storage
+
+
+class _DocumentState:
+    """Trạng thái đã phân tích của một tài liệu: nội dung, kết quả phân tích và các danh sách khối."""
+
+    def __init__(self, document_id, content, filename, languages=None):
+        self.document_id = document_id
+        self.content = content
+        self.filename = filename
+        self.lock = threading.Lock()
+        # Ngôn ngữ được yêu cầu ('auto', 'en'...) -> mã ngôn ngữ của pipeline
+        # (được lưu trong metadata của tệp để mọi worker chọn cùng một pipeline)
+        self.languages = dict(languages or {})
+        # ngôn ngữ -> kết quả phân tích văn bản
+        self.analysis = {}
+        # ngôn ngữ -> ParsedDocument (kết quả phân tích spaCy dạng mảng gọn); False nếu phân tích lỗi
+        self.parsed = {}
+        # block_options_key -> danh sách khối
+        self.blocks = {}
+
+
+class DocumentStore:
+    """Mã tài liệu (handle) cho phép tải lên một lần rồi phân tích và định dạng nhiều lần.
+
+    Tệp gốc được giữ trong bộ lưu trữ (StorageManager, loại 'upload') nên mã tài
+    liệu hết hạn cùng với tệp theo TTL và giới hạn dung lượng của bộ lưu trữ.
+    Metadata của mã tài liệu (tên tệp, ngôn ngữ đã chọn) nằm trong metadata của
+    tệp trên đĩa, nên mọi worker gunicorn đều tra cứu được mã tài liệu do worker
+    khác tạo. Nội dung đã trích xuất, kết quả phân tích spaCy dạng mảng gọn
+    (ParsedDocument: mô hình chỉ chạy một lần cho cả phân tích văn bản và cấu
+    trúc định dạng, tách câu giống /upload) và danh sách khối được giữ trong bộ
+    nhớ của từng worker theo ngôn ngữ của pipeline (LRU, tối đa max_in_memory
+    tài liệu); AnalyzedDocument chỉ được tạo lại từ các mảng khi cần xây dựng
+    danh sách khối. Khi bị loại khỏi bộ nhớ hoặc khi mã tài liệu được dùng ở
+    worker khác, trạng thái này được tạo lại từ tệp đã lưu.
+    Định dạng lại với tùy chọn chỉ ảnh hưởng đến hiển thị (font, khoảng cách...)
+    chỉ chạy bước hiển thị.
+    """
+
+    def __init__(self, max_in_memory, storage=default_storage):
+        self.max_in_memory = max_in_memory
+        self.storage = storage
+
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'created': 0, 'reloaded': 0, 'parses': 0, 'analyses': 0,
+                       'block_builds': 0, 'block_reuses': 0, 'renders': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def create(self, data, filename, engine=None, language=None):
+        """Lưu tệp tải lên, trích xuất nội dung và phân tích cấu trúc; trả về mã tài liệu.
+
+        Trả về None nếu không đọc được nội dung tài liệu. Ngôn ngữ không được hỗ
+        trợ gây ra ValueError (trước khi lưu tệp).
+        """
+        engine = structure_engine({'engine': engine})
+        if language and language != 'auto':
+            model_registry.resolve(language)
+        document_id = self.storage.store(data, filename, 'upload')
+        if document_id is None:
+            return None
+        state = self._load(document_id, created=True)
+        if state is None:
+            self.storage.remove(document_id)
+            return None
+        if engine == 'spacy':
+            with state.lock:
+                self._parsed(state, self._language(state, language))
+        return document_id
+
+    def get(self, document_id):
+        """Thông tin tài liệu (dict) theo mã, hoặc None nếu không tồn tại hoặc đã hết hạn."""
+        state = self._load(document_id)
+        if state is None:
+            return None
+        with state.lock:
+            engines = sorted({key[0] for key in state.blocks} | ({'spacy'} if state.parsed else set()))
+            languages = sorted(set(state.parsed) | set(state.analysis))
+        return {
+            'document_id': document_id,
+            'filename': state.filename,
+            'characters': len(state.content),
+            'engines': engines,
+            'languages': languages,
+        }
+
+    def remove(self, document_id):
+        """Xóa tài liệu khỏi bộ nhớ và bộ lưu trữ."""
+        with self._lock:
+            self._states.pop(document_id, None)
+        self.storage.remove(document_id)
+
+    def _load(self, document_id, created=False):
+        stored = self.storage.get(document_id)
+        if stored is None or stored['kind'] != 'upload':
+            with self._lock:
+                self._states.pop(document_id, None)
+            return None
+
+        with self._lock:
+            state = self._states.get(document_id)
+            if state is not None:
+                self._states.move_to_end(document_id)
+                return state
+
+        content = extract_text_from_doc(stored['path'], stored['filename'])
+        if not content:
+            return None
+
+        with self._lock:
+            self._stats['created' if created else 'reloaded'] += 1
+            # Một luồng khác có thể đã tạo trạng thái trong lúc trích xuất
+            state = self._states.setdefault(document_id, _DocumentState(
+                document_id, content, stored['filename'], stored['metadata'].get('languages')))
+            self._states.move_to_end(document_id)
+            while len(self._states) > self.max_in_memory:
+                self._states.popitem(last=False)
+        return state
+
+    def _language(self, state, language):
+        # Gọi khi đang giữ state.lock; phát hiện ngôn ngữ một lần cho mỗi tài liệu
+        requested = language or 'auto'
+        if requested not in state.languages:
+            state.languages[requested] = select_language(state.content, requested)
+            self.storage.update_metadata(state.document_id, languages=state.languages)
+        return state.languages[requested]
+
+    def _parsed(self, state, language):
+        # Gọi khi đang giữ state.lock
+        if language not in state.parsed:
+            parsed = parse_document(state.content, language)
+            state.parsed[language] = parsed if parsed is not None else False
+            self._count('parses')
+        return state.parsed[language] or None
+
+    def _analyzed(self, state, engine, language=None):
+        # Gọi khi đang giữ state.lock; AnalyzedDocument không được giữ lại trong bộ nhớ
+        if engine == 'fast':
+            # Engine 'fast' không dùng mô hình nên không phụ thuộc ngôn ngữ
+            return build_fast_analyzed_document(state.content)
+        parsed = self._parsed(state, self._language(state, language))
+        if parsed is None:
+            analyzed = AnalyzedDocument(state.content)
+            analyzed.error = ValueError("Không phân tích được tài liệu")
+            return analyzed
+        return parsed.analyzed_document()
+
+    def analysis(self, document_id, language=None):
+        """Kết quả phân tích văn bản (như /analyze), tính một lần cho mỗi tài liệu và ngôn ngữ."""
+        state = self._load(document_id)
+        if state is None:
+            return None
+        with state.lock:
+            language = self._language(state, language)
+            if language not in state.analysis:
+                state.analysis[language] = analyze_text(state.content, self._parsed(state, language), language)
+                self._count('analyses')
+            return state.analysis[language]
+
+    def format(self, document_id, formatting_options, output_path):
+        """Tạo tài liệu định dạng từ trạng thái đã phân tích; trả về output_path hoặc None nếu có lỗi.
+
+        Danh sách khối được tái sử dụng khi các tùy chọn trong BLOCK_OPTIONS không đổi.
+        """
+        state = self._load(document_id)
+        if state is None:
+            return None
+
+        key = block_options_key(formatting_options)
+        with state.lock:
+            blocks = state.blocks.get(key)
+            if blocks is None:
+                # Câu và tiêu đề lấy từ các mảng của ParsedDocument, không chạy lại mô hình
+                analyzed = self._analyzed(state, key[0], formatting_options.get('language'))
+                with timed('format'):
+                    blocks = state.blocks[key] = build_document_blocks(state.content, formatting_options, analyzed)
+                self._count('block_builds')
+            else:
+                self._count('block_reuses')
+
+        self._count('renders')
+        return create_formatted_document(state.content, formatting_options, output_path, blocks=blocks)
+
+    def stats(self):
+        """Số tài liệu trong bộ nhớ và số lần phân tích, xây dựng khối, hiển thị."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_memory'] = len(self._states)
+            # Dung lượng kết quả phân tích dạng mảng của các tài liệu trong bộ nhớ
+            stats['parsed_bytes'] = sum(parsed.nbytes for state in self._states.values()
+                                        for parsed in state.parsed.values() if parsed)
+        stats['max_in_memory'] = self.max_in_memory
+        return stats
+
+
+document_store = DocumentStore(max_in_memory=config.DOCUMENT_HANDLES_MAX_IN_MEMORY)
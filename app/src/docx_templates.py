@@ -0,0 +1,89 @@
+import io
+from functools import lru_cache
+
+import docx
+from docx.enum.style import WD_STYLE_TYPE
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import qn
+from docx.shared import Pt, Inches
+
+from app.src import config
+from app.src.document_blocks import (
+    BLOCK_TITLE, BLOCK_SECTION_TITLE, BLOCK_HEADING, PAGE_NUMBER_TEXT,
+    line_spacing_value, margin_inches
+)
+
+# Mẫu tài liệu cho engine python-docx: với mỗi tổ hợp font/cỡ chữ/khoảng cách
+# dòng/lề/số trang, một tài liệu rỗng đã cấu hình sẵn style Normal, style tiêu đề,
+# lề và footer được dựng một lần và lưu dưới dạng bytes. Mỗi yêu cầu chỉ cần mở
+# bản sao của mẫu và thêm các đoạn văn tham chiếu style, không phải đặt font cho
+# từng run.
+
+# Style cho từng loại khối (các khối còn lại dùng Normal)
+TEMPLATE_STYLES = {
+    BLOCK_TITLE: 'Formatter Title',
+    BLOCK_SECTION_TITLE: 'Formatter Section Title',
+    BLOCK_HEADING: 'Heading 1',
+}
+
+# Cỡ chữ (pt) của các style tiêu đề
+TITLE_FONT_SIZE = 16
+SECTION_TITLE_FONT_SIZE = 14
+HEADING_FONT_SIZE = 14
+
+# Font theo theme (ví dụ của Heading 1 trong mẫu mặc định) được ưu tiên hơn
+# font chỉ định trong cùng style, nên cần bỏ đi
+THEME_FONT_ATTRIBUTES = ('w:asciiTheme', 'w:hAnsiTheme', 'w:eastAsiaTheme', 'w:cstheme')
+
+
+def _set_style_font(style, font_family, size_pt, bold=None):
+    style.font.name = font_family
+    style.font.size = Pt(size_pt)
+    if bold is not None:
+        style.font.bold = bold
+    rfonts = style.element.rPr.rFonts
+    for attribute in THEME_FONT_ATTRIBUTES:
+        rfonts.attrib.pop(qn(attribute), None)
+
+
+def _add_centered_style(doc, name, font_family, size_pt):
+    style = doc.styles.add_style(name, WD_STYLE_TYPE.PARAGRAPH)
+    style.base_style = doc.styles['Normal']
+    style.next_paragraph_style = doc.styles['Normal']
+    style.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    _set_style_font(style, font_family, size_pt, bold=True)
+    return style
+
+
+@lru_cache(maxsize=config.DOCX_TEMPLATE_CACHE_SIZE)
+def docx_template(font_family, font_size, line_spacing, margin, page_numbers):
+    """Gói DOCX rỗng (bytes) đã cấu hình cho một tổ hợp tùy chọn định dạng (được lưu đệm)."""
+    doc = docx.Document()
+
+    normal = doc.styles['Normal']
+    _set_style_font(normal, font_family, int(font_size))
+    normal.paragraph_format.line_spacing = line_spacing
+
+    _set_style_font(doc.styles['Heading 1'], font_family, HEADING_FONT_SIZE, bold=True)
+    _add_centered_style(doc, TEMPLATE_STYLES[BLOCK_TITLE], font_family, TITLE_FONT_SIZE)
+    _add_centered_style(doc, TEMPLATE_STYLES[BLOCK_SECTION_TITLE], font_family, SECTION_TITLE_FONT_SIZE)
+
+    for section in doc.sections:
+        section.left_margin = section.right_margin = section.top_margin = section.bottom_margin = Inches(margin)
+        if page_numbers:
+            footer = section.footer
+            paragraph = footer.paragraphs[0] if footer.paragraphs else footer.add_paragraph()
+            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            paragraph.text = PAGE_NUMBER_TEXT
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def new_templated_document(formatting_options):
+    """Tài liệu python-docx mới, là bản sao của mẫu tương ứng với tùy chọn định dạng."""
+    template = docx_template(formatting_options['font_family'], formatting_options['font_size'],
+                             line_spacing_value(formatting_options), margin_inches(formatting_options),
+                             bool(formatting_options['page_numbers']))
+    return docx.Document(io.BytesIO(template))
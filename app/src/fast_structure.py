@@ -0,0 +1,80 @@
+import re
+
+from app.src.analyzed_document import AnalyzedDocument
+
+# Engine cấu trúc "fast": tách câu và nhận diện tiêu đề bằng biểu thức chính quy
+# đã biên dịch sẵn, không chạy spaCy. Các đặc trưng giống heuristic của
+# is_heading_sentence (độ dài, số từ, có từ viết hoa chữ cái đầu), còn ranh giới
+# câu theo quy tắc của sentencizer (dấu kết thúc câu) cộng với ngắt dòng.
+
+# Ranh giới câu: ngắt dòng kèm khoảng trắng theo sau (nhóm 1), hoặc dấu kết thúc câu
+# có thể kèm dấu đóng ngoặc/nháy (nhóm 2) theo sau là khoảng trắng (nhóm 3).
+# Mọi nhánh bắt đầu bằng một ký tự cố định để re có thể bỏ qua nhanh phần văn bản thường.
+SENTENCE_BOUNDARY = re.compile(r'''(\n\s*)|([.!?]+["'”’)\]]*)([^\S\n]+|(?=\n))''')
+
+# Từ viết tắt phổ biến mà tokenizer của spaCy giữ nguyên cả dấu chấm (không tách câu)
+ABBREVIATIONS = frozenset({
+    'mr', 'mrs', 'ms', 'dr', 'prof', 'st', 'vs', 'etc', 'jr', 'sr', 'inc', 'ltd', 'co',
+    'no', 'fig', 'al', 'jan', 'feb', 'mar', 'apr', 'jun', 'jul', 'aug', 'sep', 'sept',
+    'oct', 'nov', 'dec',
+})
+
+# Token chỉ gồm chữ cái (tương ứng token.is_alpha), tách theo khoảng trắng và dấu câu
+ALPHA_TOKEN = re.compile(r"(?<![\w'])[^\W\d_]+(?![\w'])")
+
+# Ngưỡng của heuristic tiêu đề (giống is_heading_sentence)
+HEADING_MAX_CHARS = 100
+HEADING_MAX_WORDS = 10
+
+
+def is_heading_text(sent_text):
+    """Heuristic tiêu đề trên văn bản thuần: ngắn, ít từ và có ít nhất một từ viết hoa chữ cái đầu."""
+    return (len(sent_text) < HEADING_MAX_CHARS and
+            len(sent_text.split()) < HEADING_MAX_WORDS and
+            any(match.group(0).istitle() for match in ALPHA_TOKEN.finditer(sent_text)))
+
+
+def _is_abbreviation(content, period):
+    """Dấu chấm tại vị trí period thuộc về một từ viết tắt (ví dụ "Dr.", "e.g.", "J.")."""
+    word_start = max(content.rfind(' ', 0, period), content.rfind('\n', 0, period)) + 1
+    word = content[word_start:period].lstrip('(["\'').lower()
+    return (len(word) == 1 and word.isalpha()) or '.' in word or word in ABBREVIATIONS
+
+
+def iter_sentence_spans(content):
+    """Generator các tuple (start, end) của câu trong văn bản.
+
+    Khoảng trắng giữa các câu đã được loại bỏ; chỉ câu đầu/cuối văn bản và câu
+    kết thúc bằng khoảng trắng trước ngắt dòng có thể còn khoảng trắng ở hai đầu.
+    """
+    start = 0
+    for match in SENTENCE_BOUNDARY.finditer(content):
+        if match.group(1) is not None:
+            end = match.start()
+        elif match.group(2) == '.' and _is_abbreviation(content, match.start()):
+            continue
+        else:
+            end = match.start(3)
+        if end > start:
+            yield start, end
+        start = match.end()
+    if start < len(content):
+        yield start, len(content)
+
+
+def build_fast_analyzed_document(content):
+    """Tạo AnalyzedDocument bằng engine "fast" (không dùng mô hình spaCy)."""
+    analyzed = AnalyzedDocument(content)
+    analyzed.has_nlp_capabilities = True
+    for start, end in iter_sentence_spans(content):
+        sent_text = content[start:end]
+        if sent_text[0].isspace() or sent_text[-1].isspace():
+            # Hiếm gặp: khoảng trắng ở đầu/cuối văn bản hoặc trước ngắt dòng
+            stripped = sent_text.lstrip()
+            start += len(sent_text) - len(stripped)
+            sent_text = stripped.rstrip()
+            end = start + len(sent_text)
+            if not sent_text:
+                continue
+        analyzed.add_sentence(sent_text, start, end, is_heading_text(sent_text))
+    return analyzed
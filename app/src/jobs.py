@@ -0,0 +1,233 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from app.src import config
+from app.src.document_processor import create_formatted_document
+from app.src.metrics import JOBS_IN_FLIGHT, JOBS_TOTAL, track_degraded
+from app.src.storage import FILE_ID_PATTERN, storage as default_storage
+
+# Các trạng thái của một công việc
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_FINISHED = 'finished'
+JOB_FAILED = 'failed'
+
+
+def _read_record(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_record(path, record):
+    # Ghi vào tệp tạm rồi đổi tên để tiến trình khác không đọc phải bản ghi dở dang
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(record, f)
+    os.replace(temp_path, path)
+
+
+def _update_record(path, **fields):
+    record = _read_record(path)
+    if record is not None:
+        record.update(fields)
+        _write_record(path, record)
+
+
+def run_format_job(content, formatting_options, output_path, record_path=None):
+    """Hàm chạy trong worker: tạo tài liệu định dạng; trả về (đường dẫn kết quả, các nhánh dự phòng đã dùng)."""
+    if record_path:
+        _update_record(record_path, status=JOB_RUNNING)
+    with track_degraded() as degraded:
+        result_path = create_formatted_document(content, formatting_options, output_path)
+    return result_path, sorted(degraded)
+
+
+class JobManager:
+    """Hàng đợi định dạng tài liệu chạy nền, không cần message broker bên ngoài.
+
+    Backend 'thread' dùng ThreadPoolExecutor trong cùng tiến trình, backend
+    'process' dùng ProcessPoolExecutor với các tiến trình cục bộ. Kết quả được
+    ghi vào bộ lưu trữ (StorageManager), nơi áp dụng giới hạn dung lượng và TTL.
+    Trạng thái công việc là một bản ghi JSON (<mã công việc>.json) trong folder,
+    do tiến trình chạy công việc cập nhật, nên mọi worker gunicorn đều trả lời
+    được /jobs/<id> và /jobs/<id>/download; bản ghi được giữ trong ttl_seconds
+    sau khi công việc kết thúc.
+    """
+
+    def __init__(self, backend, max_workers, ttl_seconds, folder, storage=default_storage):
+        if backend not in ('thread', 'process'):
+            raise ValueError(f"Backend không hợp lệ: {backend}")
+        self.backend = backend
+        self.max_workers = max_workers
+        self.ttl_seconds = ttl_seconds
+        self.folder = folder
+        self.storage = storage
+
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        # Khởi tạo pool khi có công việc đầu tiên
+        with self._lock:
+            if self._executor is None:
+                if self.backend == 'process':
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix='format-job')
+            return self._executor
+
+    def _record_path(self, job_id):
+        return os.path.join(self.folder, job_id + '.json')
+
+    def _new_job(self, output_filename):
+        self.cleanup_expired()
+
+        job_id = uuid.uuid4().hex
+        file_id, output_path = self.storage.reserve(output_filename, 'output')
+
+        job = {
+            'id': job_id,
+            'status': JOB_QUEUED,
+            'created_at': time.time(),
+            'finished_at': None,
+            'output_filename': output_filename,
+            'file_id': file_id,
+            'error': None,
+        }
+        os.makedirs(self.folder, exist_ok=True)
+        _write_record(self._record_path(job_id), job)
+        job['output_path'] = output_path
+        return job
+
+    def _finish(self, job, error):
+        _update_record(self._record_path(job['id']), status=JOB_FAILED if error else JOB_FINISHED,
+                       finished_at=time.time(), error=error)
+
+    def submit(self, content, formatting_options, output_filename, on_success=None, on_finish=None):
+        """Đưa một yêu cầu định dạng vào hàng đợi và trả về mã công việc ngay lập tức.
+
+        on_success(output_path) được gọi khi công việc hoàn tất thành công mà không
+        dùng nhánh dự phòng làm giảm chất lượng (ví dụ để lưu vào bộ nhớ đệm);
+        on_finish() được gọi khi công việc kết thúc, dù thành công hay thất bại
+        (ví dụ để trả token của bộ kiểm soát tải).
+        """
+        job = self._new_job(output_filename)
+        JOBS_IN_FLIGHT.inc()
+        try:
+            future = self._get_executor().submit(run_format_job, content, formatting_options,
+                                                 job['output_path'], self._record_path(job['id']))
+        except Exception:
+            JOBS_IN_FLIGHT.dec()
+            raise
+
+        def _done(done_future):
+            try:
+                self._complete(job, done_future, on_success)
+            finally:
+                if on_finish:
+                    on_finish()
+
+        future.add_done_callback(_done)
+        return job['id']
+
+    def _complete(self, job, done_future, on_success):
+        error = None
+        try:
+            try:
+                result_path, degraded = done_future.result()
+                error = None if result_path and os.path.exists(result_path) else 'Lỗi định dạng tài liệu'
+            except Exception as e:
+                error, degraded = str(e), []
+
+            if error:
+                self.storage.remove(job['file_id'])
+            elif self.storage.commit(job['file_id']) is None:
+                error = 'Không lưu được kết quả'
+
+            self._finish(job, error)
+        except Exception as e:
+            # Lỗi khi lưu kết quả hoặc ghi bản ghi: công việc được tính là thất bại
+            error = error or str(e)
+            raise
+        finally:
+            # Luôn giảm số công việc đang chạy, kể cả khi bộ lưu trữ phát sinh ngoại lệ
+            JOBS_IN_FLIGHT.dec()
+            JOBS_TOTAL.inc(status=JOB_FAILED if error else JOB_FINISHED)
+
+        if error:
+            print(f"Công việc {job['id']} thất bại: {error}")
+        elif degraded:
+            print(f"Công việc {job['id']} dùng nhánh dự phòng: {', '.join(degraded)}")
+        elif on_success:
+            try:
+                on_success(job['output_path'])
+            except Exception as e:
+                print(f"Lỗi khi xử lý kết quả công việc {job['id']}: {str(e)}")
+
+    def create_completed(self, data, output_filename):
+        """Tạo một công việc đã hoàn tất từ dữ liệu có sẵn (ví dụ khi trúng bộ nhớ đệm)."""
+        job = self._new_job(output_filename)
+        with open(job['output_path'], 'wb') as f:
+            f.write(data)
+        self.storage.commit(job['file_id'])
+        self._finish(job, None)
+        return job['id']
+
+    def get(self, job_id):
+        """Trả về trạng thái công việc dưới dạng dict, hoặc None nếu không tồn tại."""
+        if not FILE_ID_PATTERN.fullmatch(job_id or ''):
+            return None
+        job = _read_record(self._record_path(job_id))
+        if job is None:
+            return None
+        status = job['status']
+
+        # Kết quả có thể đã bị bộ lưu trữ xóa (hết hạn hoặc vượt giới hạn dung lượng)
+        stored = self.storage.get(job['file_id']) if status == JOB_FINISHED else None
+        return {
+            'job_id': job['id'],
+            'status': status,
+            'created_at': job['created_at'],
+            'finished_at': job['finished_at'],
+            'output_filename': job['output_filename'],
+            'file_id': job['file_id'] if stored else None,
+            'output_path': stored['path'] if stored else None,
+            'error': job['error'],
+        }
+
+    def cleanup_expired(self):
+        """Xóa trạng thái và kết quả của các công việc đã kết thúc và quá thời gian lưu giữ."""
+        now = time.time()
+        try:
+            with os.scandir(self.folder) as it:
+                # Bản ghi được ghi lần cuối khi công việc kết thúc: chỉ đọc các bản ghi cũ
+                candidates = [entry.path for entry in it
+                              if entry.name.endswith('.json') and now - entry.stat().st_mtime > self.ttl_seconds]
+        except OSError:
+            return
+
+        for path in candidates:
+            job = _read_record(path)
+            if job is None or job['finished_at'] is None or now - job['finished_at'] <= self.ttl_seconds:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue  # Worker khác đã xóa
+            self.storage.remove(job['file_id'])
+
+
+job_manager = JobManager(
+    backend=config.ASYNC_JOBS_BACKEND,
+    max_workers=config.ASYNC_JOBS_WORKERS,
+    ttl_seconds=config.JOB_TTL_SECONDS,
+    folder=config.JOBS_FOLDER,
+)
@@ -0,0 +1,277 @@
+import atexit
+import os
+import re
+import struct
+import tempfile
+import threading
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: không khóa tệp khi ghi chỉ mục
+    fcntl = None
+
+from app.src import config
+
+# Engine từ khóa: đếm các term (hash của lemma, hoặc dạng chữ thường nếu mô hình
+# không có lemma) theo mảng thuộc tính token của spaCy, rồi xếp hạng theo TF-IDF
+# với bảng IDF được xây dựng từ bộ tài liệu (build_keyword_index.py).
+
+# Từ loại được xem là từ khóa và độ dài tối thiểu (giống logic cũ của analyze_text)
+KEYWORD_POS = ('NOUN', 'ADJ', 'VERB')
+MIN_KEYWORD_LENGTH = 4
+
+# Từ trong văn bản khi không có khả năng NLP: chỉ gồm chữ cái, tối thiểu MIN_KEYWORD_LENGTH ký tự
+FALLBACK_WORD = re.compile(r'[^\W\d_]{%d,}' % MIN_KEYWORD_LENGTH)
+
+# Tên thuộc tính token của spaCy (doc.to_array nhận tên), không cần import spaCy khi import module
+TOKEN_ATTRIBUTES = ['LOWER', 'LEMMA', 'POS', 'IS_STOP', 'IS_ALPHA', 'LENGTH']
+
+# Định dạng tệp chỉ mục IDF: header (magic, số tài liệu, số term) rồi mảng hash
+# term (uint64, đã sắp xếp) và mảng tần suất tài liệu (uint32), little-endian
+# Phiên bản 002: term là lemma (profile 'analyze' chạy lemmatizer); chỉ mục phiên bản cũ phải xây lại
+INDEX_MAGIC = b'DFIDF002'
+INDEX_HEADER = struct.Struct('<8sQQ')
+ID_DTYPE = np.dtype('<u8')
+DF_DTYPE = np.dtype('<u4')
+
+
+@lru_cache(maxsize=None)
+def keyword_pos_ids():
+    """Mã (symbol) spaCy của các từ loại trong KEYWORD_POS."""
+    from spacy import symbols
+    return np.array([getattr(symbols, name) for name in KEYWORD_POS], dtype=np.uint64)
+
+
+def token_terms(lower, lemma):
+    """Term của mỗi token: lemma khi mô hình có lemmatizer, nếu không là dạng chữ thường."""
+    return np.where(lemma != 0, lemma, lower)
+
+
+def _sum_by_id(ids, counts):
+    """Gộp các cặp (id, count) trùng id: trả về (id đã sắp xếp, tổng count)."""
+    if len(ids) == 0:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+    unique_ids, inverse = np.unique(ids, return_inverse=True)
+    return unique_ids, np.bincount(inverse, weights=counts, minlength=len(unique_ids)).astype(np.int64)
+
+
+class TermCounts:
+    """Số lần xuất hiện của các term (hash) trong một hoặc nhiều văn bản, gộp được theo thứ tự."""
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.uint64)
+        self.counts = np.empty(0, dtype=np.int64)
+        # Văn bản hiển thị của mỗi term (lần xuất hiện đầu tiên)
+        self.texts = {}
+
+    def _add(self, ids, counts, texts):
+        self.ids, self.counts = _sum_by_id(np.concatenate([self.ids, ids]),
+                                           np.concatenate([self.counts, counts]))
+        for term_id, text in texts.items():
+            self.texts.setdefault(term_id, text)
+
+    def add_doc(self, doc):
+        """Đếm các term ứng viên của một spaCy Doc trên mảng thuộc tính token (không lặp token trong Python)."""
+        if len(doc) == 0:
+            return
+        lower, lemma, pos, is_stop, is_alpha, length = doc.to_array(TOKEN_ATTRIBUTES).T
+        self.add_tokens(lower, lemma, pos, is_stop, is_alpha, length, doc.vocab.strings)
+
+    def add_tokens(self, lower, lemma, pos, is_stop, is_alpha, length, strings):
+        """Đếm các term ứng viên từ các cột thuộc tính token (theo TOKEN_ATTRIBUTES).
+
+        strings ánh xạ hash của term sang văn bản (StringStore hoặc dict).
+        """
+        mask = (is_stop == 0) & (is_alpha == 1) & (length >= MIN_KEYWORD_LENGTH)
+        if pos.any():
+            mask &= np.isin(pos, keyword_pos_ids())
+        terms = token_terms(lower, lemma)[mask]
+
+        ids, counts = np.unique(terms, return_counts=True)
+        self._add(ids, counts, {int(term_id): strings[int(term_id)] for term_id in ids})
+
+    def add_text(self, content):
+        """Đếm các từ của văn bản thuần (khi mô hình không có khả năng phân tích)."""
+        from spacy.strings import hash_string
+
+        words = Counter(FALLBACK_WORD.findall(content.lower()))
+        if not words:
+            return
+        texts = {hash_string(word): word for word in words}
+        ids = np.fromiter(texts, dtype=np.uint64, count=len(texts))
+        counts = np.fromiter((words[word] for word in texts.values()), dtype=np.int64, count=len(texts))
+        self._add(ids, counts, texts)
+
+    def merge(self, other):
+        """Gộp số đếm của phần văn bản tiếp theo vào đối tượng này."""
+        self._add(other.ids, other.counts, other.texts)
+        return self
+
+    def top_keywords(self, idf_index, limit):
+        """limit term có điểm TF-IDF cao nhất (thứ tự xác định: điểm giảm dần, rồi theo chữ cái)."""
+        if len(self.ids) == 0:
+            return []
+        scores = (1.0 + np.log(self.counts)) * idf_index.idf(self.ids)
+        # Chỉ sắp xếp (trong Python) các ứng viên có điểm không thấp hơn điểm thứ limit
+        if len(scores) > limit:
+            threshold = np.partition(scores, len(scores) - limit)[len(scores) - limit]
+            candidates = np.flatnonzero(scores >= threshold)
+        else:
+            candidates = np.arange(len(scores))
+        order = sorted(candidates, key=lambda i: (-scores[i], self.texts[int(self.ids[i])]))
+        return [self.texts[int(self.ids[i])] for i in order[:limit]]
+
+
+class IdfIndex:
+    """Bảng tần suất tài liệu (document frequency) của các term, ánh xạ bộ nhớ từ tệp.
+
+    Bảng gốc được đọc bằng np.memmap nên chỉ các trang được tra cứu mới nằm
+    trong bộ nhớ. Các tài liệu mới được thêm vào phần bổ sung trong bộ nhớ
+    (add_document) và được ghi gộp vào tệp sau mỗi save_every tài liệu; khi
+    ghi, phần bổ sung được gộp với nội dung mới nhất trên đĩa (có thể đã được
+    tiến trình khác cập nhật) dưới khóa tệp, rồi thay thế tệp một cách nguyên tử.
+    """
+
+    def __init__(self, path, save_every=0):
+        self.path = path
+        self.save_every = save_every
+
+        self._lock = threading.Lock()
+        self._base_docs = 0
+        self._base_ids = np.empty(0, dtype=ID_DTYPE)
+        self._base_df = np.empty(0, dtype=DF_DTYPE)
+        self._pending = []
+        self._pending_docs = 0
+        self._delta = None
+        self._load()
+
+    def _load(self):
+        try:
+            self._base_docs, self._base_ids, self._base_df = self._read(self.path)
+        except (OSError, ValueError) as e:
+            print(f"Lỗi khi đọc chỉ mục IDF, dùng bảng rỗng: {str(e)}")
+            self._base_docs = 0
+            self._base_ids = np.empty(0, dtype=ID_DTYPE)
+            self._base_df = np.empty(0, dtype=DF_DTYPE)
+
+    @staticmethod
+    def _read(path):
+        """Đọc (số tài liệu, mảng id, mảng df) từ tệp chỉ mục; bảng rỗng nếu tệp không tồn tại."""
+        empty = (0, np.empty(0, dtype=ID_DTYPE), np.empty(0, dtype=DF_DTYPE))
+        if not path or not os.path.exists(path):
+            return empty
+        with open(path, 'rb') as f:
+            header = f.read(INDEX_HEADER.size)
+        if len(header) < INDEX_HEADER.size:
+            raise ValueError(f"Tệp chỉ mục IDF không hợp lệ: {path}")
+        magic, num_docs, num_terms = INDEX_HEADER.unpack(header)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"Tệp chỉ mục IDF không hợp lệ hoặc thuộc phiên bản cũ "
+                             f"(xây lại bằng build_keyword_index.py): {path}")
+        if num_terms == 0:
+            return (num_docs,) + empty[1:]
+        ids = np.memmap(path, dtype=ID_DTYPE, mode='r', offset=INDEX_HEADER.size, shape=(num_terms,))
+        df = np.memmap(path, dtype=DF_DTYPE, mode='r', offset=INDEX_HEADER.size + num_terms * ID_DTYPE.itemsize,
+                       shape=(num_terms,))
+        return num_docs, ids, df
+
+    def _delta_arrays(self):
+        # Phần bổ sung được gộp lười: mỗi tài liệu mới chỉ thêm một mảng id
+        if self._delta is None:
+            if self._pending:
+                self._delta = np.unique(np.concatenate(self._pending), return_counts=True)
+            else:
+                self._delta = (np.empty(0, dtype=ID_DTYPE), np.empty(0, dtype=np.int64))
+        return self._delta
+
+    @staticmethod
+    def _lookup(ids, table_ids, table_values):
+        if len(table_ids) == 0:
+            return np.zeros(len(ids), dtype=np.int64)
+        positions = np.searchsorted(table_ids, ids)
+        positions[positions >= len(table_ids)] = 0
+        found = table_ids[positions] == ids
+        return np.where(found, table_values[positions], 0).astype(np.int64)
+
+    def idf(self, ids):
+        """IDF (làm mượt) của các term; bằng 1 cho mọi term khi bảng còn rỗng."""
+        ids = np.asarray(ids, dtype=ID_DTYPE)
+        with self._lock:
+            num_docs = self._base_docs + self._pending_docs
+            delta_ids, delta_df = self._delta_arrays()
+            df = self._lookup(ids, self._base_ids, self._base_df) + self._lookup(ids, delta_ids, delta_df)
+        if num_docs == 0:
+            return np.ones(len(ids))
+        return np.log((1.0 + num_docs) / (1.0 + df)) + 1.0
+
+    def add_document(self, ids):
+        """Thêm một tài liệu (tập term id) vào bảng; ghi vào tệp sau mỗi save_every tài liệu."""
+        with self._lock:
+            self._pending.append(np.unique(np.asarray(ids, dtype=ID_DTYPE)))
+            self._pending_docs += 1
+            self._delta = None
+            should_save = self.save_every and self._pending_docs >= self.save_every
+        if should_save:
+            self.save()
+
+    def save(self):
+        """Gộp phần bổ sung vào tệp chỉ mục (đọc lại tệp mới nhất trên đĩa) và ánh xạ lại tệp."""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._pending_docs:
+                return
+            pending_docs = self._pending_docs
+            delta_ids, delta_df = self._delta_arrays()
+            self._pending = []
+            self._pending_docs = 0
+            self._delta = None
+
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path + '.lock', 'w') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            num_docs, ids, df = self._read(self.path)
+            write_index(self.path, num_docs + pending_docs,
+                        np.concatenate([ids, delta_ids.astype(ID_DTYPE)]),
+                        np.concatenate([df.astype(np.int64), delta_df]))
+        with self._lock:
+            self._load()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'documents': self._base_docs + self._pending_docs,
+                'terms': len(self._base_ids),
+                'pending_documents': self._pending_docs,
+                'path': self.path,
+            }
+
+
+def write_index(path, num_docs, ids, df):
+    """Ghi tệp chỉ mục IDF (các id trùng được cộng dồn) vào path, thay thế tệp cũ một cách nguyên tử."""
+    ids, df = _sum_by_id(np.asarray(ids, dtype=np.uint64), np.asarray(df, dtype=np.int64))
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.keyword_idf_')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, num_docs, len(ids)))
+            f.write(ids.astype(ID_DTYPE).tobytes())
+            f.write(np.minimum(df, np.iinfo(DF_DTYPE).max).astype(DF_DTYPE).tobytes())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+idf_index = IdfIndex(config.KEYWORD_IDF_PATH,
+                     save_every=config.KEYWORD_IDF_SAVE_EVERY if config.KEYWORD_IDF_UPDATE else 0)
+if config.KEYWORD_IDF_UPDATE:
+    # Ghi các cập nhật còn lại khi tiến trình kết thúc bình thường
+    atexit.register(idf_index.save)
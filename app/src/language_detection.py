@@ -0,0 +1,54 @@
+import re
+from functools import lru_cache
+
+# Phát hiện ngôn ngữ của tài liệu (không cần thư viện ngoài): tỷ lệ từ thuộc danh
+# sách stop word của spaCy cho từng ngôn ngữ được hỗ trợ, trên một đoạn đầu văn bản.
+# Với tiếng Việt, các từ chứa chữ cái chỉ có trong tiếng Việt cũng được tính.
+
+WORD = re.compile(r'[^\W\d_]+')
+
+# Chữ cái có dấu chỉ xuất hiện trong tiếng Việt (không tính các chữ dùng chung
+# với tiếng Pháp, Tây Ban Nha... như à, é, ô)
+VIETNAMESE_LETTERS = frozenset('ăắằẳẵặấầẩẫậđếềểễệốồổỗộơớờởỡợưứừửữựảạẻẽẹỉịĩỏọủụũỳỷỹỵ')
+
+
+@lru_cache(maxsize=None)
+def stop_words(language):
+    """Tập stop word (chữ thường, từ đơn) của ngôn ngữ theo spaCy; rỗng nếu spaCy không hỗ trợ."""
+    from spacy.util import get_lang_class
+
+    try:
+        words = get_lang_class(language).Defaults.stop_words
+    except Exception:
+        return frozenset()
+    # Stop word tiếng Việt nhiều âm tiết được nối bằng '_': chỉ giữ các từ đơn
+    return frozenset(word.lower() for word in words if word and '_' not in word and ' ' not in word)
+
+
+def language_score(words, language):
+    """Tỷ lệ từ (đã viết thường) đặc trưng cho ngôn ngữ."""
+    stops = stop_words(language)
+    if language == 'vi':
+        hits = sum(1 for word in words if word in stops or not VIETNAMESE_LETTERS.isdisjoint(word))
+    else:
+        hits = sum(1 for word in words if word in stops)
+    return hits / len(words)
+
+
+def detect_language(content, languages, default, sample_chars=5000, min_score=0.15):
+    """Ngôn ngữ (trong languages) có điểm cao nhất trên sample_chars ký tự đầu của văn bản.
+
+    Trả về default nếu văn bản không có từ nào hoặc không ngôn ngữ nào đạt min_score.
+    Khi điểm bằng nhau, ngôn ngữ mặc định được ưu tiên.
+    """
+    words = WORD.findall(content[:sample_chars].lower())
+    if not words:
+        return default
+
+    candidates = [default] + [language for language in languages if language != default]
+    best_language, best_score = default, 0.0
+    for language in candidates:
+        score = language_score(words, language)
+        if score > best_score:
+            best_language, best_score = language, score
+    return best_language if best_score >= min_score else default
@@ -0,0 +1,293 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from werkzeug.wsgi import ClosingIterator
+
+# Số liệu vận hành theo định dạng văn bản của Prometheus (endpoint /metrics).
+# Các số liệu được lưu trong bộ nhớ của từng tiến trình; khi chạy nhiều worker
+# gunicorn, mỗi worker trả về số liệu của riêng nó.
+
+METRICS_PREFIX = 'document_formatter_'
+
+# Các mốc (giây) của histogram độ trễ
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape_label_value(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Lớp cơ sở: một số liệu có tên, mô tả và các nhãn, an toàn khi dùng từ nhiều luồng."""
+
+    metric_type = None
+
+    def __init__(self, name, description, labels=()):
+        self.name = METRICS_PREFIX + name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _init_unlabelled(self):
+        # Số liệu không có nhãn luôn được xuất (giá trị 0) kể cả khi chưa được cập nhật
+        if not self.label_names:
+            self._values[()] = 0
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"Nhãn không hợp lệ cho {self.name}: {sorted(labels)}")
+        return tuple(labels[name] for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+    def _render_samples(self, items):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+                for key, value in items]
+
+
+class Counter(_Metric):
+    """Bộ đếm chỉ tăng."""
+
+    metric_type = 'counter'
+
+    def __init__(self, name, description, labels=()):
+        super().__init__(name, description, labels)
+        self._init_unlabelled()
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Giá trị có thể tăng hoặc giảm (ví dụ số công việc đang chạy)."""
+
+    metric_type = 'gauge'
+
+    def __init__(self, name, description, labels=()):
+        super().__init__(name, description, labels)
+        self._init_unlabelled()
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    """Histogram độ trễ với các mốc cố định, kèm tổng và số lần quan sát."""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][index] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def _render_samples(self, items):
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state['counts']):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key, [('le', '+Inf')])
+            lines.append(f"{self.name}_bucket{labels} {state['count']}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+STAGE_SECONDS = Histogram('stage_seconds', 'Thời gian xử lý của từng bước (giây).', labels=('stage',))
+REQUEST_SECONDS = Histogram('request_seconds', 'Thời gian xử lý yêu cầu HTTP (giây).', labels=('endpoint',))
+REQUESTS_TOTAL = Counter('requests_total', 'Số yêu cầu HTTP theo endpoint và mã trạng thái.',
+                         labels=('endpoint', 'status'))
+BYTES_PROCESSED = Counter('bytes_processed_total', 'Số byte đã nhận (in) và đã gửi (out).',
+                          labels=('direction',))
+FALLBACKS_TOTAL = Counter('fallbacks_total', 'Số lần chuyển sang nhánh xử lý dự phòng.', labels=('path',))
+JOBS_IN_FLIGHT = Gauge('jobs_in_flight', 'Số công việc bất đồng bộ đang chờ hoặc đang chạy.')
+JOBS_TOTAL = Counter('jobs_total', 'Số công việc bất đồng bộ đã kết thúc theo trạng thái.', labels=('status',))
+STORAGE_BYTES = Gauge('storage_bytes', 'Tổng dung lượng tệp trong bộ lưu trữ (byte).')
+STORAGE_EVICTIONS = Counter('storage_evictions_total', 'Số tệp bị xóa khỏi bộ lưu trữ theo lý do.',
+                            labels=('reason',))
+ADMISSION_QUEUE_DEPTH = Gauge('admission_queue_depth', 'Số yêu cầu NLP đang chờ trong hàng đợi kiểm soát tải.')
+ADMISSION_TOKENS_IN_USE = Gauge('admission_tokens_in_use', 'Số token của ngân sách NLP đang được sử dụng.')
+ADMISSION_REJECTIONS = Counter('admission_rejections_total', 'Số yêu cầu bị từ chối (503) theo lý do.',
+                               labels=('reason',))
+MODEL_LOADS = Counter('model_loads_total', 'Số lần tải pipeline spaCy theo ngôn ngữ.', labels=('language',))
+MODEL_EVICTIONS = Counter('model_evictions_total', 'Số pipeline spaCy bị loại khỏi bộ nhớ theo ngôn ngữ.',
+                          labels=('language',))
+MODELS_RESIDENT = Gauge('models_resident', 'Số pipeline spaCy đang được giữ trong bộ nhớ.')
+PARAGRAPH_CACHE_LOOKUPS = Counter('paragraph_cache_lookups_total',
+                                  'Số lần tra cứu bộ nhớ đệm đoạn văn theo kết quả (hit/miss).', labels=('result',))
+PARAGRAPH_REUSE_RATIO = Histogram('paragraph_reuse_ratio',
+                                  'Tỷ lệ đoạn văn dùng lại từ bộ nhớ đệm trong mỗi lần phân tích tài liệu.',
+                                  buckets=(0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1.0))
+
+# Thời gian các bước của yêu cầu hiện tại, dùng cho header Server-Timing
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+# [số đoạn văn dùng lại, tổng số đoạn văn] của yêu cầu hiện tại, dùng cho header X-Paragraph-Reuse
+_request_paragraphs = contextvars.ContextVar('request_paragraphs', default=None)
+# Các nhánh dự phòng làm giảm chất lượng kết quả trong khối track_degraded() hiện tại
+_degraded_fallbacks = contextvars.ContextVar('degraded_fallbacks', default=None)
+
+# Nhánh dự phòng cho cùng kết quả (chạy lại trong tiến trình hiện tại); mọi nhánh khác
+# cho kết quả kém hơn và kết quả đó không được lưu vào bộ nhớ đệm
+EQUIVALENT_FALLBACKS = frozenset({'shard_error'})
+
+
+@contextmanager
+def timed(stage):
+    """Đo thời gian một bước: ghi vào histogram và vào danh sách thời gian của yêu cầu hiện tại."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+
+def time_until_close(response, stage):
+    """Đo bước stage từ bây giờ đến khi server gửi xong phần thân của response và đóng nó.
+
+    Phần thân của send_file được truyền thẳng cho server (direct_passthrough) nên
+    response.call_on_close không được gọi; thay vào đó phần thân được bọc trong
+    ClosingIterator. Chỉ ghi vào histogram: header Server-Timing đã được gửi
+    trước phần thân.
+    """
+    start = time.perf_counter()
+    response.response = ClosingIterator(
+        response.response, lambda: STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage))
+    return response
+
+
+def record_fallback(path):
+    """Ghi nhận một lần chuyển sang nhánh dự phòng (ví dụ phân tích cơ bản khi không có NLP)."""
+    FALLBACKS_TOTAL.inc(path=path)
+    degraded = _degraded_fallbacks.get()
+    if degraded is not None and path not in EQUIVALENT_FALLBACKS:
+        degraded.add(path)
+
+
+@contextmanager
+def track_degraded():
+    """Thu thập các nhánh dự phòng làm giảm chất lượng kết quả trong khối lệnh; trả về set tên nhánh."""
+    degraded = set()
+    token = _degraded_fallbacks.set(degraded)
+    try:
+        yield degraded
+    finally:
+        _degraded_fallbacks.reset(token)
+
+
+def record_paragraph_reuse(reused, total):
+    """Ghi nhận một lần phân tích tài liệu theo đoạn văn: reused trên total đoạn văn lấy từ bộ nhớ đệm."""
+    if not total:
+        return
+    PARAGRAPH_CACHE_LOOKUPS.inc(reused, result='hit')
+    PARAGRAPH_CACHE_LOOKUPS.inc(total - reused, result='miss')
+    PARAGRAPH_REUSE_RATIO.observe(reused / total)
+    paragraphs = _request_paragraphs.get()
+    if paragraphs is not None:
+        paragraphs[0] += reused
+        paragraphs[1] += total
+
+
+def start_request_timings():
+    """Bắt đầu thu thập thời gian các bước (và số đoạn văn dùng lại) cho yêu cầu hiện tại."""
+    _request_timings.set([])
+    _request_paragraphs.set([0, 0])
+
+
+def pop_request_timings():
+    """Trả về danh sách (stage, giây) của yêu cầu hiện tại và dừng thu thập."""
+    timings = _request_timings.get() or []
+    _request_timings.set(None)
+    return timings
+
+
+def pop_request_paragraph_reuse():
+    """Trả về (số đoạn văn dùng lại, tổng số đoạn văn) của yêu cầu hiện tại và dừng thu thập."""
+    paragraphs = _request_paragraphs.get() or [0, 0]
+    _request_paragraphs.set(None)
+    return tuple(paragraphs)
+
+
+def paragraph_reuse_header(reused, total):
+    """Giá trị header X-Paragraph-Reuse: tỷ lệ đoạn văn dùng lại kèm số đoạn văn."""
+    return f"{reused / total:.3f}; reused={reused}; total={total}"
+
+
+def server_timing_header(timings):
+    """Tạo giá trị header Server-Timing; các bước lặp lại (ví dụ nhiều lần chạy spaCy) được cộng dồn."""
+    totals = {}
+    for stage, elapsed in timings:
+        totals[stage] = totals.get(stage, 0.0) + elapsed
+    return ', '.join(f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in totals.items())
+
+
+def render_metrics():
+    """Toàn bộ số liệu theo định dạng văn bản của Prometheus."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
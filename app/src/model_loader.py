@@ -0,0 +1,277 @@
+import importlib.metadata
+import importlib.util
+import os
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+# Cấu hình pipeline trống theo ngôn ngữ khi chưa cài mô hình (tiếng Việt mặc định cần pyvi)
+BLANK_CONFIGS = {
+    'vi': {'nlp': {'tokenizer': {'use_pyvi': False}}},
+}
+
+
+def _blank(language):
+    """Pipeline trống của ngôn ngữ, có sentencizer để doc.sents dùng được khi chưa cài mô hình."""
+    import spacy
+    nlp = spacy.blank(language, config=BLANK_CONFIGS.get(language, {}))
+    nlp.add_pipe('sentencizer')
+    return nlp
+
+
+def model_installed(model_name):
+    """Mô hình đã được cài đặt (dạng package Python hoặc thư mục) mà không cần import spaCy."""
+    return importlib.util.find_spec(model_name) is not None or os.path.isdir(model_name)
+
+
+@functools.lru_cache(maxsize=None)
+def installed_version(package_name):
+    """Phiên bản của package đã cài (ví dụ mô hình spaCy hoặc spacy), None nếu không có; không import package."""
+    try:
+        return importlib.metadata.version(package_name)
+    except (importlib.metadata.PackageNotFoundError, ValueError):
+        return None
+
+
+def _rss_bytes():
+    """Bộ nhớ thường trú (RSS) của tiến trình, hoặc None nếu không đọc được (ngoài Linux)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def load_spacy_model(model_name, language='en'):
+    """Tải mô hình spaCy theo tên; dùng pipeline trống của language nếu mô hình chưa được cài đặt."""
+    # Kiểm tra và tải spaCy
+    try:
+        import spacy
+    except ImportError as e:
+        print(f"Lỗi: Không thể import thư viện spaCy. {str(e)}")
+        print("Vui lòng cài đặt spaCy bằng lệnh 'pip install spacy' và chạy 'python -m spacy download en_core_web_sm'")
+        raise ImportError("Không thể sử dụng ứng dụng khi thiếu thư viện spaCy")
+
+    try:
+        # Kiểm tra xem mô hình đã được cài đặt chưa
+        if importlib.util.find_spec(model_name) is not None:
+            # Mô hình đã được cài đặt dưới dạng package Python
+            nlp = spacy.load(model_name)
+            print(f"Đã tải thành công mô hình {model_name}")
+        else:
+            # Thử tải từ đường dẫn khác
+            try:
+                nlp = spacy.load(model_name)
+                print(f"Đã tải thành công mô hình {model_name}")
+            except OSError:
+                print(f"Không tìm thấy mô hình {model_name}. Đang tải mô hình nhỏ mặc định...")
+                # Sử dụng mô hình nhỏ mặc định nếu không tìm thấy mô hình chính
+                nlp = _blank(language)
+                print("Đã tải mô hình nhỏ (blank model)")
+    except Exception as e:
+        print(f"Lỗi khi tải mô hình spaCy: {str(e)}")
+        # Tạo mô hình trống nếu không thể tải được mô hình
+        nlp = _blank(language)
+        print("Đã tải mô hình trống (blank model)")
+    return nlp
+
+
+class ModelLoader:
+    """Tải mô hình spaCy khi được dùng lần đầu thay vì khi import module.
+
+    get() an toàn luồng: các luồng gọi đồng thời trong lúc mô hình đang được
+    tải sẽ chờ và dùng chung một mô hình. prepare (nếu có) được gọi một lần
+    trên mô hình vừa tải và on_load (nếu có) được gọi khi tải xong. Sau khi
+    fork, khóa được tạo lại trong tiến trình con để không bị kẹt nếu tiến trình
+    cha đang tải mô hình ở luồng khác.
+    """
+
+    def __init__(self, model_name, prepare=None, language='en', on_load=None):
+        self.model_name = model_name
+        self.prepare = prepare
+        self.language = language
+        self.on_load = on_load
+        self.load_seconds = None
+        # Bộ nhớ ước tính của mô hình: RSS tăng thêm trong lúc tải (0 nếu không đo được)
+        self.memory_bytes = 0
+
+        self._nlp = None
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._nlp is not None
+
+    def get(self):
+        """Mô hình spaCy, được tải ở lần gọi đầu tiên."""
+        nlp = self._nlp
+        if nlp is not None:
+            return nlp
+        with self._lock:
+            if self._nlp is None:
+                start = time.perf_counter()
+                rss_before = _rss_bytes()
+                nlp = load_spacy_model(self.model_name, self.language)
+                if self.prepare is not None:
+                    self.prepare(nlp)
+                self.load_seconds = time.perf_counter() - start
+                rss_after = _rss_bytes()
+                if rss_before is not None and rss_after is not None:
+                    self.memory_bytes = max(0, rss_after - rss_before)
+                self._nlp = nlp
+                if self.on_load is not None:
+                    self.on_load(self)
+            return self._nlp
+
+
+class ModelRegistry:
+    """Các pipeline spaCy theo ngôn ngữ, tải khi cần và loại bỏ theo LRU.
+
+    models ánh xạ mã ngôn ngữ sang tên mô hình. Tối đa max_models pipeline được
+    giữ trong bộ nhớ và tổng bộ nhớ ước tính (RSS tăng thêm khi tải) không vượt
+    quá memory_budget byte; pipeline ít được dùng gần đây nhất bị loại trước,
+    trừ pipeline của ngôn ngữ mặc định. Yêu cầu đang dùng pipeline bị loại vẫn
+    chạy bình thường; bộ nhớ được giải phóng khi yêu cầu kết thúc.
+
+    Chỉ các ngôn ngữ đã cài mô hình được dùng (available); ngôn ngữ được hỗ trợ
+    nhưng chưa cài mô hình dùng pipeline của ngôn ngữ mặc định, vì pipeline
+    trống không có từ loại, cây phụ thuộc hay thực thể.
+    """
+
+    def __init__(self, models, default_language, max_models, memory_budget, prepare=None, on_load=None,
+                 on_evict=None):
+        if default_language not in models:
+            raise ValueError(f"Ngôn ngữ mặc định không có mô hình: {default_language}")
+        self.models = dict(models)
+        self.default_language = default_language
+        self.available = frozenset(
+            language for language, model_name in self.models.items()
+            if language == default_language or model_installed(model_name)
+        )
+        self.max_models = max(1, max_models)
+        self.memory_budget = memory_budget
+        self.prepare = prepare
+        self.on_load = on_load
+        self.on_evict = on_evict
+
+        self._loaders = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'loads': 0, 'evictions': 0, 'load_seconds': 0.0}
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    def resolve(self, language=None):
+        """Mã ngôn ngữ của pipeline sẽ dùng ('en-US' -> 'en').
+
+        Trả về ngôn ngữ mặc định nếu language rỗng hoặc mô hình của ngôn ngữ chưa
+        được cài đặt; ValueError nếu ngôn ngữ không được hỗ trợ.
+        """
+        if not language:
+            return self.default_language
+        code = language.lower().replace('_', '-').split('-')[0]
+        if code not in self.models:
+            raise ValueError(f"Ngôn ngữ không được hỗ trợ: {language}")
+        return code if code in self.available else self.default_language
+
+    def _loader(self, language):
+        with self._lock:
+            loader = self._loaders.get(language)
+            if loader is None:
+                loader = ModelLoader(self.models[language], self.prepare, language,
+                                     on_load=functools.partial(self._loaded, language))
+                self._loaders[language] = loader
+            self._loaders.move_to_end(language)
+            return loader
+
+    def loader(self, language=None):
+        """ModelLoader của ngôn ngữ (không kích hoạt việc tải mô hình)."""
+        return self._loader(self.resolve(language))
+
+    def get(self, language=None):
+        """Pipeline của ngôn ngữ, tải ở lần dùng đầu tiên; có thể loại pipeline khác khỏi bộ nhớ."""
+        return self._loader(self.resolve(language)).get()
+
+    def _loaded(self, language, loader):
+        # Gọi một lần bởi luồng đã tải mô hình của language
+        with self._lock:
+            self._stats['loads'] += 1
+            self._stats['load_seconds'] += loader.load_seconds
+            evicted = self._evict(keep=language)
+        if self.on_load is not None:
+            self.on_load(language, loader)
+        if self.on_evict is not None:
+            for name in evicted:
+                self.on_evict(name)
+
+    def _evict(self, keep):
+        # Gọi khi đang giữ self._lock; chỉ loại các pipeline đã tải xong
+        evicted = []
+        while True:
+            loaded = [(name, loader) for name, loader in self._loaders.items() if loader.loaded]
+            memory = sum(loader.memory_bytes for _, loader in loaded)
+            if len(loaded) <= self.max_models and (not self.memory_budget or memory <= self.memory_budget):
+                break
+            candidates = [name for name, _ in loaded if name not in (keep, self.default_language)]
+            if not candidates:
+                break
+            # Thứ tự của OrderedDict là thứ tự dùng gần đây: phần tử đầu tiên là LRU
+            del self._loaders[candidates[0]]
+            self._stats['evictions'] += 1
+            evicted.append(candidates[0])
+        return evicted
+
+    def _identity(self, language):
+        # Pipeline đã tải: theo meta của nó (phát hiện cả trường hợp tải mô hình lỗi và dùng pipeline trống)
+        with self._lock:
+            loader = self._loaders.get(language)
+        if loader is not None and loader.loaded:
+            nlp = loader.get()
+            return f"{nlp.lang}_{nlp.meta.get('name')}-{nlp.meta.get('version')}"
+        # Chưa tải: mô hình đã cài, hoặc pipeline trống (meta mặc định của spacy.blank)
+        model_name = self.models[language]
+        if model_installed(model_name):
+            return f"{model_name}-{installed_version(model_name)}"
+        return f"{language}_pipeline-0.0.0"
+
+    def fingerprint(self, language=None):
+        """Định danh (tên và phiên bản) của các pipeline có thể được dùng cho language, không tải mô hình.
+
+        Với language rỗng hoặc 'auto' (ngôn ngữ được phát hiện từ nội dung) là
+        mọi ngôn ngữ đã cài mô hình. Dùng trong khóa của bộ nhớ đệm kết quả, để
+        kết quả của pipeline trống không còn được dùng sau khi cài mô hình.
+        """
+        try:
+            languages = ([self.resolve(language)] if language and language != 'auto'
+                         else sorted(self.available))
+        except ValueError:
+            # Ngôn ngữ không được hỗ trợ: yêu cầu sẽ bị từ chối khi phân tích
+            languages = []
+        return [f"{name}={self._identity(name)}" for name in languages]
+
+    def stats(self):
+        """Các pipeline trong bộ nhớ (theo thứ tự LRU), số lần tải/loại bỏ và bộ nhớ ước tính."""
+        with self._lock:
+            resident = [
+                {'language': name, 'model': loader.model_name, 'memory_bytes': loader.memory_bytes,
+                 'load_seconds': round(loader.load_seconds, 3)}
+                for name, loader in self._loaders.items() if loader.loaded
+            ]
+            stats = dict(self._stats)
+        stats['load_seconds'] = round(stats['load_seconds'], 3)
+        stats['resident'] = resident
+        stats['memory_bytes'] = sum(entry['memory_bytes'] for entry in resident)
+        stats['memory_budget_bytes'] = self.memory_budget
+        stats['max_models'] = self.max_models
+        stats['languages'] = sorted(self.models)
+        stats['available_languages'] = sorted(self.available)
+        stats['default_language'] = self.default_language
+        return stats
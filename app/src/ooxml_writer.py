@@ -0,0 +1,217 @@
+import re
+import zipfile
+from functools import lru_cache
+from xml.sax.saxutils import escape, quoteattr
+
+from app.src.document_blocks import (
+    BLOCK_TITLE, BLOCK_SECTION_TITLE, BLOCK_HEADING, PAGE_NUMBER_TEXT,
+    line_spacing_value, margin_inches
+)
+
+# Engine OOXML: ghi trực tiếp word/document.xml theo luồng vào tệp ZIP.
+# Toàn bộ định dạng nằm trong các style dùng chung (styles.xml), nên mỗi đoạn văn
+# chỉ cần tham chiếu style thay vì lặp lại font, cỡ chữ và khoảng cách dòng.
+
+W_NAMESPACE = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+R_NAMESPACE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+DOCUMENT_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml'
+STYLES_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml'
+FOOTER_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.footer+xml'
+
+# Style cho từng loại khối (các khối còn lại dùng Normal)
+BLOCK_STYLES = {
+    BLOCK_TITLE: 'FormatterTitle',
+    BLOCK_SECTION_TITLE: 'FormatterSectionTitle',
+    BLOCK_HEADING: 'Heading1',
+}
+
+# Kích thước trang Letter và khoảng cách header/footer giống mẫu mặc định của python-docx (twip)
+PAGE_WIDTH = 12240
+PAGE_HEIGHT = 15840
+HEADER_FOOTER_DISTANCE = 720
+TWIPS_PER_INCH = 1440
+
+# Số ký tự XML được gom lại trước khi ghi vào ZIP
+WRITE_BUFFER_CHARS = 64 * 1024
+
+# Ký tự điều khiển không hợp lệ trong XML 1.0
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+# Tab và xuống dòng được chuyển thành <w:tab/> và <w:br/> giống python-docx
+RUN_SPECIAL_CHARS = re.compile('([\t\n\r])')
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+ROOT_RELS = (
+    XML_DECLARATION +
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+
+@lru_cache(maxsize=2)
+def _content_types(with_footer):
+    overrides = (
+        f'<Override PartName="/word/document.xml" ContentType="{DOCUMENT_CONTENT_TYPE}"/>'
+        f'<Override PartName="/word/styles.xml" ContentType="{STYLES_CONTENT_TYPE}"/>'
+    )
+    if with_footer:
+        overrides += f'<Override PartName="/word/footer1.xml" ContentType="{FOOTER_CONTENT_TYPE}"/>'
+    return (
+        XML_DECLARATION +
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        + overrides +
+        '</Types>'
+    )
+
+
+@lru_cache(maxsize=2)
+def _document_rels(with_footer):
+    relationships = (
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+    )
+    if with_footer:
+        relationships += (
+            '<Relationship Id="rId2" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/footer" '
+            'Target="footer1.xml"/>'
+        )
+    return (
+        XML_DECLARATION +
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        + relationships +
+        '</Relationships>'
+    )
+
+
+def _font_xml(font_family):
+    font = quoteattr(font_family)
+    return f'<w:rFonts w:ascii={font} w:hAnsi={font}/>'
+
+
+@lru_cache(maxsize=64)
+def _styles_xml(font_family, font_size, line_spacing):
+    """styles.xml cho một tổ hợp font/cỡ chữ/khoảng cách dòng (được lưu đệm)."""
+    fonts = _font_xml(font_family)
+    body_size = int(font_size) * 2
+    line = int(round(line_spacing * 240))
+    return (
+        XML_DECLARATION +
+        f'<w:styles xmlns:w="{W_NAMESPACE}">'
+        '<w:docDefaults>'
+        '<w:rPrDefault><w:rPr><w:sz w:val="22"/><w:szCs w:val="22"/>'
+        '<w:lang w:val="en-US" w:eastAsia="en-US" w:bidi="ar-SA"/></w:rPr></w:rPrDefault>'
+        '<w:pPrDefault><w:pPr><w:spacing w:after="200" w:line="276" w:lineRule="auto"/></w:pPr></w:pPrDefault>'
+        '</w:docDefaults>'
+        '<w:style w:type="paragraph" w:default="1" w:styleId="Normal">'
+        '<w:name w:val="Normal"/><w:qFormat/>'
+        f'<w:pPr><w:spacing w:line="{line}" w:lineRule="auto"/></w:pPr>'
+        f'<w:rPr>{fonts}<w:sz w:val="{body_size}"/></w:rPr>'
+        '</w:style>'
+        '<w:style w:type="paragraph" w:styleId="Heading1">'
+        '<w:name w:val="heading 1"/><w:basedOn w:val="Normal"/><w:next w:val="Normal"/>'
+        '<w:uiPriority w:val="9"/><w:qFormat/>'
+        '<w:pPr><w:keepNext/><w:keepLines/><w:spacing w:before="480" w:after="0"/><w:outlineLvl w:val="0"/></w:pPr>'
+        f'<w:rPr>{fonts}<w:b/><w:bCs/><w:color w:val="365F91"/><w:sz w:val="28"/><w:szCs w:val="28"/></w:rPr>'
+        '</w:style>'
+        '<w:style w:type="paragraph" w:customStyle="1" w:styleId="FormatterTitle">'
+        '<w:name w:val="Formatter Title"/><w:basedOn w:val="Normal"/><w:next w:val="Normal"/>'
+        '<w:pPr><w:jc w:val="center"/></w:pPr>'
+        f'<w:rPr>{fonts}<w:b/><w:sz w:val="32"/></w:rPr>'
+        '</w:style>'
+        '<w:style w:type="paragraph" w:customStyle="1" w:styleId="FormatterSectionTitle">'
+        '<w:name w:val="Formatter Section Title"/><w:basedOn w:val="Normal"/><w:next w:val="Normal"/>'
+        '<w:pPr><w:jc w:val="center"/></w:pPr>'
+        f'<w:rPr>{fonts}<w:b/><w:sz w:val="28"/></w:rPr>'
+        '</w:style>'
+        '</w:styles>'
+    )
+
+
+def _footer_xml():
+    return (
+        XML_DECLARATION +
+        f'<w:ftr xmlns:w="{W_NAMESPACE}" xmlns:r="{R_NAMESPACE}">'
+        f'<w:p><w:pPr><w:jc w:val="center"/></w:pPr><w:r><w:t>{escape(PAGE_NUMBER_TEXT)}</w:t></w:r></w:p>'
+        '</w:ftr>'
+    )
+
+
+def _section_xml(formatting_options, with_footer):
+    margin = int(round(margin_inches(formatting_options) * TWIPS_PER_INCH))
+    footer_reference = '<w:footerReference w:type="default" r:id="rId2"/>' if with_footer else ''
+    return (
+        f'<w:sectPr>{footer_reference}'
+        f'<w:pgSz w:w="{PAGE_WIDTH}" w:h="{PAGE_HEIGHT}"/>'
+        f'<w:pgMar w:top="{margin}" w:right="{margin}" w:bottom="{margin}" w:left="{margin}" '
+        f'w:header="{HEADER_FOOTER_DISTANCE}" w:footer="{HEADER_FOOTER_DISTANCE}" w:gutter="0"/>'
+        '<w:cols w:space="720"/><w:docGrid w:linePitch="360"/>'
+        '</w:sectPr>'
+    )
+
+
+def _run_xml(text):
+    """Chuyển văn bản thành một run, với tab/xuống dòng thành <w:tab/>/<w:br/>."""
+    text = INVALID_XML_CHARS.sub('', text)
+    parts = []
+    for piece in RUN_SPECIAL_CHARS.split(text):
+        if not piece:
+            continue
+        if piece == '\t':
+            parts.append('<w:tab/>')
+        elif piece in ('\n', '\r'):
+            parts.append('<w:br/>')
+        else:
+            parts.append(f'<w:t xml:space="preserve">{escape(piece)}</w:t>')
+    return f'<w:r>{"".join(parts)}</w:r>' if parts else ''
+
+
+def _paragraph_xml(kind, text):
+    style = BLOCK_STYLES.get(kind)
+    properties = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ''
+    return f'<w:p>{properties}{_run_xml(text) if text else ""}</w:p>'
+
+
+def _write_document_xml(archive, blocks, formatting_options, with_footer):
+    """Ghi word/document.xml theo luồng: các đoạn được gom thành từng khối nhỏ rồi ghi vào ZIP."""
+    with archive.open('word/document.xml', 'w') as stream:
+        buffer = [
+            XML_DECLARATION,
+            f'<w:document xmlns:w="{W_NAMESPACE}" xmlns:r="{R_NAMESPACE}"><w:body>'
+        ]
+        buffered_chars = 0
+        for kind, text in blocks:
+            paragraph = _paragraph_xml(kind, text)
+            buffer.append(paragraph)
+            buffered_chars += len(paragraph)
+            if buffered_chars >= WRITE_BUFFER_CHARS:
+                stream.write(''.join(buffer).encode('utf-8'))
+                buffer = []
+                buffered_chars = 0
+
+        buffer.append(_section_xml(formatting_options, with_footer))
+        buffer.append('</w:body></w:document>')
+        stream.write(''.join(buffer).encode('utf-8'))
+
+
+def write_ooxml_document(blocks, formatting_options, output_path):
+    """Engine OOXML: ghi tài liệu Word trong một lượt từ danh sách khối vào output_path (đường dẫn hoặc buffer)."""
+    with_footer = bool(formatting_options['page_numbers'])
+    styles = _styles_xml(formatting_options['font_family'], formatting_options['font_size'],
+                         line_spacing_value(formatting_options))
+
+    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _content_types(with_footer))
+        archive.writestr('_rels/.rels', ROOT_RELS)
+        archive.writestr('word/_rels/document.xml.rels', _document_rels(with_footer))
+        archive.writestr('word/styles.xml', styles)
+        if with_footer:
+            archive.writestr('word/footer1.xml', _footer_xml())
+        _write_document_xml(archive, blocks, formatting_options, with_footer)
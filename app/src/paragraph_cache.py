@@ -0,0 +1,79 @@
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict
+
+from app.src import config
+
+
+class ParagraphCache:
+    """Bộ nhớ đệm kết quả phân tích spaCy theo từng đoạn văn (LRU trong bộ nhớ).
+
+    Khóa là hash của văn bản đoạn văn cùng với profile pipeline và mô hình, nên
+    khi tải lên bản sửa đổi của cùng một tài liệu chỉ các đoạn văn mới hoặc đã
+    thay đổi phải chạy lại mô hình. Giá trị được lưu dạng pickle: dung lượng được
+    tính chính xác và kết quả lấy ra không chia sẻ đối tượng với bộ nhớ đệm.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    @staticmethod
+    def make_key(namespace, text):
+        """Khóa của đoạn văn text trong namespace (ví dụ profile và tên mô hình)."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(namespace.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(text.encode('utf-8', 'surrogatepass'))
+        return digest.digest()
+
+    def get(self, key, default=None):
+        """Kết quả đã lưu của đoạn văn, hoặc default nếu không có trong bộ nhớ đệm."""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self._stats['misses'] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+        return pickle.loads(data)
+
+    def set(self, key, value):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = data
+            self._bytes += len(data)
+            self._stats['stores'] += 1
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Số đoạn văn, dung lượng và số lần trúng/trượt của bộ nhớ đệm."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        stats['max_bytes'] = self.max_bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else None
+        return stats
+
+
+paragraph_cache = ParagraphCache(max_bytes=config.PARAGRAPH_CACHE_MAX_BYTES)
@@ -0,0 +1,230 @@
+import json
+import struct
+
+import numpy as np
+
+from app.src.analysis_accumulator import AnalysisAccumulator, MAX_NOUN_CHUNKS
+from app.src.analyzed_document import AnalyzedDocument, is_heading_sentence
+from app.src.keywords import TOKEN_ATTRIBUTES, token_terms
+
+# Kết quả phân tích spaCy dạng gọn: thay vì giữ các spaCy Doc (đồ thị đối tượng
+# Python lớn, tham chiếu đến vocab), thuộc tính token được lưu thành mảng có
+# kiểu, các câu/thực thể/cụm danh từ thành mảng vị trí ký tự, và văn bản thành
+# một buffer UTF-8. Toàn bộ được ghi vào một buffer bytes duy nhất; đọc lại
+# bằng np.frombuffer trên chính buffer đó, không sao chép dữ liệu.
+#
+# Có hai cách tách câu: 'sentences' là câu của parser (profile 'analyze', dùng
+# để đếm câu khi phân tích văn bản), 'structure' là câu và cờ tiêu đề của
+# profile 'structure' (cùng cách tách câu với /upload, dùng để định dạng).
+
+PARSED_MAGIC = b'PDOC0002'
+# Thứ tự các phần trong buffer; header gồm magic và độ dài (bytes) của từng phần
+SECTIONS = ('text', 'tokens', 'sentences', 'structure', 'entities', 'noun_chunks', 'strings')
+PARSED_HEADER = struct.Struct('<8s' + 'Q' * len(SECTIONS))
+# Mỗi phần bắt đầu tại vị trí chia hết cho SECTION_ALIGNMENT
+SECTION_ALIGNMENT = 8
+
+# Cột IDX rồi các thuộc tính dùng cho từ khóa (TOKEN_ATTRIBUTES)
+TOKEN_DTYPE = np.dtype([('idx', '<u4'), ('lower', '<u8'), ('lemma', '<u8'), ('pos', '<u8'),
+                        ('is_stop', 'u1'), ('is_alpha', 'u1'), ('length', '<u4')])
+SENTENCE_DTYPE = np.dtype([('start', '<u4'), ('end', '<u4'), ('is_heading', 'u1')])
+ENTITY_DTYPE = np.dtype([('start', '<u4'), ('end', '<u4'), ('label', '<u8')])
+SPAN_DTYPE = np.dtype([('start', '<u4'), ('end', '<u4')])
+
+SECTION_DTYPES = {
+    'tokens': TOKEN_DTYPE,
+    'sentences': SENTENCE_DTYPE,
+    'structure': SENTENCE_DTYPE,
+    'entities': ENTITY_DTYPE,
+    'noun_chunks': SPAN_DTYPE,
+}
+
+
+def _padding(size):
+    return -size % SECTION_ALIGNMENT
+
+
+def _shifted(array, offset):
+    """Bản sao của mảng với các cột vị trí ký tự (idx, start, end) được cộng thêm offset."""
+    array = array.copy()
+    for name in ('idx', 'start', 'end'):
+        if name in array.dtype.names:
+            array[name] += offset
+    return array
+
+
+class ParseArrays:
+    """Các mảng kết quả phân tích của một hoặc nhiều spaCy Doc, gộp được theo thứ tự.
+
+    Đối tượng nhỏ và pickle được, nên các worker của shard_pool trả về nó thay
+    cho Doc; build() tạo ParsedDocument cho toàn bộ văn bản.
+    """
+
+    def __init__(self):
+        self.parts = {name: [] for name in SECTION_DTYPES}
+        # Văn bản của các term và nhãn thực thể (hash -> văn bản)
+        self.strings = {}
+
+    def add_doc(self, doc, offset=0, structure_doc=None):
+        """Thêm kết quả phân tích của một Doc bắt đầu tại vị trí ký tự offset trong văn bản.
+
+        structure_doc là cùng văn bản đã chạy profile 'structure'; câu và tiêu
+        đề của nó được lưu vào phần 'structure' (dùng để định dạng).
+        """
+        if len(doc) == 0:
+            return
+        attributes = doc.to_array(['IDX'] + TOKEN_ATTRIBUTES)
+        tokens = np.empty(len(doc), dtype=TOKEN_DTYPE)
+        for column, name in enumerate(TOKEN_DTYPE.names):
+            tokens[name] = attributes[:, column]
+        tokens['idx'] += offset
+        self.parts['tokens'].append(tokens)
+
+        strings = doc.vocab.strings
+        for term_id in np.unique(token_terms(tokens['lower'], tokens['lemma'])).tolist():
+            self.strings.setdefault(term_id, strings[term_id])
+
+        sentences = []
+        for sent in doc.sents:
+            sentences.append((offset + sent.start_char, offset + sent.end_char,
+                              is_heading_sentence(sent.text.strip(), sent)))
+        self.parts['sentences'].append(np.array(sentences, dtype=SENTENCE_DTYPE))
+
+        structure = []
+        if structure_doc is not None:
+            for sent in structure_doc.sents:
+                structure.append((offset + sent.start_char, offset + sent.end_char,
+                                  is_heading_sentence(sent.text.strip(), sent)))
+        self.parts['structure'].append(np.array(structure, dtype=SENTENCE_DTYPE))
+
+        entities = []
+        for ent in doc.ents:
+            entities.append((offset + ent.start_char, offset + ent.end_char, ent.label))
+            self.strings.setdefault(ent.label, ent.label_)
+        self.parts['entities'].append(np.array(entities, dtype=ENTITY_DTYPE))
+
+        noun_chunks = []
+        if doc.has_annotation('DEP'):
+            noun_chunks = [(offset + chunk.start_char, offset + chunk.end_char) for chunk in doc.noun_chunks]
+        self.parts['noun_chunks'].append(np.array(noun_chunks, dtype=SPAN_DTYPE))
+
+    def merge(self, other, offset=0):
+        """Gộp các mảng của phần văn bản tiếp theo vào đối tượng này.
+
+        offset được cộng vào các vị trí ký tự của other (ví dụ khi other là kết
+        quả của một đoạn văn được phân tích riêng, bắt đầu từ vị trí 0).
+        """
+        for name, arrays in other.parts.items():
+            if offset:
+                arrays = [_shifted(array, offset) for array in arrays]
+            self.parts[name].extend(arrays)
+        for key, text in other.strings.items():
+            self.strings.setdefault(key, text)
+        return self
+
+    def build(self, content):
+        """ParsedDocument của văn bản content (các vị trí ký tự đã tính theo content)."""
+        sections = {'text': content.encode('utf-8')}
+        for name, dtype in SECTION_DTYPES.items():
+            arrays = self.parts[name]
+            sections[name] = (np.concatenate(arrays) if arrays else np.empty(0, dtype=dtype)).tobytes()
+        sections['strings'] = json.dumps(sorted(self.strings.items()), ensure_ascii=False).encode('utf-8')
+
+        chunks = [PARSED_HEADER.pack(PARSED_MAGIC, *(len(sections[name]) for name in SECTIONS))]
+        chunks.append(b'\0' * _padding(PARSED_HEADER.size))
+        for name in SECTIONS:
+            chunks.append(sections[name])
+            chunks.append(b'\0' * _padding(len(sections[name])))
+        parsed = ParsedDocument(b''.join(chunks))
+        # Văn bản đã có sẵn dạng str, không cần giải mã lại từ buffer
+        parsed._content = content
+        return parsed
+
+
+class ParsedDocument:
+    """Kết quả phân tích spaCy của một tài liệu, lưu trong một buffer bytes.
+
+    Các mảng (tokens, sentences, structure, entities, noun_chunks) là view của
+    numpy trên buffer; văn bản và bảng chuỗi chỉ được giải mã khi cần.
+    analysis_accumulator() và analyzed_document() tạo lại đầu vào của
+    analyze_text và các bước định dạng mà không cần chạy lại mô hình.
+    """
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        view = memoryview(buffer)
+        if len(view) < PARSED_HEADER.size:
+            raise ValueError("Dữ liệu phân tích không hợp lệ")
+        magic, *sizes = PARSED_HEADER.unpack_from(view)
+        if magic != PARSED_MAGIC:
+            raise ValueError("Dữ liệu phân tích không hợp lệ")
+
+        self._sections = {}
+        position = PARSED_HEADER.size + _padding(PARSED_HEADER.size)
+        for name, size in zip(SECTIONS, sizes):
+            if position + size > len(view):
+                raise ValueError("Dữ liệu phân tích bị cắt cụt")
+            self._sections[name] = view[position:position + size]
+            position += size + _padding(size)
+
+        for name, dtype in SECTION_DTYPES.items():
+            setattr(self, name, np.frombuffer(self._sections[name], dtype=dtype))
+        self._content = None
+        self._strings = None
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Đọc lại ParsedDocument từ bytes (hoặc buffer bất kỳ, ví dụ mmap) mà không sao chép."""
+        return cls(data)
+
+    def to_bytes(self):
+        return bytes(self._buffer)
+
+    @property
+    def nbytes(self):
+        return len(memoryview(self._buffer))
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = str(self._sections['text'], 'utf-8')
+        return self._content
+
+    @property
+    def strings(self):
+        if self._strings is None:
+            self._strings = {key: text for key, text in json.loads(str(self._sections['strings'], 'utf-8'))}
+        return self._strings
+
+    @property
+    def has_tokens(self):
+        return len(self.tokens) > 0
+
+    def analysis_accumulator(self):
+        """AnalysisAccumulator với kết quả giống như khi analyze_text chạy mô hình trên văn bản."""
+        accumulator = AnalysisAccumulator()
+        if not self.has_tokens:
+            return accumulator
+        content = self.content
+        strings = self.strings
+
+        accumulator.has_tokens = True
+        accumulator.entities = [{'text': content[start:end], 'label': strings[label]}
+                                for start, end, label in self.entities.tolist()]
+        accumulator.sentences = len(self.sentences)
+        accumulator.tokens = len(self.tokens)
+        tokens = self.tokens
+        accumulator.term_counts.add_tokens(tokens['lower'], tokens['lemma'], tokens['pos'], tokens['is_stop'],
+                                           tokens['is_alpha'], tokens['length'], strings)
+        accumulator.noun_chunks = [content[start:end] for start, end in self.noun_chunks[:MAX_NOUN_CHUNKS].tolist()]
+        return accumulator
+
+    def analyzed_document(self):
+        """AnalyzedDocument (câu, tiêu đề của profile 'structure') dùng cho các bước định dạng."""
+        content = self.content
+        analyzed = AnalyzedDocument(content)
+        if len(self.structure):
+            analyzed.has_nlp_capabilities = True
+            for start, end, is_heading in self.structure.tolist():
+                analyzed.add_sentence(content[start:end].strip(), start, end, bool(is_heading))
+        return analyzed
@@ -0,0 +1,65 @@
+# Các profile pipeline spaCy theo từng tác vụ.
+# Mỗi profile liệt kê các thành phần cần thiết; các thành phần còn lại bị tắt
+# khi chạy nlp() hoặc nlp.pipe() cho tác vụ đó.
+PIPELINE_PROFILES = {
+    # Toàn bộ pipeline mặc định của mô hình
+    'full': None,
+    # Phân tích văn bản: thực thể (ner), từ loại và lemma cho từ khóa (tagger, lemmatizer)
+    # và cụm danh từ (parser)
+    'analyze': ('tagger', 'attribute_ruler', 'lemmatizer', 'parser', 'ner', 'sentencizer'),
+    # Phát hiện cấu trúc: chỉ cần ranh giới câu (is_title là thuộc tính từ vựng)
+    'structure': ('senter', 'sentencizer'),
+}
+
+# Các thành phần chỉ xác định ranh giới câu
+SENTENCE_COMPONENTS = ('senter', 'sentencizer')
+
+# Các thành phần dùng chung mà các thành phần khác có thể "lắng nghe"
+SHARED_EMBEDDING_COMPONENTS = ('tok2vec', 'transformer')
+
+_disabled_cache = {}
+
+
+def prepare_pipeline(nlp):
+    """Bật thành phần senter (nếu mô hình có) để profile 'structure' có thể dùng.
+
+    senter chỉ được chạy trong profile 'structure'; các profile khác luôn tắt nó
+    nên kết quả của parser không bị thay đổi.
+    """
+    if 'senter' in nlp.disabled:
+        nlp.enable_pipe('senter')
+    _disabled_cache.clear()
+    return nlp
+
+
+def _required_components(nlp, profile):
+    wanted = set(PIPELINE_PROFILES[profile])
+
+    # Profile chỉ cần ranh giới câu nhưng mô hình không có senter/sentencizer: dùng parser
+    if wanted <= set(SENTENCE_COMPONENTS) and not wanted.intersection(nlp.pipe_names):
+        wanted.add('parser')
+
+    # Giữ lại các thành phần embedding dùng chung nếu thành phần cần thiết lắng nghe chúng
+    for name in SHARED_EMBEDDING_COMPONENTS:
+        if name in nlp.pipe_names:
+            listeners = getattr(nlp.get_pipe(name), 'listening_components', [])
+            if wanted.intersection(listeners):
+                wanted.add(name)
+    return wanted
+
+
+def disabled_components(nlp, profile):
+    """Danh sách thành phần cần tắt cho profile (dùng làm tham số disable của nlp)."""
+    if profile not in PIPELINE_PROFILES:
+        raise ValueError(f"Profile pipeline không hợp lệ: {profile}")
+
+    cache_key = (id(nlp), tuple(nlp.pipe_names), profile)
+    if cache_key not in _disabled_cache:
+        if PIPELINE_PROFILES[profile] is None:
+            # Pipeline mặc định: senter chỉ dành cho profile 'structure'
+            disabled = ['senter'] if 'senter' in nlp.pipe_names and 'parser' in nlp.pipe_names else []
+        else:
+            wanted = _required_components(nlp, profile)
+            disabled = [name for name in nlp.pipe_names if name not in wanted]
+        _disabled_cache[cache_key] = disabled
+    return _disabled_cache[cache_key]
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app.src import config
+
+# Khi tầng đĩa vượt giới hạn, xóa các mục ít dùng nhất đến khi còn tỷ lệ này của giới hạn
+# (để lần quét thư mục tiếp theo không xảy ra ngay ở lần ghi sau)
+DISK_EVICTION_TARGET = 0.9
+# Phiên bản của mã tạo kết quả (trích xuất, phân tích, định dạng, hiển thị), nằm trong mọi khóa:
+# tăng khi thay đổi mã làm kết quả khác đi để các kết quả cũ trên đĩa không còn được dùng
+RESULT_VERSION = 2
+
+
+class ResultCache:
+    """Bộ nhớ đệm kết quả theo nội dung, gồm tầng bộ nhớ (LRU) và tầng đĩa (TTL).
+
+    Khóa được tạo từ hash của dữ liệu tải lên cùng với các tùy chọn định dạng
+    đã chuẩn hóa, định danh của pipeline (mô hình, phiên bản, profile) và phiên
+    bản mã tạo kết quả, nên cùng một tệp gửi lại nhiều lần sẽ không phải chạy
+    lại bước trích xuất, phân tích NLP hay tạo tệp DOCX, còn kết quả của một
+    pipeline khác (ví dụ pipeline trống trước khi cài mô hình) không được dùng lại.
+
+    Trên đĩa, mtime của mỗi mục là thời điểm dùng gần nhất (được cập nhật khi
+    trúng), nên TTL tính từ lần dùng gần nhất và việc loại bỏ khi vượt giới hạn
+    dung lượng theo LRU. Dung lượng tầng đĩa được cộng dồn khi ghi; thư mục chỉ
+    được quét (và dung lượng được tính lại, kể cả phần do tiến trình khác ghi)
+    khi vượt giới hạn.
+    """
+
+    def __init__(self, max_memory_bytes, disk_folder, max_disk_bytes, ttl_seconds):
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_folder = disk_folder
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        # Dung lượng tầng đĩa đã biết; None cho đến lần quét đầu tiên của tiến trình
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0,
+        }
+
+    @staticmethod
+    def make_key(kind, file_digest, filename, formatting_options=None, pipeline=None):
+        """Tạo khóa từ loại kết quả, hash SHA-256 (bytes) của tệp, phần mở rộng, tùy chọn định dạng
+        và định danh của pipeline (dict tuần tự hóa được sang JSON, xem pipeline_fingerprint)."""
+        digest = hashlib.sha256()
+        digest.update(f"{kind}\0{RESULT_VERSION}".encode('utf-8'))
+        digest.update(b'\0')
+        # Phần mở rộng quyết định cách trích xuất văn bản
+        extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+        digest.update(extension.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(file_digest)
+        if formatting_options is not None:
+            digest.update(json.dumps(formatting_options, sort_keys=True).encode('utf-8'))
+        digest.update(b'\0')
+        if pipeline is not None:
+            digest.update(json.dumps(pipeline, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Trả về dữ liệu đã lưu (bytes) hoặc None nếu không có trong bộ nhớ đệm."""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return value
+
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['disk_hits'] += 1
+            self._store_memory(key, value)
+        return value
+
+    def set(self, key, value):
+        """Lưu dữ liệu (bytes) vào cả tầng bộ nhớ và tầng đĩa."""
+        with self._lock:
+            self._stats['stores'] += 1
+            self._store_memory(key, value)
+        self._write_disk(key, value)
+
+    def stats(self):
+        """Số lần trúng/trượt và kích thước hiện tại của từng tầng."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+            stats['memory_bytes'] = self._memory_bytes
+            stats['disk_bytes'] = self._disk_bytes
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def _store_memory(self, key, value):
+        # Gọi khi đã giữ khóa
+        if len(value) > self.max_memory_bytes:
+            return
+        old_value = self._memory.pop(key, None)
+        if old_value is not None:
+            self._memory_bytes -= len(old_value)
+        self._memory[key] = value
+        self._memory_bytes += len(value)
+
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._stats['memory_evictions'] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_folder, key)
+
+    def _read_disk(self, key):
+        if not self.disk_folder:
+            return None
+        path = self._disk_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                os.remove(path)
+                with self._lock:
+                    self._stats['disk_evictions'] += 1
+                return None
+            with open(path, 'rb') as f:
+                value = f.read()
+            # Đánh dấu mục vừa được dùng (LRU trên đĩa)
+            os.utime(path)
+            return value
+        except OSError:
+            return None
+
+    def _write_disk(self, key, value):
+        if not self.disk_folder:
+            return
+        path = self._disk_path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            # Thư mục được tạo khi ghi lần đầu, không tạo khi import
+            os.makedirs(self.disk_folder, exist_ok=True)
+            with open(temp_path, 'wb') as f:
+                f.write(value)
+            try:
+                old_size = os.path.getsize(path)
+            except OSError:
+                old_size = 0
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Lỗi khi ghi bộ nhớ đệm xuống đĩa: {str(e)}")
+            return
+
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(value) - old_size
+            over_limit = self._disk_bytes is None or self._disk_bytes > self.max_disk_bytes
+        if over_limit:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """Quét tầng đĩa: xóa các mục hết hạn, rồi các mục ít dùng nhất nếu vượt giới hạn dung lượng."""
+        now = time.time()
+        entries = []
+        try:
+            with os.scandir(self.disk_folder) as it:
+                for entry in it:
+                    if entry.name.endswith('.tmp'):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            return
+
+        total_bytes = 0
+        kept = []
+        evicted = 0
+        for mtime, size, path in entries:
+            if now - mtime > self.ttl_seconds:
+                evicted += self._remove(path)
+            else:
+                kept.append((mtime, size, path))
+                total_bytes += size
+
+        # Xóa các mục ít dùng nhất cho đến khi nằm dưới mức mục tiêu
+        if total_bytes > self.max_disk_bytes:
+            kept.sort()
+            for mtime, size, path in kept:
+                if total_bytes <= self.max_disk_bytes * DISK_EVICTION_TARGET:
+                    break
+                evicted += self._remove(path)
+                total_bytes -= size
+
+        with self._lock:
+            self._disk_bytes = total_bytes
+            self._stats['disk_evictions'] += evicted
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
+
+
+result_cache = ResultCache(
+    max_memory_bytes=config.CACHE_MEMORY_MAX_BYTES,
+    disk_folder=config.CACHE_DISK_FOLDER,
+    max_disk_bytes=config.CACHE_DISK_MAX_BYTES,
+    ttl_seconds=config.CACHE_TTL_SECONDS,
+)
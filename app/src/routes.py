@@ -1,24 +1,154 @@
-import os
+import functools
+import hashlib
+import io
 import tempfile
-from flask import render_template, request, redirect, url_for, flash, send_file, jsonify, session
+import time
+from flask import render_template, request, redirect, url_for, flash, send_file, jsonify, g
 from werkzeug.utils import secure_filename
 
 from app.src.document_processor import (
     allowed_file, 
     extract_text_from_doc, 
     analyze_text, 
-    create_formatted_document
+    create_formatted_document,
+    get_formatting_options,
+    model_registry,
+    model_status,
+    pipeline_fingerprint
 )
 
 from app.src import config
+from app.src.result_cache import result_cache
+from app.src.storage import storage
+from app.src.document_store import document_store
+from app.src.admission import admission_controller, AdmissionRejected
+from app.src.keywords import idf_index
+from app.src.paragraph_cache import paragraph_cache
+from app.src.jobs import job_manager, JOB_FINISHED
+from app.src.batch import format_batch
+from app.src.metrics import (
+    timed,
+    time_until_close,
+    track_degraded,
+    start_request_timings,
+    pop_request_timings,
+    pop_request_paragraph_reuse,
+    paragraph_reuse_header,
+    server_timing_header,
+    render_metrics,
+    REQUEST_SECONDS,
+    REQUESTS_TOTAL,
+    BYTES_PROCESSED
+)
+
+
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+UPLOAD_READ_BLOCK_SIZE = 64 * 1024
+
+
+def is_async_request():
+    """Kiểm tra xem client có yêu cầu xử lý bất đồng bộ (async=1) hay không."""
+    value = request.form.get('async', request.args.get('async', ''))
+    return value.lower() in ('1', 'true', 'on', 'yes')
+
+
+def read_upload(file):
+    """Đọc tệp tải lên vào bộ nhớ và tính hash SHA-256 trong cùng một lượt đọc.
+
+    Dữ liệu chỉ được ghi ra tệp tạm khi vượt quá UPLOAD_SPILL_THRESHOLD_BYTES.
+    Trả về (buffer, digest); buffer đã được đưa về đầu.
+    """
+    buffer = tempfile.SpooledTemporaryFile(max_size=config.UPLOAD_SPILL_THRESHOLD_BYTES)
+    digest = hashlib.sha256()
+    with timed('upload_read'):
+        while True:
+            block = file.stream.read(UPLOAD_READ_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+            buffer.write(block)
+    BYTES_PROCESSED.inc(buffer.tell(), direction='in')
+    buffer.seek(0)
+    return buffer, digest.digest()
+
+
+def admission_controlled(view):
+    """Đặt endpoint chạy NLP sau bộ kiểm soát tải; trả về 503 kèm Retry-After khi quá tải.
+
+    Chi phí được ước tính từ kích thước tệp tải lên (Content-Length), hoặc từ
+    kích thước tệp đã lưu với các endpoint dùng mã tài liệu. Ticket được đặt vào
+    g.admission_ticket để view có thể giữ token cho công việc chạy nền.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not config.ADMISSION_ENABLED:
+            return view(*args, **kwargs)
+        
+        document_id = kwargs.get('document_id')
+        if document_id is not None:
+            stored = storage.get(document_id)
+            size = stored['size'] if stored else 0
+        else:
+            size = request.content_length or config.MAX_CONTENT_LENGTH
+        
+        try:
+            with admission_controller.admit(size) as ticket:
+                g.admission_ticket = ticket
+                return view(*args, **kwargs)
+        except AdmissionRejected as e:
+            return admission_rejected_response(e)
+    return wrapper
+
+
+def admission_rejected_response(error):
+    """Phản hồi 503 kèm Retry-After cho yêu cầu bị bộ kiểm soát tải từ chối."""
+    print(f"Từ chối yêu cầu {request.endpoint}: {str(error)}")
+    response = jsonify({'error': 'Máy chủ đang quá tải, vui lòng thử lại sau', 'reason': error.reason,
+                        'retry_after': error.retry_after})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+def register_metrics(app):
+    """Đăng ký các hook đo thời gian yêu cầu, header Server-Timing và endpoint /metrics."""
+    @app.before_request
+    def start_request_metrics():
+        g.request_start = time.perf_counter()
+        start_request_timings()
+
+    @app.after_request
+    def record_request_metrics(response):
+        timings = pop_request_timings()
+        reused_paragraphs, total_paragraphs = pop_request_paragraph_reuse()
+        endpoint = request.endpoint or 'unknown'
+        REQUEST_SECONDS.observe(time.perf_counter() - g.get('request_start', time.perf_counter()),
+                                endpoint=endpoint)
+        REQUESTS_TOTAL.inc(endpoint=endpoint, status=str(response.status_code))
+        if response.content_length:
+            BYTES_PROCESSED.inc(response.content_length, direction='out')
+        if config.SERVER_TIMING_ENABLED and timings:
+            response.headers['Server-Timing'] = server_timing_header(timings)
+        if total_paragraphs:
+            # Tỷ lệ đoạn văn được dùng lại từ bộ nhớ đệm đoạn văn trong yêu cầu này
+            response.headers['X-Paragraph-Reuse'] = paragraph_reuse_header(reused_paragraphs, total_paragraphs)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return app.response_class(render_metrics(), mimetype='text/plain; version=0.0.4')
 
 
 def register_routes(app):
+    if config.METRICS_ENABLED:
+        register_metrics(app)
+
     @app.route('/')
     def index():
         return render_template('index.html')
 
     @app.route('/upload', methods=['POST'])
+    @admission_controlled
     def upload_file():
         if 'file' not in request.files:
             flash('No file part')
@@ -32,53 +162,78 @@ def register_routes(app):
         
         if file and allowed_file(file.filename, config.ALLOWED_EXTENSIONS):
             filename = secure_filename(file.filename)
-            filepath = os.path.join(config.UPLOAD_FOLDER, filename)
-            file.save(filepath)
+            upload_buffer, file_digest = read_upload(file)
             
             # Get formatting options from form
-            formatting_options = {
-                'citation_style': request.form.get('citation_style', 'apa'),
-                'font_family': request.form.get('font_family', 'times'),
-                'font_size': request.form.get('font_size', '12'),
-                'line_spacing': request.form.get('line_spacing', '2.0'),
-                'margin': request.form.get('margin', 'normal'),
-                'paragraph_spacing': request.form.get('paragraph_spacing', 'after'),
-                'page_numbers': 'page_numbers' in request.form,
-                'title_page': 'title_page' in request.form,
-                'table_of_contents': 'table_of_contents' in request.form,
-                'bibliography': 'bibliography' in request.form
-            }
+            formatting_options = get_formatting_options(request.form)
             
             # In ra các tùy chọn định dạng để kiểm tra
             print(f"Các tùy chọn định dạng được chọn: {formatting_options}")
             
-            # Trích xuất văn bản từ tài liệu
-            content = extract_text_from_doc(filepath)
-            if not content:
-                flash('Lỗi đọc nội dung tài liệu')
-                return redirect(url_for('index'))
+            # Tra cứu bộ nhớ đệm theo nội dung tệp và tùy chọn định dạng
+            cache_key = None
+            cached_document = None
+            if config.CACHE_ENABLED:
+                cache_key = result_cache.make_key('upload', file_digest, filename, formatting_options,
+                                                  pipeline_fingerprint(formatting_options['language']))
+                cached_document = result_cache.get(cache_key)
             
-            # Tạo tài liệu được định dạng
-            # Sử dụng tempfile.mkdtemp để tạo thư mục tạm
-            try:
-                temp_dir = tempfile.mkdtemp()
-                app.config['TEMP_FOLDER'] = temp_dir  # Lưu đường dẫn vào config để dễ truy cập
-                
-                output_filename = f"formatted_{filename.rsplit('.', 1)[0]}.docx"
-                output_path = os.path.join(temp_dir, output_filename)
-                
-                print(f"Tạo file tại đường dẫn: {output_path}")
-                formatted_file_path = create_formatted_document(content, formatting_options, output_path)
+            content = None
+            if cached_document is None:
+                # Trích xuất văn bản từ tài liệu (trực tiếp từ bộ nhớ)
+                with upload_buffer:
+                    content = extract_text_from_doc(upload_buffer, filename)
+                if not content:
+                    flash('Lỗi đọc nội dung tài liệu')
+                    return redirect(url_for('index'))
+            else:
+                upload_buffer.close()
+            
+            output_filename = f"formatted_{filename.rsplit('.', 1)[0]}.docx"
+            
+            # Chế độ bất đồng bộ: trả về mã công việc ngay, worker pool sẽ tạo tài liệu
+            if is_async_request():
+                if cached_document is not None:
+                    job_id = job_manager.create_completed(cached_document, output_filename)
+                else:
+                    on_success = None
+                    if cache_key:
+                        def on_success(output_path, cache_key=cache_key):
+                            with open(output_path, 'rb') as f:
+                                result_cache.set(cache_key, f.read())
+                    # Công việc chạy nền giữ token của yêu cầu cho đến khi kết thúc
+                    ticket = g.get('admission_ticket')
+                    job_id = job_manager.submit(content, formatting_options, output_filename, on_success,
+                                                on_finish=ticket.release if ticket else None)
+                    if ticket:
+                        ticket.detach()
                 
-                if formatted_file_path and os.path.exists(formatted_file_path):
-                    # Lưu thông tin file vào session để có thể tải xuống sau
-                    session['last_formatted_file'] = formatted_file_path
-                    session['last_formatted_filename'] = output_filename
-                    
-                    return redirect(url_for('download_file', filename=os.path.basename(formatted_file_path)))
+                return jsonify({
+                    'job_id': job_id,
+                    'status_url': url_for('job_status', job_id=job_id),
+                    'download_url': url_for('job_download', job_id=job_id)
+                }), 202
+            
+            # Tạo tài liệu được định dạng trong bộ nhớ và gửi trực tiếp cho client
+            try:
+                if cached_document is not None:
+                    # Trúng bộ nhớ đệm: bỏ qua NLP và tạo DOCX
+                    print(f"Dùng kết quả từ bộ nhớ đệm cho {filename}")
+                    output_buffer = io.BytesIO(cached_document)
                 else:
-                    flash('Lỗi định dạng tài liệu')
-                    return redirect(url_for('index'))
+                    with track_degraded() as degraded:
+                        output_buffer = create_formatted_document(content, formatting_options, io.BytesIO())
+                    if output_buffer is None:
+                        flash('Lỗi định dạng tài liệu')
+                        return redirect(url_for('index'))
+                    # Kết quả của nhánh dự phòng (lỗi tạm thời, mô hình chưa sẵn sàng) không được lưu
+                    if cache_key and not degraded:
+                        result_cache.set(cache_key, output_buffer.getvalue())
+                
+                output_buffer.seek(0)
+                return time_until_close(send_file(output_buffer, as_attachment=True,
+                                                  download_name=output_filename, mimetype=DOCX_MIMETYPE),
+                                        'send')
             except Exception as e:
                 print(f"Lỗi trong quá trình xử lý: {str(e)}")
                 flash(f'Lỗi xử lý: {str(e)}')
@@ -88,6 +243,7 @@ def register_routes(app):
             return redirect(url_for('index'))
 
     @app.route('/analyze', methods=['POST'])
+    @admission_controlled
     def analyze_document():
         if 'file' not in request.files:
             return jsonify({'error': 'No file part'}), 400
@@ -99,55 +255,214 @@ def register_routes(app):
         
         if file and allowed_file(file.filename, config.ALLOWED_EXTENSIONS):
             filename = secure_filename(file.filename)
-            filepath = os.path.join(config.UPLOAD_FOLDER, filename)
-            file.save(filepath)
+            language = request.form.get('language', 'auto')
+            if language != 'auto':
+                try:
+                    model_registry.resolve(language)
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+            upload_buffer, file_digest = read_upload(file)
+            
+            # Tra cứu bộ nhớ đệm theo nội dung tệp và ngôn ngữ
+            cache_key = None
+            if config.CACHE_ENABLED:
+                cache_key = result_cache.make_key('analyze', file_digest, filename, {'language': language},
+                                                  pipeline_fingerprint(language))
+                cached_analysis = result_cache.get(cache_key)
+                if cached_analysis is not None:
+                    upload_buffer.close()
+                    return app.response_class(cached_analysis, mimetype='application/json')
             
-            # Trích xuất văn bản từ tài liệu
-            content = extract_text_from_doc(filepath)
+            # Trích xuất văn bản từ tài liệu (trực tiếp từ bộ nhớ)
+            with upload_buffer:
+                content = extract_text_from_doc(upload_buffer, filename)
             if not content:
                 return jsonify({'error': 'Lỗi đọc nội dung tài liệu'}), 400
             
             # Phân tích văn bản
-            analysis = analyze_text(content)
+            with track_degraded() as degraded:
+                analysis = analyze_text(content, language=language)
             
-            return jsonify(analysis)
+            response = jsonify(analysis)
+            if cache_key and not degraded:
+                result_cache.set(cache_key, response.get_data())
+            return response
         else:
             return jsonify({'error': 'Loại tệp không được phép'}), 400
 
-    @app.route('/download/<filename>')
-    def download_file(filename):
-        # Ưu tiên kiểm tra đường dẫn trong session nếu có
-        if 'last_formatted_file' in session and session.get('last_formatted_filename') == filename:
-            file_path = session.get('last_formatted_file')
-            if os.path.exists(file_path):
-                try:
-                    return send_file(file_path, as_attachment=True)
-                except Exception as e:
-                    print(f"Lỗi khi tải file từ session: {str(e)}")
-                    # Tiếp tục kiểm tra các vị trí khác
+    @app.route('/documents', methods=['POST'])
+    @admission_controlled
+    def create_document():
+        # Tải lên một lần: trích xuất và phân tích cấu trúc, trả về mã tài liệu để phân tích/định dạng nhiều lần
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file part'}), 400
         
-        # Kiểm tra trong thư mục tạm thời
-        temp_dir = app.config.get('TEMP_FOLDER', config.TEMP_FOLDER)
-        file_path = os.path.join(temp_dir, filename)
+        file = request.files['file']
         
-        # Kiểm tra nếu file tồn tại
-        if os.path.exists(file_path):
-            try:
-                return send_file(file_path, as_attachment=True)
-            except Exception as e:
-                print(f"Lỗi khi tải file từ thư mục tạm: {str(e)}")
-                flash(f"Lỗi khi tải file: {str(e)}")
-                return redirect(url_for('index'))
-        else:
-            print(f"Không tìm thấy file: {file_path}")
-            # Trường hợp file không tồn tại, thử tìm trong thư mục uploads
-            upload_path = os.path.join(config.UPLOAD_FOLDER, filename)
-            if os.path.exists(upload_path):
-                try:
-                    return send_file(upload_path, as_attachment=True)
-                except Exception as e:
-                    flash(f"Lỗi khi tải file: {str(e)}")
-                    return redirect(url_for('index'))
-            else:
-                flash(f"Không tìm thấy file để tải xuống: {filename}")
-                return redirect(url_for('index')) 
\ No newline at end of file
+        if file.filename == '':
+            return jsonify({'error': 'No selected file'}), 400
+        
+        if not allowed_file(file.filename, config.ALLOWED_EXTENSIONS):
+            return jsonify({'error': 'Loại tệp không được phép'}), 400
+        
+        filename = secure_filename(file.filename)
+        upload_buffer, _ = read_upload(file)
+        try:
+            with upload_buffer:
+                document_id = document_store.create(upload_buffer, filename,
+                                                    request.form.get('engine', config.DEFAULT_STRUCTURE_ENGINE),
+                                                    request.form.get('language', 'auto'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if document_id is None:
+            return jsonify({'error': 'Lỗi đọc nội dung tài liệu'}), 400
+        
+        response = document_store.get(document_id) or {'document_id': document_id}
+        response['expires_in'] = config.STORAGE_TTL_SECONDS
+        response['analysis_url'] = url_for('document_analysis', document_id=document_id)
+        response['format_url'] = url_for('document_format', document_id=document_id)
+        return jsonify(response), 201
+
+    @app.route('/documents/stats')
+    def document_stats():
+        return jsonify(document_store.stats())
+
+    @app.route('/documents/<document_id>', methods=['GET', 'DELETE'])
+    def document_info(document_id):
+        if request.method == 'DELETE':
+            document_store.remove(document_id)
+            return '', 204
+        info = document_store.get(document_id)
+        if info is None:
+            return jsonify({'error': 'Không tìm thấy tài liệu hoặc tài liệu đã hết hạn'}), 404
+        return jsonify(info)
+
+    @app.route('/documents/<document_id>/analysis')
+    @admission_controlled
+    def document_analysis(document_id):
+        try:
+            analysis = document_store.analysis(document_id, request.args.get('language', 'auto'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if analysis is None:
+            return jsonify({'error': 'Không tìm thấy tài liệu hoặc tài liệu đã hết hạn'}), 404
+        return jsonify(analysis)
+
+    @app.route('/documents/<document_id>/format', methods=['POST'])
+    @admission_controlled
+    def document_format(document_id):
+        info = document_store.get(document_id)
+        if info is None:
+            return jsonify({'error': 'Không tìm thấy tài liệu hoặc tài liệu đã hết hạn'}), 404
+        
+        formatting_options = get_formatting_options(request.form)
+        try:
+            output_buffer = document_store.format(document_id, formatting_options, io.BytesIO())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if output_buffer is None:
+            return jsonify({'error': 'Lỗi định dạng tài liệu'}), 500
+        
+        output_buffer.seek(0)
+        output_filename = f"formatted_{info['filename'].rsplit('.', 1)[0]}.docx"
+        return time_until_close(send_file(output_buffer, as_attachment=True, download_name=output_filename,
+                                          mimetype=DOCX_MIMETYPE), 'send')
+
+    @app.route('/batch', methods=['POST'])
+    def batch_format():
+        uploaded_files = request.files.getlist('files') + request.files.getlist('file')
+        if not uploaded_files:
+            return jsonify({'error': 'No file part'}), 400
+        
+        formatting_options = get_formatting_options(request.form)
+        try:
+            batch_size = int(request.form.get('batch_size', config.BATCH_NLP_BATCH_SIZE))
+            n_process = int(request.form.get('n_process', config.BATCH_NLP_N_PROCESS))
+        except ValueError:
+            return jsonify({'error': 'batch_size và n_process phải là số nguyên'}), 400
+        
+        # Bộ kiểm soát tải tính chi phí theo dung lượng sau khi giải nén (trong format_batch)
+        admit = admission_controller.admit if config.ADMISSION_ENABLED else None
+        try:
+            archive = format_batch(uploaded_files, formatting_options,
+                                   batch_size=max(1, batch_size), n_process=max(1, n_process), admit=admit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except AdmissionRejected as e:
+            return admission_rejected_response(e)
+        
+        return send_file(archive, as_attachment=True, download_name='formatted_documents.zip',
+                         mimetype='application/zip')
+
+    @app.route('/jobs/<job_id>')
+    def job_status(job_id):
+        job = job_manager.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Không tìm thấy công việc'}), 404
+        
+        response = {
+            'job_id': job['job_id'],
+            'status': job['status'],
+            'created_at': job['created_at'],
+            'finished_at': job['finished_at'],
+            'error': job['error']
+        }
+        if job['status'] == JOB_FINISHED and job['file_id']:
+            response['download_url'] = url_for('job_download', job_id=job_id)
+        return jsonify(response)
+
+    @app.route('/jobs/<job_id>/download')
+    def job_download(job_id):
+        job = job_manager.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Không tìm thấy công việc'}), 404
+        if job['status'] != JOB_FINISHED:
+            return jsonify({'job_id': job_id, 'status': job['status'], 'error': job['error']}), 409
+        if job['output_path'] is None:
+            return jsonify({'job_id': job_id, 'status': job['status'],
+                            'error': 'Kết quả đã hết hạn'}), 410
+        
+        return send_file(job['output_path'], as_attachment=True,
+                         download_name=job['output_filename'], mimetype=DOCX_MIMETYPE)
+
+    @app.route('/ready')
+    def ready():
+        # Endpoint kiểm tra sẵn sàng: chỉ trả về 200 khi mô hình đã được làm nóng
+        # (với MODEL_WARM_UP='lazy' hoặc khi không làm nóng lúc khởi động, mô hình được tải
+        # ở yêu cầu đầu tiên nên luôn sẵn sàng)
+        status = model_status()
+        return jsonify(status), (200 if status['warm'] or status['warm_up'] == 'lazy' else 503)
+
+    @app.route('/cache/stats')
+    def cache_stats():
+        return jsonify(result_cache.stats())
+
+    @app.route('/admission/stats')
+    def admission_stats():
+        return jsonify(admission_controller.stats())
+
+    @app.route('/paragraphs/stats')
+    def paragraph_cache_stats():
+        return jsonify(paragraph_cache.stats())
+
+    @app.route('/keywords/stats')
+    def keyword_stats():
+        return jsonify(idf_index.stats())
+
+    @app.route('/models/stats')
+    def model_stats():
+        return jsonify(model_registry.stats())
+
+    @app.route('/storage/stats')
+    def storage_stats():
+        return jsonify(storage.stats())
+
+    @app.route('/download/<file_id>')
+    def download_file(file_id):
+        # Một lần tra cứu chỉ mục của bộ lưu trữ, không dò tìm trên hệ thống tệp
+        stored = storage.get(file_id)
+        if stored is None or stored['kind'] != 'output':
+            flash('Không tìm thấy file để tải xuống')
+            return redirect(url_for('index'))
+        return send_file(stored['path'], as_attachment=True, download_name=stored['filename'],
+                         mimetype=DOCX_MIMETYPE if stored['filename'].endswith('.docx') else None)
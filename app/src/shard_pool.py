@@ -0,0 +1,48 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class ShardPool:
+    """Process pool dùng chung, ví dụ để xử lý song song các phân đoạn của một tài liệu lớn.
+
+    Pool được tạo khi cần lần đầu trong mỗi tiến trình (không dùng lại pool của
+    tiến trình cha sau khi fork). initializer chạy một lần trong mỗi worker, ví
+    dụ để làm nóng mô hình. map() trả về kết quả theo đúng thứ tự phân đoạn nên
+    việc gộp kết quả là xác định.
+    """
+
+    def __init__(self, max_workers, initializer=None, enabled=True):
+        self.max_workers = max_workers
+        self.initializer = initializer
+        self.enabled = enabled
+
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=self.initializer)
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def map(self, func, items):
+        """Chạy func trên từng phần tử trong pool, trả về danh sách kết quả theo thứ tự."""
+        executor = self._get_executor()
+        try:
+            return list(executor.map(func, items))
+        except BrokenProcessPool:
+            # Một worker bị dừng đột ngột: lần gọi sau sẽ tạo pool mới
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            raise
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._executor_pid == os.getpid():
+            executor.shutdown(wait=False, cancel_futures=True)
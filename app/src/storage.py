@@ -0,0 +1,315 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: chỉ khóa giữa các luồng của cùng tiến trình
+    fcntl = None
+
+from app.src import config
+from app.src.metrics import STORAGE_BYTES, STORAGE_EVICTIONS
+
+# Mã tệp là uuid4 dạng hex; mọi mã khác (ví dụ từ URL) bị từ chối trước khi chạm vào hệ thống tệp
+FILE_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+METADATA_SUFFIX = '.json'
+# Tổng dung lượng các tệp đã commit và khóa tệp, dùng chung giữa các tiến trình
+USAGE_FILENAME = '.usage'
+LOCK_FILENAME = '.lock'
+
+
+class StorageManager:
+    """Lưu trữ có giới hạn cho tệp tải lên và tệp kết quả, dùng chung giữa các tiến trình.
+
+    Mỗi tệp được lưu dưới một mã ngẫu nhiên (không đoán được) trong một thư mục
+    phẳng, kèm một tệp metadata JSON (<mã>.json). Việc tra cứu chỉ cần đọc tệp
+    metadata, nên mọi worker gunicorn đều tìm được tệp do worker khác lưu; thời
+    điểm truy cập gần nhất là mtime của tệp metadata. Tổng dung lượng được giữ
+    trong tệp .usage và chỉ được cập nhật khi giữ khóa tệp .lock, nên giới hạn
+    dung lượng áp dụng cho toàn bộ thư mục thay vì cho từng tiến trình. Một
+    luồng nền định kỳ xóa các tệp hết hạn (TTL), các tệp ít được dùng nhất khi
+    tổng dung lượng vượt giới hạn, tính lại tổng dung lượng từ metadata và xóa
+    các tệp không có metadata khi quá TTL.
+    """
+
+    def __init__(self, folder, max_bytes, ttl_seconds, sweep_interval):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sweep_interval = sweep_interval
+
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self._sweeper_pid = None
+        # Số liệu của tiến trình hiện tại
+        self._stats = {'stored': 0, 'ttl_evictions': 0, 'size_evictions': 0, 'orphans_removed': 0}
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    def _path(self, file_id):
+        return os.path.join(self.folder, file_id)
+
+    def _metadata_path(self, file_id):
+        return os.path.join(self.folder, file_id + METADATA_SUFFIX)
+
+    @contextmanager
+    def _locked(self):
+        """Khóa thư mục lưu trữ giữa các luồng và giữa các tiến trình."""
+        with self._lock:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(os.path.join(self.folder, LOCK_FILENAME), 'w') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield
+
+    def _write_atomic(self, path, text):
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temp_path, path)
+
+    def _read_metadata(self, file_id):
+        if not FILE_ID_PATTERN.fullmatch(file_id or ''):
+            return None
+        try:
+            with open(self._metadata_path(file_id), encoding='utf-8') as f:
+                entry = json.load(f)
+            entry['last_access'] = os.stat(self._metadata_path(file_id)).st_mtime
+        except (OSError, ValueError):
+            return None
+        entry['path'] = self._path(file_id)
+        entry.setdefault('metadata', {})
+        return entry
+
+    def _write_metadata(self, entry):
+        fields = ('id', 'filename', 'kind', 'size', 'created_at', 'committed', 'metadata')
+        self._write_atomic(self._metadata_path(entry['id']), json.dumps({name: entry[name] for name in fields}))
+
+    def _read_usage(self):
+        # Gọi khi đang giữ khóa
+        try:
+            with open(os.path.join(self.folder, USAGE_FILENAME)) as f:
+                return int(f.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_usage(self, total):
+        # Gọi khi đang giữ khóa
+        total = max(0, total)
+        self._write_atomic(os.path.join(self.folder, USAGE_FILENAME), str(total))
+        STORAGE_BYTES.set(total)
+
+    def _entries(self):
+        """Metadata của mọi tệp trong thư mục (quét toàn bộ thư mục, chỉ dùng khi dọn dẹp)."""
+        entries = []
+        try:
+            with os.scandir(self.folder) as it:
+                names = [entry.name for entry in it if entry.name.endswith(METADATA_SUFFIX)]
+        except OSError:
+            return entries
+        for name in names:
+            entry = self._read_metadata(name[:-len(METADATA_SUFFIX)])
+            if entry is not None:
+                entries.append(entry)
+        return entries
+
+    def reserve(self, filename, kind, metadata=None):
+        """Cấp mã và đường dẫn cho một tệp sẽ được ghi sau (ví dụ bởi worker); trả về (file_id, path).
+
+        Tệp chỉ được tính vào giới hạn dung lượng sau khi gọi commit(). metadata
+        là dict (tuần tự hóa được sang JSON) do bên gọi tự quản lý.
+        """
+        self._ensure_sweeper()
+        file_id = uuid.uuid4().hex
+        self._write_metadata({
+            'id': file_id,
+            'filename': filename,
+            'kind': kind,
+            'size': 0,
+            'created_at': time.time(),
+            'committed': False,
+            'metadata': metadata or {},
+        })
+        return file_id, self._path(file_id)
+
+    def commit(self, file_id):
+        """Ghi nhận kích thước của tệp đã được ghi vào đường dẫn đã cấp và áp dụng giới hạn dung lượng."""
+        try:
+            size = os.path.getsize(self._path(file_id))
+        except OSError:
+            self.remove(file_id)
+            return None
+        with self._locked():
+            entry = self._read_metadata(file_id)
+            if entry is None:
+                return None
+            if not entry['committed']:
+                entry['size'] = size
+                entry['committed'] = True
+                self._write_metadata(entry)
+                self._write_usage(self._read_usage() + size)
+                self._stats['stored'] += 1
+        self._evict_over_size()
+        return file_id
+
+    def store(self, data, filename, kind, metadata=None):
+        """Lưu dữ liệu (bytes hoặc đối tượng file) và trả về mã tệp."""
+        file_id, path = self.reserve(filename, kind, metadata)
+        try:
+            with open(path, 'wb') as f:
+                if isinstance(data, (bytes, bytearray, memoryview)):
+                    f.write(data)
+                else:
+                    shutil.copyfileobj(data, f)
+        except OSError:
+            self.remove(file_id)
+            raise
+        return self.commit(file_id)
+
+    def get(self, file_id):
+        """Thông tin tệp (dict) theo mã, hoặc None nếu không tồn tại hoặc đã hết hạn."""
+        entry = self._read_metadata(file_id)
+        if entry is None or not entry['committed']:
+            return None
+        now = time.time()
+        if now - entry['created_at'] > self.ttl_seconds:
+            self._remove(file_id, 'ttl')
+            return None
+        try:
+            # mtime của metadata là thời điểm truy cập gần nhất (dùng cho LRU)
+            os.utime(self._metadata_path(file_id), (now, now))
+        except OSError:
+            return None
+        entry['last_access'] = now
+        return entry
+
+    def update_metadata(self, file_id, **fields):
+        """Cập nhật metadata của tệp (mọi tiến trình đọc được qua get()); trả về False nếu tệp không còn."""
+        with self._locked():
+            entry = self._read_metadata(file_id)
+            if entry is None:
+                return False
+            entry['metadata'].update(fields)
+            self._write_metadata(entry)
+        return True
+
+    def remove(self, file_id):
+        """Xóa tệp và metadata tương ứng."""
+        self._remove(file_id, None)
+
+    def _remove(self, file_id, reason):
+        if not FILE_ID_PATTERN.fullmatch(file_id or ''):
+            return
+        with self._locked():
+            entry = self._read_metadata(file_id)
+            try:
+                # Chỉ tiến trình xóa được metadata mới trừ dung lượng (tránh trừ hai lần)
+                os.remove(self._metadata_path(file_id))
+            except OSError:
+                return
+            if entry is not None and entry['committed']:
+                self._write_usage(self._read_usage() - entry['size'])
+            if reason:
+                self._stats[f'{reason}_evictions'] += 1
+        if reason:
+            STORAGE_EVICTIONS.inc(reason=reason)
+        try:
+            os.remove(self._path(file_id))
+        except OSError:
+            pass
+
+    def _evict_over_size(self):
+        """Xóa các tệp ít được dùng nhất cho đến khi tổng dung lượng nằm trong giới hạn."""
+        with self._locked():
+            over = self._read_usage() - self.max_bytes
+        if over <= 0:
+            return
+        committed = sorted((entry['last_access'], entry['id'], entry['size'])
+                           for entry in self._entries() if entry['committed'])
+        for _, file_id, size in committed:
+            if over <= 0:
+                break
+            self._remove(file_id, 'size')
+            over -= size
+
+    def evict(self):
+        """Một lượt dọn dẹp: tệp hết hạn, tệp vượt giới hạn dung lượng và tệp không có metadata."""
+        now = time.time()
+        for entry in self._entries():
+            if now - entry['created_at'] > self.ttl_seconds:
+                self._remove(entry['id'], 'ttl')
+        with self._locked():
+            # Tính lại tổng dung lượng (sửa sai lệch nếu một tiến trình dừng giữa chừng)
+            self._write_usage(sum(entry['size'] for entry in self._entries() if entry['committed']))
+        self._evict_over_size()
+        self._remove_orphans(now)
+
+    def _remove_orphans(self, now):
+        try:
+            with os.scandir(self.folder) as it:
+                candidates = [entry for entry in it if entry.is_file()]
+        except OSError:
+            return
+        removed = 0
+        for entry in candidates:
+            if entry.name in (USAGE_FILENAME, LOCK_FILENAME) or entry.name.endswith(METADATA_SUFFIX):
+                continue
+            if FILE_ID_PATTERN.fullmatch(entry.name) and os.path.exists(self._metadata_path(entry.name)):
+                continue
+            try:
+                if now - entry.stat().st_mtime > self.ttl_seconds:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                continue
+        if removed:
+            with self._lock:
+                self._stats['orphans_removed'] += removed
+
+    def stats(self):
+        """Số tệp, tổng dung lượng (của cả thư mục) và số lần dọn dẹp (của tiến trình hiện tại)."""
+        entries = self._entries()
+        with self._locked():
+            total_bytes = self._read_usage()
+            stats = dict(self._stats)
+        stats['files'] = sum(1 for entry in entries if entry['committed'])
+        stats['pending'] = len(entries) - stats['files']
+        stats['total_bytes'] = total_bytes
+        stats['max_bytes'] = self.max_bytes
+        stats['ttl_seconds'] = self.ttl_seconds
+        return stats
+
+    def _ensure_sweeper(self):
+        # Luồng nền được khởi động khi dùng lần đầu trong mỗi tiến trình
+        # (luồng không tồn tại sau khi gunicorn fork worker)
+        with self._lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            os.makedirs(self.folder, exist_ok=True)
+            self._sweeper_pid = os.getpid()
+            self._sweeper = threading.Thread(target=self._sweep_loop, name='storage-sweeper', daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.evict()
+            except Exception as e:
+                print(f"Lỗi khi dọn dẹp bộ lưu trữ: {str(e)}")
+
+
+storage = StorageManager(
+    folder=config.STORAGE_FOLDER,
+    max_bytes=config.STORAGE_MAX_BYTES,
+    ttl_seconds=config.STORAGE_TTL_SECONDS,
+    sweep_interval=config.STORAGE_SWEEP_INTERVAL_SECONDS,
+)
@@ -0,0 +1,79 @@
+import re
+
+# Ranh giới đoạn văn: một hoặc nhiều dòng trống
+PARAGRAPH_BOUNDARY = re.compile(r'\n[ \t]*\n')
+
+
+def iter_text_chunks(content, max_chars):
+    """Chia văn bản thành các khối theo ranh giới đoạn văn, mỗi khối không quá max_chars ký tự.
+
+    Trả về generator các tuple (offset, chunk) trong đó offset là vị trí bắt đầu
+    của khối trong văn bản gốc. Các đoạn văn dài hơn max_chars được chia tiếp
+    theo dòng, và cuối cùng là cắt cứng nếu một dòng vẫn quá dài.
+    """
+    if len(content) <= max_chars:
+        if content:
+            yield 0, content
+        return
+
+    paragraph_ends = [boundary.end() for boundary in PARAGRAPH_BOUNDARY.finditer(content)]
+    paragraph_ends.append(len(content))
+
+    chunk_start = 0
+    chunk_end = 0
+    for paragraph_end in paragraph_ends:
+        if paragraph_end - chunk_start > max_chars:
+            # Khối hiện tại đã đầy: trả về trước khi thêm đoạn văn mới
+            if chunk_end > chunk_start:
+                yield chunk_start, content[chunk_start:chunk_end]
+                chunk_start = chunk_end
+            if paragraph_end - chunk_start > max_chars:
+                # Một đoạn văn đơn lẻ quá dài: chia tiếp theo dòng
+                yield from _split_long_block(content, chunk_start, paragraph_end, max_chars)
+                chunk_start = paragraph_end
+        chunk_end = paragraph_end
+
+    if chunk_end > chunk_start:
+        yield chunk_start, content[chunk_start:chunk_end]
+
+
+def iter_paragraphs(content, max_chars):
+    """Chia văn bản thành từng đoạn văn, mỗi phần không quá max_chars ký tự.
+
+    Trả về generator các tuple (offset, paragraph); ghép các phần theo thứ tự
+    được lại đúng văn bản gốc. Các dòng trống phân cách thuộc về đầu đoạn văn
+    phía sau (như khi spaCy phân tích cả văn bản, khoảng trắng được gộp vào câu
+    tiếp theo), nên thêm đoạn văn vào cuối không làm thay đổi các đoạn trước.
+    Đoạn văn dài hơn max_chars được chia như trong iter_text_chunks.
+    """
+    start = 0
+    # Khoảng trắng ở cuối văn bản thuộc về đoạn văn cuối cùng
+    text_end = len(content.rstrip())
+    ends = [boundary.start() for boundary in PARAGRAPH_BOUNDARY.finditer(content) if boundary.start() < text_end]
+    ends.append(len(content))
+    for end in ends:
+        if end <= start or (end < len(content) and not content[start:end].strip()):
+            # Chỉ có dòng trống: gộp vào đoạn văn phía sau
+            continue
+        if end - start > max_chars:
+            yield from _split_long_block(content, start, end, max_chars)
+        else:
+            yield start, content[start:end]
+        start = end
+
+
+def _split_long_block(content, start, end, max_chars):
+    """Chia một khối dài theo ký tự xuống dòng, cắt cứng nếu cần."""
+    while end - start > max_chars:
+        split_at = content.rfind('\n', start, start + max_chars)
+        if split_at <= start:
+            # Thử cắt tại khoảng trắng để không cắt ngang từ
+            split_at = content.rfind(' ', start, start + max_chars)
+        if split_at <= start:
+            split_at = start + max_chars
+        else:
+            split_at += 1
+        yield start, content[start:split_at]
+        start = split_at
+    if start < end:
+        yield start, content[start:end]
@@ -0,0 +1,468 @@
+import io
+import re
+import struct
+import zipfile
+from xml.parsers import expat
+
+from app.src import config
+
+# Trích xuất văn bản theo luồng, không dựng cây đối tượng của python-docx.
+# Với .docx, các phần XML được đọc thẳng từ ZIP và phân tích dần bằng expat;
+# với .doc (Word 97-2003), tệp OLE2 và bảng đoạn (piece table) được đọc bằng
+# Python thuần. Cả hai đều trả về generator các đoạn văn theo thứ tự.
+
+W_NAMESPACE = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+MC_NAMESPACE = 'http://schemas.openxmlformats.org/markup-compatibility/2006'
+
+# Số byte đọc từ ZIP cho mỗi lần đưa vào parser
+XML_READ_BLOCK_SIZE = 64 * 1024
+
+# Phần nội dung chính và các phần phụ của gói .docx
+DOCX_DOCUMENT_PART = 'word/document.xml'
+DOCX_EXTRA_PART_PATTERNS = {
+    'header': re.compile(r'word/header(\d*)\.xml$'),
+    'footer': re.compile(r'word/footer(\d*)\.xml$'),
+    'footnotes': re.compile(r'word/footnotes()\.xml$'),
+    'endnotes': re.compile(r'word/endnotes()\.xml$'),
+}
+
+
+class ExtractionError(ValueError):
+    """Không thể trích xuất văn bản từ tệp (tệp hỏng, bị mã hóa hoặc không đúng định dạng)."""
+
+
+class _ParagraphCollector:
+    """Handler cho expat: gom văn bản của từng đoạn <w:p> giống paragraph.text của python-docx.
+
+    Chỉ các phần tử nội dung là con trực tiếp của <w:r> được tính (w:t, w:tab,
+    w:br, ...), nên định nghĩa tab stop trong <w:pPr> hay văn bản đã xóa
+    (<w:delText>) bị bỏ qua. Nội dung trong <mc:Fallback> (bản sao của hộp
+    văn bản) cũng bị bỏ qua để không lặp lại.
+    """
+
+    def __init__(self):
+        self.completed = []
+        self._paragraphs = []
+        self._path = []
+        self._in_text = False
+        self._fallback_depth = 0
+
+    def start(self, name, attributes):
+        namespace, _, local = name.rpartition(' ')
+        parent = self._path[-1] if self._path else None
+        self._path.append(local)
+
+        if self._fallback_depth or (namespace == MC_NAMESPACE and local == 'Fallback'):
+            self._fallback_depth += 1
+            return
+        if namespace != W_NAMESPACE:
+            return
+
+        if local == 'p':
+            self._paragraphs.append([])
+        elif not self._paragraphs or parent != 'r':
+            return
+        elif local == 't':
+            self._in_text = True
+        elif local in ('tab', 'ptab'):
+            self._paragraphs[-1].append('\t')
+        elif local == 'cr':
+            self._paragraphs[-1].append('\n')
+        elif local == 'br':
+            # Chỉ ngắt dòng (textWrapping) được chuyển thành xuống dòng; ngắt trang/cột bị bỏ qua
+            if attributes.get(f'{W_NAMESPACE} type', 'textWrapping') == 'textWrapping':
+                self._paragraphs[-1].append('\n')
+        elif local == 'noBreakHyphen':
+            self._paragraphs[-1].append('-')
+
+    def end(self, name):
+        namespace, _, local = name.rpartition(' ')
+        self._path.pop()
+
+        if self._fallback_depth:
+            self._fallback_depth -= 1
+            return
+        if namespace != W_NAMESPACE:
+            return
+
+        if local == 't':
+            self._in_text = False
+        elif local == 'p' and self._paragraphs:
+            self.completed.append(''.join(self._paragraphs.pop()))
+
+    def characters(self, data):
+        if self._in_text and not self._fallback_depth:
+            self._paragraphs[-1].append(data)
+
+
+def _reject_doctype(*args):
+    raise ExtractionError('Tài liệu chứa khai báo DOCTYPE không được hỗ trợ')
+
+
+def iter_xml_paragraphs(stream):
+    """Phân tích dần một phần XML của WordprocessingML, trả về generator văn bản các đoạn <w:p>."""
+    collector = _ParagraphCollector()
+    parser = expat.ParserCreate(namespace_separator=' ')
+    parser.buffer_text = True
+    parser.StartElementHandler = collector.start
+    parser.EndElementHandler = collector.end
+    parser.CharacterDataHandler = collector.characters
+    parser.StartDoctypeDeclHandler = _reject_doctype
+
+    try:
+        while True:
+            block = stream.read(XML_READ_BLOCK_SIZE)
+            parser.Parse(block, not block)
+            if collector.completed:
+                yield from collector.completed
+                collector.completed = []
+            if not block:
+                break
+    except expat.ExpatError as e:
+        raise ExtractionError(f"Lỗi phân tích XML của tài liệu: {str(e)}") from e
+
+
+def _part_order(match):
+    return int(match.group(1) or 0)
+
+
+def _extra_paragraphs(paragraph_groups, deduplicate):
+    """Gộp các đoạn của phần phụ (đầu trang, chân trang, chú thích), bỏ đoạn trống."""
+    paragraphs = (paragraph.strip() for group in paragraph_groups for paragraph in group if paragraph.strip())
+    return dict.fromkeys(paragraphs) if deduplicate else paragraphs
+
+
+def _with_extra_parts(body, extra_parts):
+    """Các đoạn của nội dung chính, sau đó (cách một dòng trống) các đoạn của phần phụ."""
+    yield from body
+    separated = False
+    for paragraph in extra_parts:
+        if not separated:
+            yield ''
+            separated = True
+        yield paragraph
+
+
+def iter_docx_paragraphs(source, extra_parts=None):
+    """Generator các đoạn văn của tệp .docx (đường dẫn hoặc đối tượng file).
+
+    Đoạn văn trong bảng và hộp văn bản được trả về theo thứ tự xuất hiện trong
+    nội dung chính; sau đó là các phần phụ trong extra_parts (mặc định
+    config.EXTRACT_EXTRA_PARTS: đầu trang, chân trang, chú thích cuối trang,
+    chú thích cuối tài liệu). Đầu/chân trang giống nhau giữa các section chỉ
+    xuất hiện một lần.
+    """
+    if extra_parts is None:
+        extra_parts = config.EXTRACT_EXTRA_PARTS
+
+    try:
+        archive = zipfile.ZipFile(source)
+    except zipfile.BadZipFile as e:
+        raise ExtractionError(f"Tệp .docx không hợp lệ: {str(e)}") from e
+
+    with archive:
+        names = archive.namelist()
+        if DOCX_DOCUMENT_PART not in names:
+            raise ExtractionError('Tệp .docx không có word/document.xml')
+
+        def read_part(name):
+            with archive.open(name) as stream:
+                yield from iter_xml_paragraphs(stream)
+
+        def extra():
+            for part in extra_parts:
+                pattern = DOCX_EXTRA_PART_PATTERNS[part]
+                matches = sorted(filter(None, map(pattern.match, names)), key=_part_order)
+                groups = (read_part(match.group(0)) for match in matches)
+                yield from _extra_paragraphs(groups, deduplicate=part in ('header', 'footer'))
+
+        yield from _with_extra_parts(read_part(DOCX_DOCUMENT_PART), extra())
+
+
+# --- Tệp Word 97-2003 (.doc) ---------------------------------------------------
+
+CFB_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+CFB_HEADER_SIZE = 512
+# Kích thước sector hợp lệ (log2): 512 hoặc 4096 byte; mini sector 64 byte
+CFB_SECTOR_SHIFTS = (9, 12)
+CFB_MINI_SECTOR_SHIFT = 6
+CFB_MAX_REGULAR_SECTOR = 0xFFFFFFFA
+CFB_NO_STREAM = 0xFFFFFFFF
+CFB_DIRECTORY_ENTRY_SIZE = 128
+CFB_STREAM = 2
+CFB_ROOT = 5
+
+WORD_IDENT = 0xA5EC
+WORD_FLAG_ENCRYPTED = 0x0100
+WORD_FLAG_TABLE_1 = 0x0200
+WORD_PIECE_COMPRESSED = 0x40000000
+# Vị trí của fcClx trong FibRgFcLcb97
+WORD_FIB_CLX_INDEX = 33
+
+# Các ký tự điều khiển trong luồng văn bản của Word
+WORD_FIELD_MARKS = re.compile('([\x13\x14\x15])')
+WORD_TEXT_TRANSLATION = str.maketrans({
+    '\r': '\n',    # Kết thúc đoạn
+    '\x0b': '\n',  # Ngắt dòng
+    '\x0c': '\n',  # Ngắt trang/section
+    '\x07': '\n',  # Kết thúc ô/dòng của bảng
+    '\x1e': '-',   # Gạch nối không ngắt
+    '\x1f': None,  # Gạch nối tùy chọn
+    **{chr(code): None for code in range(0x20) if chr(code) not in '\t\n\r\x07\x0b\x0c\x1e\x1f'},
+})
+
+
+class CompoundFile:
+    """Đọc các luồng cấp gốc của tệp OLE2 (Compound File Binary) trong bộ nhớ."""
+
+    def __init__(self, data):
+        if data[:8] != CFB_SIGNATURE:
+            raise ExtractionError('Không phải tệp Word 97-2003 (OLE2)')
+        if len(data) < CFB_HEADER_SIZE:
+            raise ExtractionError('Tệp OLE2 bị cắt cụt')
+        self.data = data
+        if self._u16(0x1E) not in CFB_SECTOR_SHIFTS or self._u16(0x20) != CFB_MINI_SECTOR_SHIFT:
+            raise ExtractionError('Tệp OLE2 bị hỏng (kích thước sector không hợp lệ)')
+        self.sector_size = 1 << self._u16(0x1E)
+        self.mini_sector_size = 1 << self._u16(0x20)
+        self.mini_stream_cutoff = self._u32(0x38)
+
+        # Dữ liệu không đáng tin cậy: mọi lỗi đọc cấu trúc đều là tệp hỏng
+        try:
+            self.fat = self._read_fat()
+            directory = self._read_chain(self._u32(0x30), self.fat, self._sector, self.sector_size)
+            self.entries = self._read_directory(directory)
+
+            root = self.entries['Root Entry']
+            self.mini_fat = self._unpack_u32s(
+                self._read_chain(self._u32(0x3C), self.fat, self._sector, self.sector_size))
+            self.mini_stream = self._read_chain(root[1], self.fat, self._sector, self.sector_size)[:root[2]]
+        except (struct.error, IndexError) as e:
+            raise ExtractionError(f"Tệp OLE2 bị hỏng: {str(e)}") from e
+
+    def _u16(self, offset):
+        return struct.unpack_from('<H', self.data, offset)[0]
+
+    def _u32(self, offset):
+        return struct.unpack_from('<I', self.data, offset)[0]
+
+    @staticmethod
+    def _unpack_u32s(data):
+        return list(struct.unpack(f'<{len(data) // 4}I', data[:len(data) // 4 * 4]))
+
+    def _sector(self, sector_id):
+        offset = (sector_id + 1) * self.sector_size
+        return self.data[offset:offset + self.sector_size]
+
+    def _mini_sector(self, sector_id):
+        offset = sector_id * self.mini_sector_size
+        return self.mini_stream[offset:offset + self.mini_sector_size]
+
+    def _read_fat(self):
+        fat_sector_count = self._u32(0x2C)
+        sector_ids = list(struct.unpack_from('<109I', self.data, 0x4C))
+
+        # Các sector DIFAT bổ sung (tệp lớn hơn khoảng 7MB)
+        difat_sector = self._u32(0x44)
+        for _ in range(self._u32(0x48)):
+            if difat_sector >= CFB_MAX_REGULAR_SECTOR:
+                break
+            entries = self._unpack_u32s(self._sector(difat_sector))
+            sector_ids.extend(entries[:-1])
+            difat_sector = entries[-1]
+
+        fat = []
+        for sector_id in sector_ids[:fat_sector_count]:
+            if sector_id < CFB_MAX_REGULAR_SECTOR:
+                fat.extend(self._unpack_u32s(self._sector(sector_id)))
+        return fat
+
+    @staticmethod
+    def _read_chain(start, fat, read_sector, sector_size):
+        chunks = []
+        sector_id = start
+        visited = set()
+        while sector_id < CFB_MAX_REGULAR_SECTOR:
+            if sector_id in visited or sector_id >= len(fat):
+                raise ExtractionError('Tệp OLE2 bị hỏng (chuỗi sector không hợp lệ)')
+            visited.add(sector_id)
+            chunk = read_sector(sector_id)
+            if len(chunk) < sector_size:
+                raise ExtractionError('Tệp OLE2 bị cắt cụt')
+            chunks.append(chunk)
+            sector_id = fat[sector_id]
+        return b''.join(chunks)
+
+    @staticmethod
+    def _read_directory(directory):
+        """Các mục cấp gốc: tên -> (loại, sector bắt đầu, kích thước)."""
+        def entry(index):
+            offset = index * CFB_DIRECTORY_ENTRY_SIZE
+            if offset + CFB_DIRECTORY_ENTRY_SIZE > len(directory):
+                raise ExtractionError('Tệp OLE2 bị hỏng (thư mục không hợp lệ)')
+            name_length = struct.unpack_from('<H', directory, offset + 0x40)[0]
+            name = directory[offset:offset + max(name_length - 2, 0)].decode('utf-16-le', errors='replace')
+            left, right, child = struct.unpack_from('<3I', directory, offset + 0x44)
+            start, size = struct.unpack_from('<2I', directory, offset + 0x74)
+            return name, directory[offset + 0x42], left, right, child, start, size
+
+        root_name, root_type, _, _, root_child, root_start, root_size = entry(0)
+        if root_type != CFB_ROOT:
+            raise ExtractionError('Tệp OLE2 không có Root Entry')
+        entries = {'Root Entry': (root_type, root_start, root_size)}
+
+        # Duyệt cây đỏ-đen các mục con của thư mục gốc
+        pending = [root_child]
+        visited = set()
+        while pending:
+            index = pending.pop()
+            if index == CFB_NO_STREAM or index in visited:
+                continue
+            visited.add(index)
+            name, entry_type, left, right, _, start, size = entry(index)
+            entries[name] = (entry_type, start, size)
+            pending.extend((left, right))
+        return entries
+
+    def open_stream(self, name):
+        """Nội dung (bytes) của một luồng cấp gốc."""
+        entry = self.entries.get(name)
+        if entry is None or entry[0] != CFB_STREAM:
+            raise ExtractionError(f"Tệp OLE2 không có luồng {name}")
+        _, start, size = entry
+        try:
+            if size < self.mini_stream_cutoff:
+                data = self._read_chain(start, self.mini_fat, self._mini_sector, self.mini_sector_size)
+            else:
+                data = self._read_chain(start, self.fat, self._sector, self.sector_size)
+        except (struct.error, IndexError) as e:
+            raise ExtractionError(f"Tệp OLE2 bị hỏng (luồng {name}): {str(e)}") from e
+        return data[:size]
+
+
+def _read_pieces(word_stream, clx):
+    """Đọc bảng đoạn (piece table) trong CLX, trả về văn bản theo thứ tự vị trí ký tự (CP)."""
+    try:
+        return _read_piece_table(word_stream, clx)
+    except (struct.error, IndexError) as e:
+        raise ExtractionError(f"Bảng đoạn (piece table) của tài liệu Word bị hỏng: {str(e)}") from e
+
+
+def _read_piece_table(word_stream, clx):
+    position = 0
+    # Bỏ qua các Prc (định dạng của đoạn) đứng trước Pcdt
+    while position < len(clx) and clx[position] == 0x01:
+        position += 3 + struct.unpack_from('<H', clx, position + 1)[0]
+    if position + 5 > len(clx) or clx[position] != 0x02:
+        raise ExtractionError('Không đọc được bảng đoạn (piece table) của tài liệu Word')
+
+    plc_length = struct.unpack_from('<I', clx, position + 1)[0]
+    plc = clx[position + 5:position + 5 + plc_length]
+    piece_count = (len(plc) - 4) // 12
+    cps = struct.unpack_from(f'<{piece_count + 1}I', plc, 0)
+
+    pieces = []
+    for index in range(piece_count):
+        fc = struct.unpack_from('<I', plc, (piece_count + 1) * 4 + index * 8 + 2)[0]
+        length = cps[index + 1] - cps[index]
+        if fc & WORD_PIECE_COMPRESSED:
+            offset = (fc & ~WORD_PIECE_COMPRESSED) // 2
+            pieces.append(word_stream[offset:offset + length].decode('cp1252', errors='replace'))
+        else:
+            pieces.append(word_stream[fc:fc + 2 * length].decode('utf-16-le', errors='replace'))
+    return ''.join(pieces)
+
+
+def _strip_field_codes(text):
+    """Bỏ phần lệnh của trường (giữa 0x13 và 0x14), chỉ giữ kết quả hiển thị (giữa 0x14 và 0x15)."""
+    if '\x13' not in text:
+        return text
+    output = []
+    fields = []
+    for piece in WORD_FIELD_MARKS.split(text):
+        if piece == '\x13':
+            fields.append(False)
+        elif piece == '\x14':
+            if fields:
+                fields[-1] = True
+        elif piece == '\x15':
+            if fields:
+                fields.pop()
+        elif all(fields):
+            output.append(piece)
+    return ''.join(output)
+
+
+def _clean_word_text(text):
+    return _strip_field_codes(text).translate(WORD_TEXT_TRANSLATION)
+
+
+def iter_doc_paragraphs(source, extra_parts=None):
+    """Generator các đoạn văn của tệp Word 97-2003 (.doc), đọc bằng Python thuần.
+
+    Văn bản được lấy từ bảng đoạn (piece table) của luồng WordDocument, nên
+    không cần Word hay LibreOffice. Tệp .docx bị đặt nhầm đuôi .doc cũng được
+    nhận diện và đọc như .docx.
+    """
+    if extra_parts is None:
+        extra_parts = config.EXTRACT_EXTRA_PARTS
+
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            data = f.read()
+    else:
+        data = source.read()
+
+    if data[:4] == b'PK\x03\x04':
+        yield from iter_docx_paragraphs(io.BytesIO(data), extra_parts)
+        return
+
+    compound_file = CompoundFile(data)
+    word_stream = compound_file.open_stream('WordDocument')
+    if len(word_stream) < 0x20 or struct.unpack_from('<H', word_stream, 0)[0] != WORD_IDENT:
+        raise ExtractionError('Luồng WordDocument không hợp lệ')
+    flags = struct.unpack_from('<H', word_stream, 0x0A)[0]
+    if flags & WORD_FLAG_ENCRYPTED:
+        raise ExtractionError('Tài liệu Word được mã hóa')
+    table_stream = compound_file.open_stream('1Table' if flags & WORD_FLAG_TABLE_1 else '0Table')
+
+    try:
+        # FIB: FibBase (32 byte), fibRgW, fibRgLw, fibRgFcLcb
+        position = 32
+        position += 2 + struct.unpack_from('<H', word_stream, position)[0] * 2
+        long_count = struct.unpack_from('<H', word_stream, position)[0]
+        fib_rg_lw = position + 2
+        fib_rg_fc_lcb = fib_rg_lw + long_count * 4 + 2
+        # ccpText, ccpFtn, ccpHdd, (dự phòng), ccpAtn, ccpEdn
+        ccp_text, ccp_ftn, ccp_hdd, _, ccp_atn, ccp_edn = struct.unpack_from('<6i', word_stream, fib_rg_lw + 12)
+        fc_clx, lcb_clx = struct.unpack_from('<2I', word_stream, fib_rg_fc_lcb + WORD_FIB_CLX_INDEX * 8)
+    except struct.error as e:
+        raise ExtractionError('FIB của tài liệu Word bị cắt cụt') from e
+
+    text = _read_pieces(word_stream, table_stream[fc_clx:fc_clx + lcb_clx])
+
+    # Các "story" nằm liên tiếp theo thứ tự: nội dung chính, chú thích cuối trang,
+    # đầu/chân trang, ghi chú, chú thích cuối tài liệu
+    stories = {}
+    position = 0
+    for name, length in (('main', ccp_text), ('footnotes', ccp_ftn), ('header', ccp_hdd),
+                         ('annotations', ccp_atn), ('endnotes', ccp_edn)):
+        stories[name] = text[position:position + max(length, 0)]
+        position += max(length, 0)
+
+    body = _clean_word_text(stories['main']).split('\n')
+    if body and not body[-1]:
+        body.pop()
+
+    def extra():
+        seen_stories = set()
+        for part in extra_parts:
+            # Đầu trang và chân trang nằm chung một story trong tệp .doc
+            story = 'header' if part == 'footer' else part
+            if story in seen_stories or not stories.get(story):
+                continue
+            seen_stories.add(story)
+            paragraphs = _clean_word_text(stories[story]).split('\n')
+            yield from _extra_paragraphs([paragraphs], deduplicate=story == 'header')
+
+    yield from _with_extra_parts(body, extra())
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""
+Kiểm tra engine cấu trúc "fast" (quy tắc, không dùng spaCy) so với engine spaCy:
+mức độ trùng khớp của việc chia tiêu đề/đoạn văn trên bộ văn bản tham chiếu và
+tốc độ tương đối.
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.bench_fast_engine --sizes 1K,10K,100K
+    python -m benchmarks.bench_fast_engine --corpus-dir path/to/documents
+
+Bộ văn bản tham chiếu gồm các văn bản tổng hợp (benchmarks/corpus.py) với mọi
+mật độ tiêu đề, cùng các tệp .txt/.docx/.doc trong --corpus-dir nếu có. Tham
+chiếu là profile 'structure' của pipeline đang được tải, không chỉnh sửa gì.
+In ra tỷ lệ câu trùng khớp (văn bản và cờ tiêu đề) của từng văn bản và của cả
+bộ, và văn bản định dạng (cách chia tiêu đề/đoạn văn) có giống hệt engine spaCy
+không. Mã thoát là 1 nếu số văn bản định dạng khác nhau lớn hơn
+--max-format-mismatches (mặc định 0: mọi văn bản phải được chia tiêu đề/đoạn
+văn giống hệt), tỷ lệ câu chung thấp hơn --min-agreement hoặc tốc độ thấp hơn
+--min-speedup.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+from app.src import config
+from app.src.document_processor import (
+    build_analyzed_document,
+    extract_text_from_doc,
+    format_text_with_spacy,
+    get_nlp
+)
+from benchmarks.corpus import DENSITY_PROFILES, generate_text, parse_size
+
+FORMATTING_OPTIONS = {'citation_style': 'apa'}
+
+
+def load_corpus(sizes, corpus_dir):
+    texts = []
+    for size in sizes:
+        for density, (heading_density, citation_density) in DENSITY_PROFILES.items():
+            texts.append((f"synthetic_{size}_{density}",
+                          generate_text(parse_size(size), heading_density, citation_density)))
+    if corpus_dir:
+        for name in sorted(os.listdir(corpus_dir)):
+            path = os.path.join(corpus_dir, name)
+            if os.path.isfile(path) and name.lower().endswith(('.txt', '.docx', '.doc')):
+                content = extract_text_from_doc(path)
+                if content:
+                    texts.append((name, content))
+    return texts
+
+
+def split_of(analyzed):
+    return [(text, is_heading) for text, _, _, is_heading in analyzed.sentences]
+
+
+def sentence_counts(sentences, reference):
+    """(số câu trùng, tổng số câu khác nhau) giữa hai cách tách câu, so theo văn bản và cờ tiêu đề."""
+    candidate = Counter((text, is_heading) for text, _, _, is_heading in sentences)
+    expected = Counter((text, is_heading) for text, _, _, is_heading in reference)
+    return sum((candidate & expected).values()), sum((candidate | expected).values())
+
+
+def sentence_agreement(sentences, reference):
+    """Tỷ lệ câu trùng giữa hai cách tách câu (1.0 nếu giống hệt)."""
+    matched, total = sentence_counts(sentences, reference)
+    return matched / total if total else 1.0
+
+
+def timed_build(content, engine, repeat):
+    timings = []
+    analyzed = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        analyzed = build_analyzed_document(content, engine)
+        timings.append(time.perf_counter() - start)
+    return analyzed, statistics.median(timings)
+
+
+def first_difference(reference, candidate):
+    for index, (expected, actual) in enumerate(zip(reference, candidate)):
+        if expected != actual:
+            return index, expected, actual
+    index = min(len(reference), len(candidate))
+    return index, reference[index] if index < len(reference) else None, \
+        candidate[index] if index < len(candidate) else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1K,10K,100K')
+    parser.add_argument('--corpus-dir', help='Thư mục chứa thêm văn bản tham chiếu (.txt, .docx, .doc)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--min-speedup', type=float, default=10.0)
+    parser.add_argument('--min-agreement', type=float, default=0.95)
+    parser.add_argument('--max-format-mismatches', type=int, default=0,
+                        help='Số văn bản tối đa được phép định dạng khác engine spaCy')
+    args = parser.parse_args()
+    # So sánh với thời gian spaCy chạy thật trên văn bản (không dùng bộ nhớ đệm đoạn văn)
+    config.PARAGRAPH_CACHE_ENABLED = False
+
+    print(f"Pipeline: {get_nlp().pipe_names}\n")
+    texts = load_corpus(args.sizes.split(','), args.corpus_dir)
+    build_analyzed_document(texts[0][1], 'spacy')  # Làm nóng mô hình
+
+    mismatches = 0
+    matched_sentences = total_sentences = 0
+    spacy_total = fast_total = 0.0
+    print(f"{'text':<28} {'chars':>9} {'spacy ms':>10} {'fast ms':>9} {'speedup':>8} {'câu khớp':>9}  "
+          f"định dạng khớp")
+    for name, content in texts:
+        reference, spacy_seconds = timed_build(content, 'spacy', args.repeat)
+        candidate, fast_seconds = timed_build(content, 'fast', args.repeat)
+        spacy_total += spacy_seconds
+        fast_total += fast_seconds
+
+        matched, total = sentence_counts(candidate.sentences, reference.sentences)
+        matched_sentences += matched
+        total_sentences += total
+        same_output = (format_text_with_spacy(content, FORMATTING_OPTIONS, reference) ==
+                       format_text_with_spacy(content, FORMATTING_OPTIONS, candidate))
+        mismatches += not same_output
+        print(f"{name:<28} {len(content):>9} {spacy_seconds * 1000:>10.2f} {fast_seconds * 1000:>9.2f} "
+              f"{spacy_seconds / fast_seconds:>7.1f}x {matched / total if total else 1.0:>9.1%}  "
+              f"{'có' if same_output else 'KHÔNG'}")
+        if split_of(reference) != split_of(candidate):
+            index, expected, actual = first_difference(split_of(reference), split_of(candidate))
+            print(f"    câu {index}: spacy={expected!r}\n    {' ' * len(str(index))}      fast={actual!r}")
+
+    speedup = spacy_total / fast_total if fast_total else float('inf')
+    agreement = matched_sentences / total_sentences if total_sentences else 1.0
+    print(f"\nTỷ lệ câu trùng khớp: {agreement:.1%}; văn bản định dạng giống nhau: "
+          f"{len(texts) - mismatches}/{len(texts)}; tốc độ tổng: {speedup:.1f}x")
+
+    if mismatches > args.max_format_mismatches:
+        print(f"Số văn bản định dạng khác engine spaCy ({mismatches}) vượt quá --max-format-mismatches "
+              f"({args.max_format_mismatches})")
+        return 1
+    if agreement < args.min_agreement or speedup < args.min_speedup:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Đo lợi ích của bộ nhớ đệm đoạn văn (paragraph_cache) khi tải lên các bản sửa
+đổi của cùng một tài liệu: mỗi bản sửa đổi thay một tỷ lệ --changed đoạn văn
+của bản trước. In ra thời gian phân tích cấu trúc của bản đầu tiên khi không
+dùng bộ nhớ đệm, khi bộ nhớ đệm còn trống, và của từng bản sửa đổi kèm tỷ lệ
+đoạn văn được dùng lại. Mỗi bản sửa đổi được so sánh với khi phân tích cả tài
+liệu không dùng bộ nhớ đệm: tỷ lệ câu trùng khớp, văn bản định dạng và kết quả
+analyze_text (số câu, token, thực thể, từ khóa...) có giống nhau không (bộ nhớ
+đệm tách câu tại mọi ranh giới đoạn văn).
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.bench_paragraph_cache --size 1M --changed 0.05 --revisions 3
+
+Mã thoát là 1 nếu văn bản định dạng hoặc kết quả analyze_text khi dùng bộ nhớ đệm khác
+khi phân tích cả tài liệu.
+"""
+import argparse
+import random
+import sys
+import time
+
+from app.src import config
+from app.src.document_processor import (
+    analyze_text, build_analyzed_document, format_text_with_spacy, get_formatting_options, warm_up_model
+)
+from app.src.paragraph_cache import paragraph_cache
+from benchmarks.bench_fast_engine import sentence_agreement
+from benchmarks.corpus import generate_paragraphs, parse_size
+
+
+def timed_structure(content, cached=True):
+    config.PARAGRAPH_CACHE_ENABLED = cached
+    start = time.perf_counter()
+    analyzed = build_analyzed_document(content)
+    return analyzed, time.perf_counter() - start
+
+
+def analysis_differences(cached, whole):
+    """Các trường của kết quả analyze_text khác nhau, kèm giá trị khi dùng/không dùng bộ nhớ đệm (ví dụ 'sentences 157/151')."""
+    differences = []
+    for name in ('sentences', 'tokens'):
+        if cached[name] != whole[name]:
+            differences.append(f"{name} {cached[name]}/{whole[name]}")
+    for name in ('entities', 'noun_chunks', 'keywords'):
+        if cached[name] != whole[name]:
+            differences.append(f"{name} {len(cached[name])}/{len(whole[name])}")
+    return differences
+
+
+def revise(paragraphs, changed, rng, seed):
+    """Bản sửa đổi: thay ngẫu nhiên khoảng changed * len(paragraphs) đoạn văn."""
+    paragraphs = list(paragraphs)
+    count = max(1, round(len(paragraphs) * changed))
+    replacements = generate_paragraphs(sum(map(len, paragraphs)) // len(paragraphs) * count * 2, seed=seed)
+    for index, replacement in zip(rng.sample(range(len(paragraphs)), count), replacements):
+        paragraphs[index] = replacement
+    return paragraphs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', default='1M')
+    parser.add_argument('--changed', type=float, default=0.05)
+    parser.add_argument('--revisions', type=int, default=3)
+    args = parser.parse_args()
+
+    warm_up_model()
+    rng = random.Random(0)
+    paragraphs = generate_paragraphs(parse_size(args.size))
+    content = '\n\n'.join(paragraphs)
+    formatting_options = get_formatting_options({})
+    print(f"Văn bản: {len(content)} ký tự, {len(paragraphs)} đoạn văn\n")
+
+    timed_structure(content, cached=False)  # Lần chạy đầu khởi tạo các cấu trúc lười, không tính
+    _, seconds = timed_structure(content, cached=False)
+    print(f"{'lượt':<16} {'structure s':>12} {'dùng lại':>9} {'câu khớp':>9} {'định dạng':>9}  "
+          f"analyze_text (đệm/cả tài liệu)")
+    print(f"{'không đệm':<16} {seconds:>12.2f} {'-':>9} {'-':>9} {'-':>9}  -")
+    paragraph_cache.clear()
+    _, seconds = timed_structure(content)
+    print(f"{'bản đầu':<16} {seconds:>12.2f} {0.0:>8.0%} {'-':>9} {'-':>9}  -")
+
+    mismatches = 0
+    for revision in range(1, args.revisions + 1):
+        paragraphs = revise(paragraphs, args.changed, rng, seed=revision)
+        content = '\n\n'.join(paragraphs)
+        before = paragraph_cache.stats()
+        analyzed, seconds = timed_structure(content)
+        after = paragraph_cache.stats()
+        hits = after['hits'] - before['hits']
+        reused = hits / (hits + after['misses'] - before['misses'])
+
+        # Kết quả tham chiếu: phân tích cả tài liệu, không dùng bộ nhớ đệm
+        whole, _ = timed_structure(content, cached=False)
+        agreement = sentence_agreement(analyzed.sentences, whole.sentences)
+        matched = (format_text_with_spacy(content, formatting_options, analyzed) ==
+                   format_text_with_spacy(content, formatting_options, whole))
+        config.PARAGRAPH_CACHE_ENABLED = True
+        cached_analysis = analyze_text(content)
+        config.PARAGRAPH_CACHE_ENABLED = False
+        differences = analysis_differences(cached_analysis, analyze_text(content))
+        mismatches += (not matched) + bool(differences)
+        print(f"{f'sửa đổi {revision}':<16} {seconds:>12.2f} {reused:>8.0%} {agreement:>9.1%} "
+              f"{'khớp' if matched else 'KHÔNG':>9}  {', '.join(differences) or 'khớp'}")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+So sánh việc giữ kết quả phân tích dưới dạng spaCy Doc với dạng mảng gọn
+(ParsedDocument): bộ nhớ, kích thước khi ghi ra bytes, thời gian ghi/đọc lại,
+và kiểm tra analyze_text/format_text_with_spacy cho cùng kết quả khi tạo từ
+ParsedDocument thay vì chạy lại mô hình (định dạng so với profile 'structure'
+như /upload).
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.bench_parsed_document --size 1M --repeat 5
+
+Mã thoát là 1 nếu kết quả tạo từ ParsedDocument khác kết quả của mô hình.
+"""
+import argparse
+import statistics
+import sys
+import time
+import tracemalloc
+
+from app.src import document_processor
+from app.src.document_processor import (
+    analyze_text, format_text_with_spacy, get_formatting_options, iter_docs, parse_document, warm_up_model
+)
+from app.src.parsed_document import ParsedDocument
+from benchmarks.corpus import generate_text, parse_size
+
+
+def retained_bytes(func):
+    """(kết quả, số bytes bộ nhớ còn được giữ bởi kết quả) của func()."""
+    tracemalloc.start()
+    result = func()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, retained
+
+
+def median_seconds(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', default='1M')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    # Bộ nhớ đệm đoạn văn giữ thêm kết quả phân tích, làm sai lệch số đo bộ nhớ
+    document_processor.config.PARAGRAPH_CACHE_ENABLED = False
+
+    warm_up_model()
+    content = generate_text(parse_size(args.size), 0.15, 0.2)
+    print(f"Văn bản: {len(content)} ký tự, pipeline: {document_processor.get_nlp().pipe_names}\n")
+
+    docs, docs_bytes = retained_bytes(lambda: [doc for _, doc in iter_docs(content, profile='analyze')])
+    parsed, parsed_bytes = retained_bytes(lambda: parse_document(content))
+    if parsed is None:
+        print("Không phân tích được văn bản với mô hình hiện tại")
+        return 1
+
+    doc_serialized = sum(len(doc.to_bytes()) for doc in docs)
+    data = parsed.to_bytes()
+    print(f"{'':<16} {'bộ nhớ MB':>10} {'bytes MB':>10} {'ghi ms':>8} {'đọc ms':>8}")
+    print(f"{'spaCy Doc':<16} {docs_bytes / 1e6:>10.2f} {doc_serialized / 1e6:>10.2f} "
+          f"{median_seconds(lambda: [doc.to_bytes() for doc in docs], args.repeat) * 1000:>8.1f} "
+          f"{'-':>8}")
+    print(f"{'ParsedDocument':<16} {parsed_bytes / 1e6:>10.2f} {len(data) / 1e6:>10.2f} "
+          f"{median_seconds(parsed.to_bytes, args.repeat) * 1000:>8.1f} "
+          f"{median_seconds(lambda: ParsedDocument.from_bytes(data), args.repeat) * 1000:>8.3f}")
+
+    reloaded = ParsedDocument.from_bytes(data)
+    formatting_options = get_formatting_options({})
+    checks = {
+        'analyze_text': analyze_text(content) == analyze_text(content, reloaded),
+        'format_text_with_spacy': (format_text_with_spacy(content, formatting_options) ==
+                                   format_text_with_spacy(content, formatting_options, parsed=reloaded)),
+    }
+    print()
+    for name, matched in checks.items():
+        print(f"{name:<24} {'khớp' if matched else 'KHÔNG khớp'}")
+    return 0 if all(checks.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+So sánh độ trễ của các profile pipeline spaCy (full, analyze, structure).
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.bench_profiles --docs 20 --paragraphs 40
+"""
+import argparse
+import random
+import statistics
+import time
+
+from app.src.document_processor import get_nlp
+from app.src.pipeline_profiles import PIPELINE_PROFILES, disabled_components
+
+WORDS = ("research method result analysis data model study theory system process "
+         "student university experiment evidence sample literature review design").split()
+
+
+def make_document(paragraphs, rng):
+    """Tạo văn bản mẫu gồm tiêu đề ngắn và các đoạn văn dài."""
+    parts = []
+    for i in range(paragraphs):
+        if i % 4 == 0:
+            parts.append(' '.join(word.title() for word in rng.sample(WORDS, 3)))
+        sentences = []
+        for _ in range(rng.randint(3, 6)):
+            sentence = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 20)))
+            sentences.append(sentence.capitalize() + '.')
+        parts.append(' '.join(sentences))
+    return '\n\n'.join(parts)
+
+
+def bench_profile(nlp, profile, texts, repeat):
+    disable = disabled_components(nlp, profile)
+    timings = []
+    for _ in range(repeat):
+        for text in texts:
+            start = time.perf_counter()
+            nlp(text, disable=disable)
+            timings.append(time.perf_counter() - start)
+    return disable, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=20, help='Số văn bản mẫu')
+    parser.add_argument('--paragraphs', type=int, default=40, help='Số đoạn văn trong mỗi văn bản')
+    parser.add_argument('--repeat', type=int, default=3, help='Số lần lặp lại')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = [make_document(args.paragraphs, rng) for _ in range(args.docs)]
+    nlp = get_nlp()
+    print(f"Pipeline: {nlp.pipe_names}")
+    print(f"{args.docs} văn bản, trung bình {sum(map(len, texts)) // len(texts)} ký tự\n")
+
+    # Chạy thử để làm nóng mô hình
+    nlp(texts[0])
+
+    results = {}
+    for profile in PIPELINE_PROFILES:
+        disable, timings = bench_profile(nlp, profile, texts, args.repeat)
+        results[profile] = timings
+        print(f"{profile:<10} tắt={disable}")
+
+    baseline = statistics.mean(results['full'])
+    print(f"\n{'profile':<10} {'mean ms':>10} {'p95 ms':>10} {'speedup':>8}")
+    for profile, timings in results.items():
+        mean = statistics.mean(timings)
+        p95 = sorted(timings)[int(len(timings) * 0.95) - 1]
+        print(f"{profile:<10} {mean * 1000:>10.2f} {p95 * 1000:>10.2f} {baseline / mean:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+So sánh thông lượng và bộ nhớ của hai engine tạo DOCX: python-docx và OOXML.
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.bench_render_engines --paragraphs 2000 --repeat 3
+"""
+import argparse
+import io
+import random
+import statistics
+import time
+import tracemalloc
+
+import docx
+
+from app.src.document_blocks import (
+    BLOCK_TITLE, BLOCK_SECTION_TITLE, BLOCK_TOC_ENTRY, BLOCK_HEADING, BLOCK_BODY,
+    BLOCK_REFERENCE, BLOCK_EMPTY
+)
+from app.src.document_processor import RENDER_ENGINES
+
+WORDS = ("research method result analysis data model study theory system process "
+         "student university experiment evidence sample literature review design").split()
+
+FORMATTING_OPTIONS = {
+    'citation_style': 'apa',
+    'font_family': 'Times New Roman',
+    'font_size': '12',
+    'line_spacing': '2.0',
+    'margin': 'normal',
+    'paragraph_spacing': 'after',
+    'page_numbers': True,
+    'title_page': True,
+    'table_of_contents': True,
+    'bibliography': True,
+}
+
+
+def make_blocks(paragraphs, rng):
+    """Tạo danh sách khối giống đầu ra của build_document_blocks."""
+    blocks = [(BLOCK_TITLE, 'Synthetic Benchmark Document'), (BLOCK_EMPTY, ''),
+              (BLOCK_SECTION_TITLE, 'Table of Contents'), (BLOCK_EMPTY, '')]
+    blocks.extend((BLOCK_TOC_ENTRY, f"{i + 1}. Section {i + 1}") for i in range(10))
+    blocks.append((BLOCK_EMPTY, ''))
+    for i in range(paragraphs):
+        if i % 5 == 0:
+            blocks.append((BLOCK_HEADING, f"{i // 5 + 1}. " + ' '.join(rng.sample(WORDS, 3)).title()))
+        sentence_count = rng.randint(3, 8)
+        text = ' '.join(' '.join(rng.choice(WORDS) for _ in range(15)).capitalize() + '.'
+                        for _ in range(sentence_count))
+        blocks.append((BLOCK_BODY, text))
+    blocks.extend([(BLOCK_EMPTY, ''), (BLOCK_SECTION_TITLE, 'References')])
+    blocks.extend((BLOCK_REFERENCE, f"(Author{i}, 20{i % 25:02d}) - Reference details") for i in range(50))
+    return blocks
+
+
+def measure(engine, blocks, repeat):
+    render = RENDER_ENGINES[engine]
+    timings = []
+    peak_bytes = 0
+    output = None
+    for _ in range(repeat):
+        output = io.BytesIO()
+        tracemalloc.start()
+        start = time.perf_counter()
+        render(blocks, FORMATTING_OPTIONS, output)
+        timings.append(time.perf_counter() - start)
+        peak_bytes = max(peak_bytes, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return timings, peak_bytes, output.getvalue()
+
+
+def paragraph_texts(data):
+    document = docx.Document(io.BytesIO(data))
+    return [paragraph.text for paragraph in document.paragraphs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--paragraphs', type=int, default=2000, help='Số đoạn văn nội dung')
+    parser.add_argument('--repeat', type=int, default=3, help='Số lần lặp lại')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    blocks = make_blocks(args.paragraphs, random.Random(args.seed))
+    text_chars = sum(len(text) for _, text in blocks)
+    print(f"{len(blocks)} khối, {text_chars / 1024:.0f} KB văn bản\n")
+
+    results = {}
+    for engine in RENDER_ENGINES:
+        results[engine] = measure(engine, blocks, args.repeat)
+
+    print(f"{'engine':<8} {'mean s':>9} {'para/s':>10} {'peak MB':>9} {'size KB':>9}")
+    for engine, (timings, peak_bytes, data) in results.items():
+        mean = statistics.mean(timings)
+        print(f"{engine:<8} {mean:>9.3f} {len(blocks) / mean:>10.0f} "
+              f"{peak_bytes / 1024 / 1024:>9.1f} {len(data) / 1024:>9.0f}")
+
+    docx_mean = statistics.mean(results['docx'][0])
+    ooxml_mean = statistics.mean(results['ooxml'][0])
+    print(f"\nOOXML nhanh hơn {docx_mean / ooxml_mean:.1f} lần")
+
+    # Kiểm tra hai engine tạo ra cùng nội dung
+    equivalent = paragraph_texts(results['docx'][2]) == paragraph_texts(results['ooxml'][2])
+    print(f"Nội dung tương đương: {'có' if equivalent else 'KHÔNG'}")
+
+
+if __name__ == '__main__':
+    main()
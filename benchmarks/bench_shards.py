@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+So sánh phân tích tuần tự và phân tích song song theo khối (shard_pool) trên
+một tài liệu lớn: kết quả phải trùng khớp, và in ra thời gian theo số worker.
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.bench_shards --size 10M --workers 1,2,4
+
+Mã thoát là 1 nếu kết quả song song khác kết quả tuần tự. Tốc độ chỉ tăng khi
+máy có nhiều lõi CPU rảnh.
+"""
+import argparse
+import statistics
+import sys
+import time
+
+from app.src import document_processor
+from app.src.document_processor import analyze_text, build_analyzed_document, shard_pool, warm_up_model
+from benchmarks.corpus import generate_text, parse_size
+
+
+def structure_of(analyzed):
+    return analyzed.error is None, analyzed.sentences
+
+
+def measure(func, content, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(content)
+        timings.append(time.perf_counter() - start)
+    return result, statistics.median(timings)
+
+
+def run(content, workers, repeat):
+    """Kết quả và thời gian (analyze, structure) với số worker cho trước (1 = tuần tự)."""
+    shard_pool.shutdown()
+    shard_pool.enabled = workers > 1
+    shard_pool.max_workers = workers
+    if workers > 1:
+        # Khởi động pool trước khi đo
+        build_analyzed_document(content[:document_processor.config.STREAMING_THRESHOLD_CHARS * 2])
+    analysis, analyze_seconds = measure(analyze_text, content, repeat)
+    analyzed, structure_seconds = measure(build_analyzed_document, content, repeat)
+    return (analysis, structure_of(analyzed)), (analyze_seconds, structure_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', default='2M')
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+    # Đo đường phân tích theo khối (tuần tự/song song), không phải đường theo đoạn văn
+    document_processor.config.PARAGRAPH_CACHE_ENABLED = False
+
+    warm_up_model()
+    content = generate_text(parse_size(args.size), 0.15, 0.2)
+    print(f"Văn bản: {len(content)} ký tự, pipeline: {document_processor.get_nlp().pipe_names}\n")
+
+    reference, (serial_analyze, serial_structure) = run(content, 1, args.repeat)
+    print(f"{'workers':>7} {'analyze s':>10} {'structure s':>12} {'speedup':>8}  khớp")
+    print(f"{1:>7} {serial_analyze:>10.2f} {serial_structure:>12.2f} {1.0:>7.1f}x  -")
+
+    mismatches = 0
+    for workers in [int(value) for value in args.workers.split(',') if int(value) > 1]:
+        result, (analyze_seconds, structure_seconds) = run(content, workers, args.repeat)
+        matched = result == reference
+        mismatches += not matched
+        speedup = (serial_analyze + serial_structure) / (analyze_seconds + structure_seconds)
+        print(f"{workers:>7} {analyze_seconds:>10.2f} {structure_seconds:>12.2f} {speedup:>7.1f}x  "
+              f"{'có' if matched else 'KHÔNG'}")
+    shard_pool.shutdown()
+
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
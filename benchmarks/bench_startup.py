@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Đo thời gian khởi động ứng dụng và thời gian đến yêu cầu đầu tiên với các chế
+độ làm nóng mô hình (MODEL_WARM_UP):
+
+- lazy: mô hình chỉ được tải khi yêu cầu đầu tiên cần NLP (đường lạnh)
+- background: mô hình được tải và làm nóng trong luồng nền ngay sau khi khởi động
+- eager: khởi động chờ làm nóng mô hình xong (như wsgi.py)
+
+Mỗi lần đo chạy trong một tiến trình Python mới. Các cột là thời gian tính từ
+khi tiến trình bắt đầu: ứng dụng sẵn sàng nhận yêu cầu (import + create_app),
+hoàn thành yêu cầu nhẹ đầu tiên (/storage/stats), hoàn thành yêu cầu /analyze
+đầu tiên (gửi ngay sau yêu cầu nhẹ) và /ready trả về 200.
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.bench_startup --repeat 5
+"""
+import argparse
+import io
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+MODES = ('lazy', 'background', 'eager')
+ANALYZE_TEXT = b"Introduction\n\nThis is a short document (Smith, 2020). It mentions London and Google."
+COLUMNS = ('app_ready', 'first_request', 'first_analyze', 'ready')
+
+
+def child(mode, process_start):
+    """Chạy trong tiến trình con: in ra các mốc thời gian (giây, tính từ process_start) dạng JSON."""
+    def elapsed():
+        return time.time() - process_start
+
+    from app import create_app
+    from app.src.document_processor import warm_up_on_startup
+
+    app = create_app()
+    warm_up_on_startup(mode)
+    timings = {'app_ready': elapsed()}
+
+    client = app.test_client()
+    client.get('/storage/stats')
+    timings['first_request'] = elapsed()
+    # Nội dung khác nhau ở mỗi lần chạy để không trúng bộ nhớ đệm kết quả
+    content = ANALYZE_TEXT + f" Run {process_start!r}.".encode('utf-8')
+    client.post('/analyze', data={'file': (io.BytesIO(content), 'startup.txt')},
+                content_type='multipart/form-data')
+    timings['first_analyze'] = elapsed()
+
+    while client.get('/ready').status_code != 200:
+        time.sleep(0.01)
+    timings['ready'] = elapsed()
+    print(json.dumps(timings))
+
+
+def run_child(mode):
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_startup', '--child', mode, '--process-start', repr(time.time())],
+        check=True, capture_output=True, text=True
+    ).stdout
+    # Dòng cuối là kết quả; các dòng trước là log của ứng dụng
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--process-start', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.process_start)
+        return 0
+
+    print(f"Trung vị của {args.repeat} lần chạy, giây tính từ khi tiến trình bắt đầu\n")
+    print(f"{'chế độ':<12}" + ''.join(f"{column:>15}" for column in COLUMNS))
+    for mode in args.modes.split(','):
+        runs = [run_child(mode) for _ in range(args.repeat)]
+        print(f"{mode:<12}" + ''.join(f"{statistics.median(run[column] for run in runs):>15.3f}"
+                                      for column in COLUMNS))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Kiểm tra bộ đọc .doc (Python thuần) với các tệp hỏng hoặc bị cắt cụt: mọi lỗi
+cấu trúc phải được chuyển thành ExtractionError, để extract_text_from_doc trả
+về None (và /upload trả lỗi 400) thay vì để lọt struct.error/IndexError thành
+lỗi 500.
+
+Các đầu vào gồm: chữ ký OLE2 kèm vài byte 0, phần đầu OLE2 đầy đủ toàn byte 0,
+dữ liệu ngẫu nhiên sau chữ ký, và (nếu truyền --doc) các bản cắt cụt của một
+tệp .doc thật ở nhiều độ dài khác nhau. Thoát với mã 1 nếu có đầu vào làm lọt
+ngoại lệ khác ExtractionError.
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.check_doc_extraction --doc benchmarks/corpus/sample.doc
+"""
+import argparse
+import io
+import random
+import sys
+
+from app.src.document_processor import extract_text_from_doc
+from app.src.text_extraction import CFB_SIGNATURE, ExtractionError, iter_doc_paragraphs
+
+
+def malformed_inputs(doc_data, fuzz_count, seed):
+    """Các cặp (nhãn, bytes) của tệp .doc hỏng."""
+    rng = random.Random(seed)
+    yield 'chữ ký + 20 byte 0', CFB_SIGNATURE + bytes(20)
+    yield 'phần đầu toàn byte 0', CFB_SIGNATURE + bytes(504)
+    for index in range(fuzz_count):
+        size = rng.choice((64, 512, 1024, 4096))
+        data = bytearray(CFB_SIGNATURE + rng.randbytes(size))
+        # Giữ kích thước sector hợp lệ để đi sâu hơn vào FAT và thư mục
+        data[0x1E:0x22] = b'\x09\x00\x06\x00'
+        yield f'ngẫu nhiên #{index} ({size} byte)', bytes(data)
+    if doc_data:
+        for fraction in (0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99):
+            cut = max(len(CFB_SIGNATURE), int(len(doc_data) * fraction))
+            yield f'cắt cụt còn {cut} byte', doc_data[:cut]
+        for index in range(fuzz_count):
+            # Ghi đè vài byte ngẫu nhiên trong tệp thật
+            corrupted = bytearray(doc_data)
+            for _ in range(8):
+                corrupted[rng.randrange(len(CFB_SIGNATURE), len(corrupted))] = rng.randrange(256)
+            yield f'hỏng ngẫu nhiên #{index}', bytes(corrupted)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--doc', help='Tệp .doc hợp lệ dùng để tạo các bản cắt cụt/hỏng')
+    parser.add_argument('--fuzz', type=int, default=50, help='Số đầu vào ngẫu nhiên mỗi loại')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    doc_data = None
+    if args.doc:
+        with open(args.doc, 'rb') as f:
+            doc_data = f.read()
+        # Tệp gốc phải đọc được, nếu không các bản cắt cụt không có ý nghĩa
+        list(iter_doc_paragraphs(io.BytesIO(doc_data)))
+
+    failures = 0
+    checked = 0
+    for label, data in malformed_inputs(doc_data, args.fuzz, args.seed):
+        checked += 1
+        try:
+            list(iter_doc_paragraphs(io.BytesIO(data)))
+        except ExtractionError:
+            pass
+        except Exception as e:
+            failures += 1
+            print(f"LỖI  {label}: {type(e).__name__}: {str(e)}")
+            continue
+        try:
+            extract_text_from_doc(io.BytesIO(data), 'malformed.doc')
+        except Exception as e:
+            failures += 1
+            print(f"LỖI  {label}: extract_text_from_doc để lọt {type(e).__name__}: {str(e)}")
+
+    print(f"{checked} đầu vào, {failures} đầu vào làm lọt ngoại lệ khác ExtractionError")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""
+Tạo bộ văn bản tổng hợp (.txt và .docx) cho các benchmark.
+
+Kích thước từ 1 KB đến giới hạn tải lên MAX_CONTENT_LENGTH (10 MB), với mật độ
+tiêu đề và trích dẫn thay đổi được.
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.corpus --out benchmarks/corpus --sizes 1K,10K,100K,1M,10M
+"""
+import argparse
+import os
+import random
+
+WORDS = ("research method result analysis data model study theory system process student "
+         "university experiment evidence sample literature review design learning network "
+         "language structure measure effect group control variable significant approach").split()
+SURNAMES = "Smith Nguyen Tran Johnson Lee Garcia Brown Pham Miller Davis Wilson Le".split()
+
+# Mật độ mặc định: tỉ lệ đoạn văn là tiêu đề và tỉ lệ câu có trích dẫn
+DENSITY_PROFILES = {
+    'sparse': (0.05, 0.05),
+    'normal': (0.15, 0.20),
+    'dense': (0.30, 0.60),
+}
+
+SIZE_UNITS = {'K': 1024, 'M': 1024 * 1024}
+
+
+def parse_size(value):
+    """Chuyển '10K', '1M' hoặc '2048' thành số byte."""
+    value = value.strip().upper()
+    if value[-1] in SIZE_UNITS:
+        return int(float(value[:-1]) * SIZE_UNITS[value[-1]])
+    return int(value)
+
+
+def format_size(size):
+    for unit, factor in (('M', SIZE_UNITS['M']), ('K', SIZE_UNITS['K'])):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{unit}"
+    return str(size)
+
+
+def _citation(rng, citation_style):
+    if citation_style == 'apa':
+        return f"({rng.choice(SURNAMES)}, {rng.randint(1990, 2024)})"
+    if citation_style == 'mla':
+        return f"({rng.choice(SURNAMES)} {rng.randint(1, 300)})"
+    if citation_style == 'ieee':
+        return f"({rng.randint(1, 99)})"
+    return f"[{rng.randint(1, 99)}]"
+
+
+def _sentence(rng, citation_density, citation_style):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 24))]
+    sentence = ' '.join(words).capitalize()
+    if rng.random() < citation_density:
+        sentence += ' ' + _citation(rng, citation_style)
+    return sentence + '.'
+
+
+def generate_paragraphs(size_bytes, heading_density=0.15, citation_density=0.2,
+                        citation_style='apa', seed=0):
+    """Sinh danh sách đoạn văn có tổng kích thước (UTF-8) xấp xỉ size_bytes."""
+    rng = random.Random(seed)
+    paragraphs = []
+    total = 0
+    while total < size_bytes:
+        if rng.random() < heading_density:
+            paragraph = ' '.join(rng.sample(WORDS, rng.randint(2, 5))).title()
+        else:
+            paragraph = ' '.join(_sentence(rng, citation_density, citation_style)
+                                 for _ in range(rng.randint(2, 7)))
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 2
+    return paragraphs
+
+
+def generate_text(size_bytes, heading_density=0.15, citation_density=0.2, citation_style='apa', seed=0):
+    """Sinh văn bản có kích thước xấp xỉ size_bytes, các đoạn cách nhau bằng dòng trống."""
+    text = '\n\n'.join(generate_paragraphs(size_bytes, heading_density, citation_density,
+                                           citation_style, seed))
+    return text[:size_bytes]
+
+
+def write_docx(paragraphs, path):
+    import docx
+    document = docx.Document()
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    document.save(path)
+
+
+def write_corpus(out_dir, sizes, densities=('normal',), formats=('txt', 'docx'),
+                 citation_style='apa', seed=0):
+    """Ghi bộ văn bản vào out_dir; trả về danh sách đường dẫn đã tạo (bỏ qua tệp đã tồn tại)."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for size in sizes:
+        for density in densities:
+            heading_density, citation_density = DENSITY_PROFILES[density]
+            name = f"synthetic_{format_size(size)}_{density}"
+            paragraphs = None
+            for extension in formats:
+                path = os.path.join(out_dir, f"{name}.{extension}")
+                paths.append(path)
+                if os.path.exists(path):
+                    continue
+                if paragraphs is None:
+                    paragraphs = generate_paragraphs(size, heading_density, citation_density,
+                                                     citation_style, seed)
+                if extension == 'txt':
+                    with open(path, 'w', encoding='utf-8') as f:
+                        f.write('\n\n'.join(paragraphs)[:size])
+                else:
+                    write_docx(paragraphs, path)
+                print(f"Đã tạo {path}")
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--out', default=os.path.join('benchmarks', 'corpus'), help='Thư mục đầu ra')
+    parser.add_argument('--sizes', default='1K,10K,100K,1M,10M', help='Danh sách kích thước, ví dụ 1K,1M')
+    parser.add_argument('--densities', default='normal', help=f"Mật độ: {','.join(DENSITY_PROFILES)}")
+    parser.add_argument('--formats', default='txt,docx')
+    parser.add_argument('--citation-style', default='apa')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    write_corpus(args.out, [parse_size(size) for size in args.sizes.split(',')],
+                 args.densities.split(','), args.formats.split(','), args.citation_style, args.seed)
+
+
+if __name__ == '__main__':
+    main()
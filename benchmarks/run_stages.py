@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+"""
+Đo thời gian và bộ nhớ (peak RSS) của từng bước xử lý trên bộ văn bản tổng hợp,
+rồi so sánh với baseline đã lưu để phát hiện suy giảm hiệu năng.
+
+Các bước: extract (extract_text_from_doc), analyze (analyze_text),
+format (format_text_with_spacy), render (create_formatted_document).
+
+Chạy từ thư mục gốc của dự án:
+    python -m benchmarks.run_stages --sizes 1K,100K,1M --save-baseline
+    python -m benchmarks.run_stages --sizes 1K,100K,1M --threshold 0.2
+
+Mã thoát là 1 nếu có bước bị chậm hơn (hoặc tốn bộ nhớ hơn) baseline quá ngưỡng.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import threading
+import time
+
+from app.src import config
+from app.src.document_processor import (
+    extract_text_from_doc,
+    analyze_text,
+    format_text_with_spacy,
+    create_formatted_document
+)
+from benchmarks.corpus import DENSITY_PROFILES, parse_size, write_corpus
+
+DEFAULT_FORMATTING_OPTIONS = {
+    'citation_style': 'apa',
+    'font_family': 'Times New Roman',
+    'font_size': '12',
+    'line_spacing': '2.0',
+    'margin': 'normal',
+    'paragraph_spacing': 'after',
+    'page_numbers': True,
+    'title_page': True,
+    'table_of_contents': True,
+    'bibliography': True,
+}
+
+STAGES = ('extract', 'analyze', 'format', 'render')
+
+
+def current_rss_bytes():
+    """RSS hiện tại của tiến trình (Linux: /proc/self/statm, nơi khác: ru_maxrss)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == 'darwin' else usage * 1024
+
+
+class PeakRSSSampler:
+    """Lấy mẫu RSS trong một luồng nền để ghi nhận đỉnh bộ nhớ của một bước."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = current_rss_bytes()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss_bytes())
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_bytes())
+
+
+def run_stage(stage, path, content, formatting_options):
+    if stage == 'extract':
+        return extract_text_from_doc(path)
+    if stage == 'analyze':
+        return analyze_text(content)
+    if stage == 'format':
+        return format_text_with_spacy(content, formatting_options)
+    return create_formatted_document(content, formatting_options, io.BytesIO())
+
+
+def measure_file(path, stages, repeat, formatting_options):
+    """Đo các bước trên một tệp; trả về {stage: {'seconds', 'peak_rss_mb'}}."""
+    content = extract_text_from_doc(path)
+    results = {}
+    for stage in stages:
+        timings = []
+        peak = 0
+        for _ in range(repeat):
+            with PeakRSSSampler() as sampler:
+                start = time.perf_counter()
+                run_stage(stage, path, content, formatting_options)
+                timings.append(time.perf_counter() - start)
+            peak = max(peak, sampler.peak)
+        results[stage] = {
+            'seconds': statistics.median(timings),
+            'peak_rss_mb': round(peak / 1024 / 1024, 1),
+        }
+    return results
+
+
+def compare(results, baseline, threshold, memory_threshold, min_seconds):
+    """So sánh với baseline; trả về danh sách mô tả các suy giảm."""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        if (current['seconds'] > min_seconds and
+                current['seconds'] > previous['seconds'] * (1 + threshold)):
+            regressions.append(f"{key}: {previous['seconds']:.4f}s -> {current['seconds']:.4f}s")
+        if current['peak_rss_mb'] > previous['peak_rss_mb'] * (1 + memory_threshold):
+            regressions.append(f"{key}: {previous['peak_rss_mb']} MB -> {current['peak_rss_mb']} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus-dir', default=os.path.join('benchmarks', 'corpus'))
+    parser.add_argument('--sizes', default='1K,10K,100K,1M,10M')
+    parser.add_argument('--densities', default='normal', help=f"Mật độ: {','.join(DENSITY_PROFILES)}")
+    parser.add_argument('--formats', default='txt,docx')
+    parser.add_argument('--stages', default=','.join(STAGES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=os.path.join('benchmarks', 'baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true', help='Ghi kết quả hiện tại làm baseline')
+    parser.add_argument('--output', help='Ghi kết quả ra tệp JSON')
+    parser.add_argument('--threshold', type=float, default=0.20,
+                        help='Ngưỡng suy giảm thời gian cho phép (0.20 = chậm hơn 20%%)')
+    parser.add_argument('--memory-threshold', type=float, default=0.25,
+                        help='Ngưỡng tăng peak RSS cho phép')
+    parser.add_argument('--min-seconds', type=float, default=0.005,
+                        help='Bỏ qua so sánh thời gian cho các bước nhanh hơn giá trị này')
+    args = parser.parse_args()
+    # Mỗi lần lặp phải chạy lại mô hình, không lấy kết quả từ bộ nhớ đệm đoạn văn
+    config.PARAGRAPH_CACHE_ENABLED = False
+
+    stages = [stage for stage in args.stages.split(',') if stage]
+    for stage in stages:
+        if stage not in STAGES:
+            parser.error(f"Bước không hợp lệ: {stage}")
+
+    paths = write_corpus(args.corpus_dir, [parse_size(size) for size in args.sizes.split(',')],
+                         args.densities.split(','), args.formats.split(','))
+
+    results = {}
+    print(f"{'file':<36} {'stage':<8} {'median s':>10} {'MB/s':>8} {'peak MB':>9}")
+    for path in paths:
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        for stage, measurement in measure_file(path, stages, args.repeat, DEFAULT_FORMATTING_OPTIONS).items():
+            key = f"{os.path.basename(path)}:{stage}"
+            results[key] = measurement
+            throughput = size_mb / measurement['seconds'] if measurement['seconds'] else 0
+            print(f"{os.path.basename(path):<36} {stage:<8} {measurement['seconds']:>10.4f} "
+                  f"{throughput:>8.2f} {measurement['peak_rss_mb']:>9.1f}")
+
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nĐã lưu baseline vào {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nChưa có baseline tại {args.baseline}; chạy lại với --save-baseline để tạo.")
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f).get('results', {})
+    regressions = compare(results, baseline, args.threshold, args.memory_threshold, args.min_seconds)
+    if regressions:
+        print("\nPhát hiện suy giảm hiệu năng:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("\nKhông có suy giảm so với baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
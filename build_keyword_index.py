@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Xây dựng bảng IDF (tần suất tài liệu của các term) cho engine từ khóa từ một
+bộ tài liệu.
+
+Ví dụ:
+    python build_keyword_index.py corpus/ "papers/**/*.docx"
+    python build_keyword_index.py new_papers/ --update
+
+Mỗi tài liệu được phân tích bằng cùng pipeline với analyze_text, nên các term
+trong bảng trùng với term được xếp hạng khi phân tích. Mặc định bảng được xây
+lại từ đầu; với --update, các tài liệu được cộng thêm vào bảng hiện có. Tệp
+chỉ mục (mặc định KEYWORD_IDF_PATH) được ghi thay thế một cách nguyên tử, ứng
+dụng đang chạy đọc bảng mới khi khởi động lại.
+"""
+import argparse
+import os
+import sys
+import time
+
+from app.src import config
+from app.src.document_processor import extract_text_from_doc, iter_docs, warm_up_model
+from app.src.keywords import IdfIndex, TermCounts
+from format_documents import collect_inputs
+
+PROGRESS_EVERY = 100
+
+
+def document_terms(content):
+    """Các term id của một tài liệu, giống cách analyze_text đếm từ khóa."""
+    counts = TermCounts()
+    for _, doc in iter_docs(content, profile='analyze'):
+        counts.add_doc(doc)
+    if len(counts.ids) == 0:
+        # Mô hình không tách được token: dùng cách đếm từ của phân tích cơ bản
+        counts.add_text(content)
+    return counts.ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help='Thư mục, tệp hoặc mẫu glob (hỗ trợ **)')
+    parser.add_argument('-o', '--output', default=config.KEYWORD_IDF_PATH, help='Tệp chỉ mục IDF')
+    parser.add_argument('--update', action='store_true', help='Cộng thêm vào bảng hiện có thay vì xây lại')
+    args = parser.parse_args()
+
+    inputs = collect_inputs(args.inputs)
+    print(f"Tìm thấy {len(inputs)} tệp")
+    if not inputs:
+        return 1
+
+    output = os.path.abspath(args.output)
+    if not args.update and os.path.exists(output):
+        os.remove(output)
+    index = IdfIndex(output)
+
+    warm_up_model()
+    start = time.perf_counter()
+    failed = 0
+    for count, (input_path, _) in enumerate(inputs, 1):
+        content = extract_text_from_doc(input_path)
+        if not content:
+            print(f"Lỗi: {input_path}: Lỗi đọc nội dung tài liệu")
+            failed += 1
+            continue
+        index.add_document(document_terms(content))
+        if count % PROGRESS_EVERY == 0:
+            print(f"Đã xử lý {count}/{len(inputs)} tệp ({count / (time.perf_counter() - start):.1f} tệp/s)")
+
+    index.save()
+    stats = index.stats()
+    print(f"Đã ghi {output}: {stats['documents']} tài liệu, {stats['terms']} term, "
+          f"lỗi: {failed}, thời gian: {time.perf_counter() - start:.2f} s")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+"""
+Định dạng hàng loạt tài liệu từ dòng lệnh, không qua Flask.
+
+Ví dụ:
+    python format_documents.py papers/ "drafts/**/*.docx" -o formatted/ --citation-style mla --title-page
+    python format_documents.py papers/ -o formatted/ --resume
+
+Các thư mục đầu vào được duyệt đệ quy; cấu trúc thư mục con được giữ nguyên
+trong thư mục đầu ra. Các tùy chọn định dạng giống các trường của form trên
+giao diện web. Tài liệu được xử lý trong một process pool, mỗi worker tải và
+làm nóng mô hình một lần. Mỗi tệp hoàn thành được ghi vào manifest trong thư
+mục đầu ra; với --resume, các tệp đã hoàn thành (cùng kích thước, thời điểm
+sửa đổi và tùy chọn định dạng) được bỏ qua. Cuối lượt chạy in ra số tệp/giây,
+MB/giây và thời gian của từng bước.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from app.src import config
+from app.src.batch import unique_name
+from app.src.document_processor import (
+    allowed_file,
+    create_formatted_document,
+    extract_text_from_doc,
+    get_formatting_options,
+    model_status,
+    shard_pool,
+    warm_up_model
+)
+from app.src.metrics import start_request_timings, pop_request_timings
+
+MANIFEST_NAME = '.format_manifest.jsonl'
+PROGRESS_EVERY = 50
+
+# Các trường của form và cờ dòng lệnh tương ứng
+VALUE_OPTIONS = ('citation_style', 'font_family', 'font_size', 'line_spacing', 'margin',
+                 'paragraph_spacing', 'render_engine', 'engine', 'language')
+FLAG_OPTIONS = ('page_numbers', 'title_page', 'table_of_contents', 'bibliography')
+
+
+def collect_inputs(patterns):
+    """Danh sách (input_path, relative_path) đã sắp xếp từ các thư mục, tệp hoặc glob."""
+    inputs = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, dirs, files in os.walk(pattern):
+                dirs.sort()
+                for name in files:
+                    path = os.path.join(root, name)
+                    inputs.setdefault(os.path.abspath(path), os.path.relpath(path, pattern))
+        else:
+            for path in glob.glob(pattern, recursive=True):
+                if os.path.isfile(path):
+                    inputs.setdefault(os.path.abspath(path), os.path.basename(path))
+    return sorted((path, relative) for path, relative in inputs.items()
+                  if allowed_file(os.path.basename(path), config.ALLOWED_EXTENSIONS))
+
+
+def plan_outputs(inputs, output_dir):
+    """Gán đường dẫn đầu ra (formatted_<tên>.docx) cho từng tệp, tránh trùng tên trong cùng thư mục."""
+    used_names = {}
+    tasks = []
+    for input_path, relative in inputs:
+        directory = os.path.dirname(relative)
+        stem = os.path.basename(relative).rsplit('.', 1)[0]
+        name = unique_name(f"formatted_{stem}.docx", used_names.setdefault(directory, set()))
+        tasks.append((input_path, os.path.join(output_dir, directory, name)))
+    return tasks
+
+
+def options_digest(formatting_options):
+    return hashlib.sha256(json.dumps(formatting_options, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def load_manifest(manifest_path):
+    """Các tệp đã hoàn thành trong những lượt chạy trước: input -> mục manifest."""
+    completed = {}
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Dòng cuối có thể bị cắt khi lượt chạy trước bị dừng đột ngột
+                    continue
+                if entry.get('status') == 'ok':
+                    completed[entry['input']] = entry
+    except FileNotFoundError:
+        pass
+    return completed
+
+
+def is_completed(entry, input_path, output_path, digest):
+    return (entry is not None and entry['output'] == output_path and entry['options'] == digest and
+            tuple(entry['signature']) == file_signature(input_path) and os.path.exists(output_path))
+
+
+def init_worker(quiet):
+    """Khởi tạo worker: tắt log chi tiết và làm nóng mô hình (một lần cho mỗi tiến trình)."""
+    # Ctrl+C chỉ được xử lý ở tiến trình cha, worker hoàn thành tệp đang xử lý
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if quiet:
+        sys.stdout = open(os.devnull, 'w')
+    # Các tệp đã được xử lý song song, không chia nhỏ thêm từng tài liệu
+    shard_pool.enabled = False
+    if not model_status()['warm']:
+        warm_up_model()
+
+
+def format_file(input_path, output_path, formatting_options):
+    """Hàm chạy trong worker: định dạng một tệp, trả về kết quả kèm thời gian từng bước."""
+    start_request_timings()
+    start = time.perf_counter()
+    error = None
+    try:
+        content = extract_text_from_doc(input_path)
+        if not content:
+            error = 'Lỗi đọc nội dung tài liệu'
+        else:
+            # Ghi vào tệp tạm rồi đổi tên để tệp đầu ra không bao giờ ở trạng thái ghi dở
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            partial_path = output_path + '.part'
+            if create_formatted_document(content, formatting_options, partial_path) is None:
+                error = 'Lỗi định dạng tài liệu'
+            else:
+                os.replace(partial_path, output_path)
+    except Exception as e:
+        error = str(e)
+    return {
+        'status': 'error' if error else 'ok',
+        'error': error,
+        'seconds': time.perf_counter() - start,
+        'timings': pop_request_timings(),
+    }
+
+
+def print_summary(results, skipped, elapsed):
+    succeeded = [result for result in results if result['status'] == 'ok']
+    failed = len(results) - len(succeeded)
+    input_bytes = sum(result['bytes'] for result in succeeded)
+
+    print(f"\nĐã định dạng: {len(succeeded)} tệp, lỗi: {failed}, bỏ qua (đã hoàn thành): {skipped}")
+    print(f"Thời gian: {elapsed:.2f} s")
+    if elapsed > 0:
+        print(f"Thông lượng: {len(succeeded) / elapsed:.2f} tệp/s, "
+              f"{input_bytes / (1024 * 1024) / elapsed:.2f} MB/s")
+
+    totals = {}
+    for result in results:
+        for stage, seconds in result['timings']:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+    if totals:
+        # Tổng thời gian của các worker (cộng dồn), không phải thời gian thực
+        busy = sum(totals.values())
+        print(f"\n{'bước':<16} {'tổng s':>10} {'ms/tệp':>10} {'tỷ lệ':>7}")
+        for stage, seconds in sorted(totals.items(), key=lambda item: -item[1]):
+            print(f"{stage:<16} {seconds:>10.2f} {seconds * 1000 / max(len(results), 1):>10.1f} "
+                  f"{seconds / busy:>6.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help='Thư mục, tệp hoặc mẫu glob (hỗ trợ **)')
+    parser.add_argument('-o', '--output-dir', required=True, help='Thư mục chứa tài liệu đã định dạng')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='Số tiến trình worker (mặc định: số lõi CPU)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Bỏ qua các tệp đã hoàn thành trong lượt chạy trước')
+    parser.add_argument('--verbose', action='store_true', help='Hiện log chi tiết của các worker')
+    for name in VALUE_OPTIONS:
+        parser.add_argument('--' + name.replace('_', '-'), dest=name)
+    for name in FLAG_OPTIONS:
+        parser.add_argument('--' + name.replace('_', '-'), dest=name, action='store_true')
+    args = parser.parse_args()
+
+    # Dựng "form" như giao diện web để dùng chung giá trị mặc định và cách đọc tùy chọn
+    form = {name: getattr(args, name) for name in VALUE_OPTIONS if getattr(args, name) is not None}
+    form.update({name: 'on' for name in FLAG_OPTIONS if getattr(args, name)})
+    formatting_options = get_formatting_options(form)
+    digest = options_digest(formatting_options)
+
+    output_dir = os.path.abspath(args.output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    completed = load_manifest(manifest_path) if args.resume else {}
+
+    tasks = plan_outputs(collect_inputs(args.inputs), output_dir)
+    pending = [(input_path, output_path) for input_path, output_path in tasks
+               if not is_completed(completed.get(input_path), input_path, output_path, digest)]
+    skipped = len(tasks) - len(pending)
+    print(f"Tìm thấy {len(tasks)} tệp, cần xử lý {len(pending)}; tùy chọn: {formatting_options}")
+    if not pending:
+        return 0
+
+    # Làm nóng mô hình trong tiến trình cha: các worker được fork dùng chung mô hình đã khởi tạo
+    warm_up_model()
+
+    results = []
+    start = time.perf_counter()
+    interrupted = False
+    with open(manifest_path, 'a' if args.resume else 'w', encoding='utf-8') as manifest, \
+            ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=init_worker,
+                                initargs=(not args.verbose,)) as executor:
+        futures = {}
+        for input_path, output_path in pending:
+            # Chữ ký được lấy trước khi xử lý để tệp bị sửa trong lúc chạy sẽ được xử lý lại
+            signature = file_signature(input_path)
+            future = executor.submit(format_file, input_path, output_path, formatting_options)
+            futures[future] = (input_path, output_path, signature)
+
+        try:
+            for future in as_completed(futures):
+                input_path, output_path, signature = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'status': 'error', 'error': str(e), 'seconds': 0.0, 'timings': []}
+                result['bytes'] = signature[0]
+                results.append(result)
+
+                manifest.write(json.dumps({
+                    'input': input_path,
+                    'output': output_path,
+                    'signature': signature,
+                    'options': digest,
+                    'status': result['status'],
+                    'error': result['error'],
+                    'seconds': round(result['seconds'], 4),
+                }, ensure_ascii=False) + '\n')
+                manifest.flush()
+
+                if result['status'] != 'ok':
+                    print(f"Lỗi: {input_path}: {result['error']}")
+                if len(results) % PROGRESS_EVERY == 0:
+                    print(f"Đã xử lý {len(results)}/{len(pending)} tệp "
+                          f"({len(results) / (time.perf_counter() - start):.1f} tệp/s)")
+        except KeyboardInterrupt:
+            interrupted = True
+            print("\nĐã dừng; chạy lại với --resume để tiếp tục")
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    print_summary(results, skipped, time.perf_counter() - start)
+    if interrupted:
+        return 130
+    return 1 if any(result['status'] != 'ok' for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
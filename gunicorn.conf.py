@@ -0,0 +1,36 @@
+"""
+Cấu hình gunicorn cho môi trường production.
+
+Chạy: gunicorn -c gunicorn.conf.py
+
+Các biến môi trường:
+    WEB_BIND     địa chỉ lắng nghe (mặc định 0.0.0.0:5000)
+    WEB_WORKERS  số tiến trình worker (mặc định bằng số lõi CPU)
+    WEB_THREADS  số luồng trong mỗi worker (mặc định 4)
+    WEB_TIMEOUT  thời gian tối đa cho một yêu cầu, tính bằng giây (mặc định 120)
+"""
+import gc
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('WEB_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('WEB_THREADS', '4'))
+worker_class = 'gthread'
+timeout = int(os.environ.get('WEB_TIMEOUT', '120'))
+
+# Tải ứng dụng (và mô hình spaCy) một lần trong tiến trình cha trước khi fork
+preload_app = True
+
+
+def when_ready(server):
+    # Đưa toàn bộ đối tượng đã tải (bao gồm mô hình) vào thế hệ cố định của GC,
+    # tránh việc GC trong worker chạm vào các trang bộ nhớ dùng chung và phá vỡ copy-on-write
+    gc.collect()
+    gc.freeze()
+    server.log.info("Mô hình đã được tải trong tiến trình cha, bắt đầu fork %s worker", workers)
+
+
+def post_fork(server, worker):
+    server.log.info("Worker %s sẵn sàng (dùng chung mô hình với tiến trình cha)", worker.pid)
@@ -0,0 +1,14 @@
+"""
+Điểm khởi chạy WSGI cho môi trường production.
+
+Mô hình spaCy được tải và làm nóng ngay khi import module này (bất kể
+MODEL_WARM_UP: không dùng luồng nền trước khi fork). Khi chạy với
+gunicorn và preload_app (xem gunicorn.conf.py), việc này chỉ xảy ra một lần
+trong tiến trình cha; các worker được fork ra dùng chung bộ nhớ mô hình
+theo cơ chế copy-on-write.
+"""
+from app import create_app
+from app.src.document_processor import warm_up_on_startup
+
+app = create_app()
+warm_up_on_startup('eager')